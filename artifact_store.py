@@ -0,0 +1,271 @@
+"""成果物（スクリーンショット・抽出テキスト）の保存先
+
+内容のSHA-256をキー（例: 'ab/ab12…ef.png'）にして保存する。同じバイト列の撮影は一度だけ保存され、
+結果にはサーバーのパスではなく保存先に依存しないキーを記録する。
+  local: ローカルディスク（ARTIFACT_ROOT）。バッチフォルダのファイルをハードリンクで取り込む
+  s3   : S3互換ストレージ（boto3 が必要。ARTIFACT_S3_ENDPOINT で MinIO 等の互換サーバーも指定可）
+アップロードは ArtifactUploader のスレッドプールで行い、撮影・書き込みのスレッドはネットワークを待たない。
+"""
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# キーの形式（先頭2文字のディレクトリ / ハッシュ + 拡張子）
+KEY_PATTERN = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$')
+
+CONTENT_TYPES = {
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+    '.jpg': 'image/jpeg',
+    '.json': 'application/json',
+}
+
+# これより大きいファイルはマルチパートでアップロード
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+
+
+def content_key(data, extension):
+    """バイト列のキー"""
+    digest = hashlib.sha256(data).hexdigest()
+    return f'{digest[:2]}/{digest}{extension.lower()}'
+
+
+def file_content_key(path, chunk_size=1024 * 1024):
+    """ファイルのキー（拡張子はファイル名から）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    extension = os.path.splitext(path)[1].lower()
+    return f'{digest.hexdigest()[:2]}/{digest.hexdigest()}{extension}'
+
+
+def is_valid_key(key):
+    return bool(key and KEY_PATTERN.match(key))
+
+
+def link_or_copy(source_path, target_path):
+    """source_path を target_path に置く（同じファイルシステム上ならハードリンク、別ならコピー）"""
+    temp_path = f'{target_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        os.link(source_path, temp_path)
+    except OSError:
+        shutil.copyfile(source_path, temp_path)
+    os.replace(temp_path, target_path)
+
+
+class LocalArtifactStore:
+    """ローカルディスクの保存先"""
+
+    kind = 'local'
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def put_file(self, key, source_path):
+        """保存済みなら False（同じファイルシステム上ではコピーせずハードリンクにする）"""
+        target = self.path(key)
+        if os.path.exists(target):
+            # バッチフォルダ側も保存済みのファイルへのリンクに置き換え、ディスク上は1つにする
+            try:
+                if not os.path.samefile(target, source_path):
+                    temp_path = f'{source_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                    os.link(target, temp_path)
+                    os.replace(temp_path, source_path)
+            except OSError:
+                pass
+            return False
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        link_or_copy(source_path, target)
+        return True
+
+    def download_url(self, key):
+        """直接ダウンロードできるURL（ローカルはサーバーから配信するため None）"""
+        return None
+
+
+class S3ArtifactStore:
+    """S3互換ストレージの保存先"""
+
+    kind = 's3'
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None, client=None, url_expires=3600):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise RuntimeError('S3への保存には boto3 が必要です（pip install boto3）')
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.client = client or boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+        self.url_expires = url_expires
+        self._client_error = ClientError
+        # 並列化はアップロードプール側で行うため、1ファイル内のパートは順に送る
+        self._transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD,
+            multipart_chunksize=MULTIPART_CHUNKSIZE,
+            use_threads=False,
+        )
+
+    def object_key(self, key):
+        return f'{self.prefix}{key}'
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except self._client_error as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def put_file(self, key, source_path):
+        """保存済みなら False"""
+        if self.exists(key):
+            return False
+        extension = os.path.splitext(key)[1]
+        self.client.upload_file(
+            source_path, self.bucket, self.object_key(key),
+            ExtraArgs={'ContentType': CONTENT_TYPES.get(extension, 'application/octet-stream')},
+            Config=self._transfer_config,
+        )
+        return True
+
+    def download_url(self, key):
+        """期限付きのダウンロードURL"""
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': self.object_key(key)}, ExpiresIn=self.url_expires
+        )
+
+
+def create_artifact_store(default_root):
+    """環境変数 ARTIFACT_STORE（local / s3）に応じた保存先"""
+    backend = os.environ.get('ARTIFACT_STORE', 'local')
+    if backend == 's3':
+        return S3ArtifactStore(
+            os.environ['ARTIFACT_S3_BUCKET'],
+            prefix=os.environ.get('ARTIFACT_S3_PREFIX', ''),
+            endpoint_url=os.environ.get('ARTIFACT_S3_ENDPOINT') or None,
+            region=os.environ.get('ARTIFACT_S3_REGION') or None,
+            url_expires=int(os.environ.get('ARTIFACT_URL_EXPIRES', '3600')),
+        )
+    if backend != 'local':
+        raise ValueError(f'未対応の保存先です: {backend}')
+    return LocalArtifactStore(os.environ.get('ARTIFACT_ROOT', os.path.join(default_root, 'artifacts')))
+
+
+class ArtifactUploader:
+    """保存先へのアップロード（上限付きスレッドプール）
+
+    submit() は保存の完了を表す Future をすぐに返す（保存できればキー、失敗すれば None になる）。
+    保留中の件数が上限に達した場合のみ呼び出し側が待たされる。
+    アップロードが終わるまでの間は pending_path() で元のファイルを配信できる。
+    """
+
+    def __init__(self, store, workers=4, max_pending=64):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='artifact-upload')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = {}
+        self._uploads = {}
+        self._futures = []
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'uploaded': 0,
+            'deduplicated': 0,
+            'uploaded_bytes': 0,
+            'upload_seconds': 0.0,
+            'blocked_seconds': 0.0,
+            'errors': 0,
+        }
+
+    def submit(self, key, path):
+        """path のファイルを key で保存する（同じキーがアップロード中ならその Future を返す）"""
+        with self._lock:
+            self._stats['submitted'] += 1
+            if key in self._uploads:
+                self._stats['deduplicated'] += 1
+                return self._uploads[key]
+            upload = Future()
+            self._pending[key] = path
+            self._uploads[key] = upload
+
+        started = time.monotonic()
+        self._slots.acquire()
+        blocked = time.monotonic() - started
+
+        future = self._executor.submit(self._upload, key, path, upload)
+        with self._lock:
+            self._stats['blocked_seconds'] += blocked
+            if len(self._futures) >= 256:
+                self._futures = [f for f in self._futures if not f.done()]
+            self._futures.append(future)
+        return upload
+
+    def submit_file(self, path):
+        """ファイルの内容からキーを計算して保存する"""
+        return self.submit(file_content_key(path), path)
+
+    def _upload(self, key, path, upload):
+        started = time.monotonic()
+        stored = None
+        try:
+            size = os.path.getsize(path)
+            uploaded = self.store.put_file(key, path)
+            with self._lock:
+                if uploaded:
+                    self._stats['uploaded'] += 1
+                    self._stats['uploaded_bytes'] += size
+                else:
+                    self._stats['deduplicated'] += 1
+                self._stats['upload_seconds'] += time.monotonic() - started
+            stored = key
+        except Exception as e:
+            print(f"⚠️ 成果物のアップロードエラー ({key}): {e}")
+            with self._lock:
+                self._stats['errors'] += 1
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+                self._uploads.pop(key, None)
+            self._slots.release()
+            upload.set_result(stored)
+
+    def pending_path(self, key):
+        """アップロード中のキーの元ファイル（なければ None）"""
+        with self._lock:
+            return self._pending.get(key)
+
+    def flush(self):
+        """保留中のアップロードがすべて終わるまで待つ"""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, pending=len(self._pending))
+        stats['upload_seconds'] = round(stats['upload_seconds'], 2)
+        stats['blocked_seconds'] = round(stats['blocked_seconds'], 2)
+        return stats
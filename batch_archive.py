@@ -0,0 +1,75 @@
+"""バッチフォルダのZIPストリーミング
+
+一時ファイルを作らず、zipfile の出力をチャンクごとにレスポンスへ流す。
+書き込み先はシークできないため、各エントリはデータディスクリプタ付きで書かれる。
+メモリ使用量はチャンクサイズ程度で、バッチの大きさに依存しない。
+"""
+import os
+import zipfile
+
+# 読み込み・送信の単位
+CHUNK_SIZE = 256 * 1024
+
+# すでに圧縮済みの形式（無圧縮で格納）
+STORED_EXTENSIONS = ('.png', '.webp', '.jpg', '.jpeg', '.zip')
+
+
+class _ChunkSink:
+    """zipfile の書き込み先（書かれたバイト列を取り出すまで保持するだけ）"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_folder_files(folder_path):
+    """フォルダ内の全ファイル（フォルダからの相対パス）"""
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        for name in sorted(files):
+            yield os.path.relpath(os.path.join(root, name), folder_path)
+
+
+def iter_zip(folder_path, relative_paths, prefix=''):
+    """relative_paths のファイルをZIPにしてバイト列を順に返す"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+        for relative_path in relative_paths:
+            # キャッシュ再利用などで他のバッチを指すファイルは含めない
+            relative_path = os.path.normpath(relative_path)
+            if os.path.isabs(relative_path) or relative_path.startswith(os.pardir):
+                continue
+            path = os.path.join(folder_path, relative_path)
+            if not os.path.isfile(path):
+                continue
+            compress = (zipfile.ZIP_STORED if relative_path.lower().endswith(STORED_EXTENSIONS)
+                        else zipfile.ZIP_DEFLATED)
+            info = zipfile.ZipInfo.from_file(path, os.path.join(prefix, relative_path))
+            info.compress_type = compress
+            with open(path, 'rb') as source, archive.open(info, 'w', force_zip64=True) as target:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # 中央ディレクトリ
+    data = sink.drain()
+    if data:
+        yield data
@@ -0,0 +1,158 @@
+"""バッチのチェックポイント（追記専用マニフェスト）
+
+バッチフォルダ内の manifest.jsonl に1行1レコードで追記する。
+  batch    : バッチ開始時の入力（会社・パターン・オプション）
+  capture  : 撮影完了（会社, エンジン, パターン種別, 撮影種別）ごと
+  item     : 会社×エンジン×パターンの処理完了と結果
+  resume   : 再開の記録
+  completed: バッチ完了
+ワーカーの再起動やChromeのクラッシュで中断しても、マニフェストから状態を復元して
+未完了の作業だけを再実行できる。
+"""
+import json
+import os
+import threading
+from datetime import datetime
+
+MANIFEST_FILENAME = 'manifest.jsonl'
+
+
+class BatchManifest:
+    """1バッチ分のマニフェスト"""
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.path = os.path.join(folder_path, MANIFEST_FILENAME)
+        self._lock = threading.Lock()
+
+    @property
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _append(self, record):
+        record.setdefault('time', datetime.now().isoformat())
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def relative(self, path):
+        """バッチフォルダからの相対パス（フォルダを移動しても有効）"""
+        if not path:
+            return path
+        return os.path.relpath(path, self.folder_path)
+
+    def absolute(self, path):
+        if not path or os.path.isabs(path):
+            return path
+        return os.path.join(self.folder_path, path)
+
+    def write_header(self, companies, selected_patterns, options):
+        self._append({
+            'record': 'batch',
+            'batch_id': os.path.basename(self.folder_path),
+            'companies': companies,
+            'selected_patterns': selected_patterns,
+            'options': options,
+        })
+
+    def record_capture(self, company, engine, variation_type, kind, path):
+        self._append({
+            'record': 'capture',
+            'company': company,
+            'engine': engine,
+            'variation_type': variation_type,
+            'kind': kind,
+            'path': self.relative(path),
+        })
+
+    def record_item(self, company, engine, variation_type, result, artifact_fields=()):
+        stored = dict(result)
+        for field in artifact_fields:
+            stored[field] = self.relative(stored.get(field))
+        self._append({
+            'record': 'item',
+            'company': company,
+            'engine': engine,
+            'variation_type': variation_type,
+            'result': stored,
+        })
+
+    def record_resume(self, job_id):
+        self._append({'record': 'resume', 'job_id': job_id})
+
+    def record_completed(self, summary):
+        self._append({'record': 'completed', 'summary': summary})
+
+    def iter_records(self):
+        """レコードを順に返す（書き込み途中で切れた最終行は無視）"""
+        if not self.exists:
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def iter_items(self, company=None, engine=None):
+        """item レコードを条件で絞り込んで返す（同じ対象が重複した場合は最初の1件）"""
+        seen = set()
+        for record in self.iter_records():
+            if record.get('record') != 'item':
+                continue
+            if (company and record['company'] != company) or (engine and record['engine'] != engine):
+                continue
+            key = (record['company'], record['engine'], record['variation_type'])
+            if key in seen:
+                continue
+            seen.add(key)
+            yield record
+
+    def iter_artifact_paths(self, artifact_fields, company=None, engine=None, kind=None):
+        """条件に合う成果物ファイル（バッチフォルダからの相対パス、重複なし）"""
+        seen = set()
+        for record in self.iter_records():
+            if record.get('record') not in ('capture', 'item'):
+                continue
+            if (company and record['company'] != company) or (engine and record['engine'] != engine):
+                continue
+            if record['record'] == 'capture':
+                paths = [(record['kind'], record['path'])]
+            else:
+                paths = [(field, record['result'].get(field)) for field in artifact_fields]
+            for path_kind, path in paths:
+                if not path or (kind and path_kind != kind) or path in seen:
+                    continue
+                seen.add(path)
+                yield path
+
+    def load_state(self, artifact_fields=()):
+        """マニフェストから再開用の状態を復元
+
+        戻り値: {
+            'header': batchレコード,
+            'items': {(会社, エンジン, パターン種別): 結果},
+            'captures': {(会社, エンジン, パターン種別): {撮影種別: パス}},
+            'completed': 完了済みかどうか,
+        }
+        """
+        state = {'header': None, 'items': {}, 'captures': {}, 'completed': False}
+        for record in self.iter_records():
+            kind = record.get('record')
+            if kind == 'batch':
+                state['header'] = record
+            elif kind == 'capture':
+                key = (record['company'], record['engine'], record['variation_type'])
+                state['captures'].setdefault(key, {})[record['kind']] = self.absolute(record['path'])
+            elif kind == 'item':
+                key = (record['company'], record['engine'], record['variation_type'])
+                result = dict(record['result'])
+                for field in artifact_fields:
+                    result[field] = self.absolute(result.get(field))
+                state['items'][key] = result
+            elif kind == 'completed':
+                state['completed'] = True
+        return state
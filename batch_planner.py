@@ -0,0 +1,172 @@
+"""バッチの事前見積もり（ドライラン）
+
+ultimate_search と同じ手順で展開した検索語ごとに撮影計画を作り、ページ遷移数・
+スクリーンショット数を数える。所要時間と保存容量は、ワークキューに残っている直近の完了項目の
+フェーズ別時間と書き込みバイト数（ローリング統計）から見積もる。実績のないエンジンは既定値を使う。
+"""
+import math
+
+from capture_plan import CAPTURE_MAPS, build_capture_plan
+from metrics import BACKGROUND_PHASES
+
+# 見積もりに使う直近の完了項目数（エンジンごと）
+HISTORY_ITEMS = 200
+
+# 実績がない場合の検索1ステップあたりのフェーズ別秒数
+DEFAULT_PHASE_SECONDS = {
+    'navigate': 1.5,
+    'readiness_wait': 4.0,
+    'typing': 3.0,
+    'pacing': 1.5,
+    'screenshot_capture': 0.6,
+    'text_extraction': 0.2,
+    'search': 0.5,
+}
+
+# 実績がない場合のスクリーンショット1枚あたりのバイト数（形式別）
+DEFAULT_SCREENSHOT_BYTES = {
+    'png': 150 * 1024,
+    'webp': 50 * 1024,
+    'jpeg': 60 * 1024,
+}
+
+
+def plan_counts(plan):
+    """撮影計画のステップ数・ページ遷移数・スクリーンショット数"""
+    counts = {'steps': len(plan), 'navigations': 0, 'screenshots': 0, 'optional_screenshots': 0}
+    for step in plan:
+        # トップページを開く場合はその分と、検索実行による結果ページへの遷移
+        counts['navigations'] += 2 if step['navigate'] else 1
+        for capture in step['captures']:
+            if capture['capture'] == CAPTURE_MAPS:
+                # Googleマップは検出された場合のみ
+                counts['optional_screenshots'] += 1
+            else:
+                counts['screenshots'] += 1
+    return counts
+
+
+def rolling_engine_stats(history, image_format):
+    """直近の完了項目（WorkQueue.recent_done_items）から1ステップあたりのフェーズ別秒数と1枚あたりのバイト数"""
+    phase_seconds = {}
+    steps_total = 0
+    samples = 0
+    screenshots = 0
+    written_bytes = 0
+    for entry in history:
+        payload, meta = entry['payload'], entry['meta']
+        timings = meta.get('timings') or {}
+        steps = len(build_capture_plan(payload['engine'], payload['variation'], payload.get('options', {})))
+        if not steps or not timings:
+            continue
+        samples += 1
+        steps_total += steps
+        for phase, timing in timings.items():
+            # 予算待ちは作業時間に含めない（予算による下限として別に見積もる）
+            if phase in BACKGROUND_PHASES or phase == 'budget_wait':
+                continue
+            phase_seconds[phase] = phase_seconds.get(phase, 0.0) + timing.get('seconds', 0.0)
+        # 画像サイズは同じ形式で保存した実績だけを使う
+        if (payload.get('screenshot') or {}).get('format') == image_format:
+            stats = meta.get('screenshots') or {}
+            screenshots += stats.get('screenshots', 0)
+            written_bytes += stats.get('written_bytes', 0)
+
+    default_bytes = DEFAULT_SCREENSHOT_BYTES.get(image_format, DEFAULT_SCREENSHOT_BYTES['png'])
+    if not samples:
+        return {
+            'samples': 0,
+            'phase_seconds_per_step': dict(DEFAULT_PHASE_SECONDS),
+            'bytes_per_screenshot': default_bytes,
+        }
+    return {
+        'samples': samples,
+        'phase_seconds_per_step': {phase: seconds / steps_total for phase, seconds in phase_seconds.items()},
+        'bytes_per_screenshot': written_bytes / screenshots if screenshots else default_bytes,
+    }
+
+
+def estimate_batch(queries, options, cached, engine_stats, budgets, workers=1, backlog=None, limit_seconds=None):
+    """検索語ごとの撮影計画から件数・容量・所要時間を見積もる
+
+    queries: {(エンジン, 検索語): パターン}（バッチ内で重複を除いたもの）
+    cached: キャッシュから再利用できる (エンジン, 検索語) の集合
+    engine_stats: エンジン -> rolling_engine_stats() の結果
+    budgets: エンジン -> リクエスト予算（rate_per_minute, burst, jitter）
+    backlog: エンジン -> キューに先に入っている未完了の項目数（このバッチのエンジン分を所要時間に加える。
+             1項目あたりの検索回数はこのバッチと同じとみなす）
+    """
+    workers = max(1, int(workers or 1))
+    backlog = backlog or {}
+    per_engine = {}
+    phase_totals = {}
+    totals = {'navigations': 0, 'screenshots': 0, 'optional_screenshots': 0}
+    expected_bytes = 0.0
+
+    for (engine, query), variation in queries.items():
+        entry = per_engine.setdefault(engine, {
+            'searches': 0, 'requests': 0, 'cache_hits': 0, 'navigations': 0, 'screenshots': 0,
+            'work_seconds': 0.0, 'history_samples': engine_stats[engine]['samples'],
+        })
+        if (engine, query) in cached:
+            entry['cache_hits'] += 1
+            continue
+        counts = plan_counts(build_capture_plan(engine, variation, options))
+        stats = engine_stats[engine]
+        entry['searches'] += 1
+        entry['requests'] += counts['steps']
+        entry['navigations'] += counts['navigations']
+        entry['screenshots'] += counts['screenshots']
+        for phase, seconds in stats['phase_seconds_per_step'].items():
+            phase_seconds = seconds * counts['steps']
+            phase_totals[phase] = phase_totals.get(phase, 0.0) + phase_seconds
+            entry['work_seconds'] += phase_seconds
+        for key in totals:
+            totals[key] += counts[key]
+        expected_bytes += counts['screenshots'] * stats['bytes_per_screenshot']
+
+    # エンジンごとのリクエスト予算（検索の実行1回につき1トークン。評判・口コミも1回ずつ）による下限
+    # キューに先に入っている項目の分も、同じワーカー・同じ予算で先に処理される
+    backlog_work = 0.0
+    bounds = {'workers': 0.0}
+    for engine, entry in per_engine.items():
+        steps_per_item = entry['requests'] / entry['searches'] if entry['searches'] else 1.0
+        backlog_requests = backlog.get(engine, 0) * steps_per_item
+        backlog_work += backlog_requests * sum(engine_stats[engine]['phase_seconds_per_step'].values())
+        entry['backlog_items'] = backlog.get(engine, 0)
+        budget = budgets.get(engine) or {}
+        rate = budget.get('rate_per_minute')
+        if rate:
+            interval = 60.0 / rate + budget.get('jitter', 0.0) / 2
+            entry['backlog_seconds'] = round(backlog_requests * interval, 1)
+            if entry['requests']:
+                entry['budget_seconds'] = max(0, backlog_requests + entry['requests'] - budget.get('burst', 1)) * interval
+                bounds[f'rate_budget:{engine}'] = entry['budget_seconds']
+        entry['work_seconds'] = round(entry['work_seconds'], 1)
+        if 'budget_seconds' in entry:
+            entry['budget_seconds'] = round(entry['budget_seconds'], 1)
+    bounds['workers'] = (sum(phase_totals.values()) + backlog_work) / workers
+
+    bounded_by = max(bounds, key=bounds.get)
+    predicted = bounds[bounded_by]
+    estimate = {
+        'unique_searches': len(queries),
+        'cache_hits': sum(entry['cache_hits'] for entry in per_engine.values()),
+        'browser_searches': sum(entry['searches'] for entry in per_engine.values()),
+        'navigations': totals['navigations'],
+        'screenshots': totals['screenshots'],
+        'optional_screenshots': totals['optional_screenshots'],
+        'expected_bytes': int(expected_bytes),
+        'work_seconds': round(sum(phase_totals.values()), 1),
+        'phases': {phase: round(seconds, 1) for phase, seconds in sorted(phase_totals.items(), key=lambda item: -item[1])},
+        'workers': workers,
+        'queue_backlog': sum(backlog.get(engine, 0) for engine in per_engine),
+        'predicted_seconds': round(predicted, 1),
+        'bounded_by': bounded_by,
+        'engines': per_engine,
+    }
+    if limit_seconds:
+        estimate['limit_seconds'] = limit_seconds
+        estimate['fits'] = predicted <= limit_seconds
+        estimate['suggested_batches'] = max(1, math.ceil(predicted / limit_seconds))
+    return estimate
@@ -0,0 +1,285 @@
+"""オフラインベンチマーク
+
+ローカルの代替検索エンジンに対して本物の検索処理（process_search_with_options）を
+ヘッドレスChromeで実行し、次を計測してJSONに保存する。
+  - ドライバー起動時間（setup_driver）
+  - フェーズ別レイテンシのパーセンタイル（遷移・各種待機・入力・撮影）
+  - 1分あたりのスクリーンショット数と書き込みバイト数
+  - ピークRSS（本プロセスとChromeのプロセスツリー合計）
+
+使い方: python benchmarks/run_benchmark.py --queries 5 --page-latency 200
+結果は benchmarks/results/ に保存され、コミット間で比較できる。
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from stand_in_engine import StandInEngine  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def percentile(values, pct):
+    """最近傍法のパーセンタイル"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(values):
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 4),
+        'p50': round(percentile(values, 50), 4),
+        'p90': round(percentile(values, 90), 4),
+        'p99': round(percentile(values, 99), 4),
+        'max': round(max(values), 4),
+    }
+
+
+def _process_tree_rss(pid):
+    """プロセスと子孫のRSS合計（バイト、/proc を読む）"""
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    stack.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class RssSampler(threading.Thread):
+    """一定間隔でプロセスツリーのRSSを測り、最大値を保持する"""
+
+    def __init__(self, interval=0.25):
+        super().__init__(name='rss-sampler', daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, _process_tree_rss(os.getpid()))
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        # /proc がない環境では本プロセスの最大RSSのみ
+        if not self.peak:
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return self.peak
+
+
+class PhaseTimer:
+    """関数をラップしてフェーズ別の所要時間を集める"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def wrap(self, func, phase):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                name = phase(*args, **kwargs) if callable(phase) else phase
+                self.samples.setdefault(name, []).append(time.perf_counter() - started)
+        return timed
+
+    def report(self):
+        return {name: summarize(values) for name, values in sorted(self.samples.items())}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def run(args):
+    work_dir = tempfile.mkdtemp(prefix='ultimate_search_bench_')
+    # サーバーモジュールの読み込み前に、キューワーカーやキャッシュを無効化しておく
+    os.environ.setdefault('BATCH_ROOT', work_dir)
+    os.environ['QUEUE_WORKERS'] = '0'
+    os.environ['QUERY_CACHE_TTL'] = '0'
+
+    import page_readiness
+    import ultimate_search_server as server
+    from network_filter import empty_stats, merge_network_stats
+    from screenshot_pipeline import ScreenshotWriter
+
+    engine_server = StandInEngine(
+        page_latency_ms=args.page_latency, suggest_latency_ms=args.suggest_latency
+    ).start()
+    server.ENGINE_URLS.update(engine_server.engine_urls())
+    # 代替サーバーの検索結果URLはすべて /<engine>/search
+    for engine in page_readiness.RESULTS_URL_MARKERS:
+        page_readiness.RESULTS_URL_MARKERS[engine] = '/search'
+
+    timer = PhaseTimer()
+    server.open_page = timer.wrap(server.open_page, 'navigate')
+    server.wait_until_ready = timer.wrap(
+        server.wait_until_ready, lambda driver, engine, condition, *a, **kw: f'wait_{condition}'
+    )
+    typing = server.human_like_typing
+    if args.fast_typing:
+        typing = lambda element, text: element.send_keys(text)  # noqa: E731
+    server.human_like_typing = timer.wrap(typing, 'typing')
+    server.capture_suggestions = timer.wrap(server.capture_suggestions, 'capture_suggestions')
+    server.capture_related = timer.wrap(server.capture_related, 'capture_related')
+    server.extract_terms = timer.wrap(server.extract_terms, 'extract_text')
+
+    sampler = RssSampler()
+    sampler.start()
+
+    # ドライバー起動時間（最後に起動したものを計測に使う）
+    startup_times = []
+    driver = None
+    for _ in range(args.driver_starts):
+        if driver is not None:
+            driver.quit()
+        started = time.perf_counter()
+        driver = server.setup_driver(headless=True)
+        startup_times.append(time.perf_counter() - started)
+
+    writer = ScreenshotWriter(
+        image_format=args.format, quality=args.quality, max_width=args.max_width, workers=args.writer_workers
+    )
+    options = {
+        'basic_suggest': True,
+        'related_words': True,
+        'reputation_search': args.reputation,
+        'review_search': args.reputation,
+        'element_capture': not args.full_page,
+        'extract_text': True,
+    }
+    engines = [engine.strip() for engine in args.engines.split(',') if engine.strip()]
+    query_times = []
+    network = empty_stats()
+    errors = 0
+
+    started_all = time.perf_counter()
+    try:
+        for index in range(args.queries):
+            variation = {'name': f'ベンチマーク株式会社{index}', 'type': 'original'}
+            for engine in engines:
+                folder = os.path.join(work_dir, f'q{index}', engine)
+                os.makedirs(folder, exist_ok=True)
+                started = time.perf_counter()
+                result = server.process_search_with_options(driver, engine, variation, folder, options, writer)
+                query_times.append(time.perf_counter() - started)
+                merge_network_stats(network, server.network_filter.collect(driver))
+                if 'error' in result:
+                    errors += 1
+                    print(f"⚠️ {engine} {variation['name']}: {result['error']}")
+        writer.flush()
+    finally:
+        elapsed = time.perf_counter() - started_all
+        writer.close()
+        driver.quit()
+        peak_rss = sampler.stop()
+        engine_server.stop()
+
+    screenshots = writer.stats()
+    return {
+        'benchmark': 'ultimate_search_offline',
+        'recorded_at': datetime.now().isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'queries': args.queries,
+            'engines': engines,
+            'page_latency_ms': args.page_latency,
+            'suggest_latency_ms': args.suggest_latency,
+            'format': args.format,
+            'quality': args.quality,
+            'max_width': args.max_width,
+            'element_capture': options['element_capture'],
+            'reputation_search': args.reputation,
+            'fast_typing': args.fast_typing,
+            'network_blocking': server.network_filter.enabled,
+        },
+        'driver_startup_seconds': summarize(startup_times),
+        'query_seconds': summarize(query_times),
+        'phases': timer.report(),
+        'elapsed_seconds': round(elapsed, 2),
+        'screenshots': screenshots,
+        'screenshots_per_minute': round(screenshots['screenshots'] / elapsed * 60, 2) if elapsed else None,
+        'bytes_written': screenshots['written_bytes'],
+        'network': network,
+        'peak_rss_bytes': peak_rss,
+        'stand_in_requests': engine_server.requests,
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='代替検索エンジンを使ったオフラインベンチマーク')
+    parser.add_argument('--queries', type=int, default=5, help='エンジンごとの検索回数')
+    parser.add_argument('--engines', default='google,yahoo,bing')
+    parser.add_argument('--page-latency', type=int, default=100, help='ページ応答の遅延（ミリ秒）')
+    parser.add_argument('--suggest-latency', type=int, default=150, help='サジェスト表示までの遅延（ミリ秒）')
+    parser.add_argument('--driver-starts', type=int, default=1, help='ドライバー起動時間の計測回数')
+    parser.add_argument('--format', default='png', choices=['png', 'webp', 'jpeg'])
+    parser.add_argument('--quality', type=int, default=80)
+    parser.add_argument('--max-width', type=int, default=None)
+    parser.add_argument('--writer-workers', type=int, default=2)
+    parser.add_argument('--full-page', action='store_true', help='領域撮影を使わず全画面で撮影')
+    parser.add_argument('--reputation', action='store_true', help='評判・口コミ検索も実行')
+    parser.add_argument('--fast-typing', action='store_true', help='人間らしい入力待ちを省略')
+    parser.add_argument('--output', help='結果JSONの保存先（省略時は benchmarks/results/）')
+    args = parser.parse_args()
+
+    report = run(args)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{report['git_revision'] or 'unknown'}.json"
+        output = os.path.join(RESULTS_DIR, name)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n📊 起動 {report['driver_startup_seconds'].get('mean')}秒 / "
+          f"検索 p50 {report['query_seconds'].get('p50')}秒 / "
+          f"{report['screenshots_per_minute']}枚/分 / ピークRSS {report['peak_rss_bytes'] // (1024 * 1024)}MB")
+    network = report['network']
+    if network['blocked_requests']:
+        print(f"🚫 ブロック {network['blocked_requests']}件 / "
+              f"推定削減 {network['estimated_bytes_saved'] / (1024 * 1024):.1f}MB（種別ごとの推定サイズ） / "
+              f"実転送 {network['transferred_bytes'] / (1024 * 1024):.1f}MB")
+    print(f"💾 結果を保存しました: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""ベンチマーク用のローカル検索エンジン（google / yahoo / bing の代替）
+
+トップページと検索結果ページを本物と同じセレクタで返す。
+  - 検索ボックス（get_search_box と page_readiness が参照するもの）
+  - 入力に応じたサジェストのドロップダウン（表示までの遅延を設定可能）
+  - 検索結果と関連ワードのブロック
+ページ応答にも人工的な遅延を入れられる。
+
+単体起動: python benchmarks/stand_in_engine.py --port 8765 --page-latency 200
+"""
+import argparse
+import html
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+# エンジンごとのマークアップ
+ENGINE_LAYOUTS = {
+    'google': {
+        'query_param': 'q',
+        'search_box': '<textarea name="q" rows="1" style="width:600px;font-size:16px"></textarea>',
+        'suggest_container': '<ul role="listbox" class="erkvQe" id="suggest" style="display:none"></ul>',
+        'suggest_item': '<li role="option"><span>{term}</span></li>',
+        'results_open': '<div id="search"><div id="rso">',
+        'results_close': '</div></div>',
+        'related': '<div id="botstuff"><div id="bres"><div class="oIk2Cb">{links}</div></div></div>',
+    },
+    'yahoo': {
+        'query_param': 'p',
+        'search_box': '<input name="p" type="text" style="width:600px;font-size:16px">',
+        'suggest_container': '<ul role="listbox" class="SearchBoxSuggest" id="suggest" style="display:none"></ul>',
+        'suggest_item': '<li role="option">{term}</li>',
+        'results_open': '<div id="contents"><div id="web">',
+        'results_close': '</div></div>',
+        'related': '<div class="sw-Relation">{links}</div>',
+    },
+    'bing': {
+        'query_param': 'q',
+        'search_box': '<input id="sb_form_q" name="q" type="search" style="width:600px;font-size:16px">',
+        'suggest_container': '<ul id="sa_ul" role="listbox" style="display:none"></ul>',
+        'suggest_item': '<li class="sa_sg" role="option"><span class="sa_tm_text">{term}</span></li>',
+        'results_open': '<ol id="b_results">',
+        'results_close': '</ol>',
+        'related': '<li class="b_ans"><div class="b_rs">{links}</div></li>',
+    },
+}
+
+# サジェスト・関連ワードの語尾
+SUGGEST_SUFFIXES = ['評判', '口コミ', '年収', '採用', '本社', '社長', 'ホームページ', '株価']
+RELATED_SUFFIXES = ['とは', '評判', '口コミ', '売上', '従業員数', '事業内容', '設立', '所在地']
+
+_PAGE = """<!DOCTYPE html>
+<html lang="ja"><head><meta charset="utf-8"><title>{title}</title>
+<style>body{{font-family:sans-serif;margin:20px}} li{{list-style:none;padding:4px}}
+.result{{height:120px;border-bottom:1px solid #ddd}}</style></head>
+<body>{body}</body></html>"""
+
+_SEARCH_FORM = """
+<div id="searchform">{search_box}{suggest_container}</div>
+<script>
+const box = document.querySelector('[name="{query_param}"]');
+const list = document.querySelector('[role="listbox"]');
+const suffixes = {suffixes};
+let timer = null;
+box.value = {initial};
+box.addEventListener('input', () => {{
+    clearTimeout(timer);
+    timer = setTimeout(() => {{
+        const text = box.value.trim();
+        list.innerHTML = text ? suffixes.map(s => {item_template}.replace('{{term}}', text + ' ' + s)).join('') : '';
+        list.style.display = text ? 'block' : 'none';
+    }}, {suggest_latency});
+}});
+box.addEventListener('keydown', (event) => {{
+    if (event.key === 'Enter') {{
+        event.preventDefault();
+        location.href = '/{engine}/search?{query_param}=' + encodeURIComponent(box.value);
+    }}
+}});
+</script>"""
+
+
+def render_home(engine, suggest_latency_ms):
+    layout = ENGINE_LAYOUTS[engine]
+    return _PAGE.format(title=f'{engine} stand-in', body=_render_form(engine, layout, '', suggest_latency_ms))
+
+
+def render_results(engine, query, suggest_latency_ms, result_count=8):
+    layout = ENGINE_LAYOUTS[engine]
+    escaped = html.escape(query)
+    results = ''.join(
+        f'<div class="result"><h3><a href="#r{i}">{escaped} - 検索結果 {i + 1}</a></h3>'
+        f'<p>{escaped} に関するダミーの説明文です。</p></div>'
+        for i in range(result_count)
+    )
+    links = ''.join(
+        f'<a href="/{engine}/search?{layout["query_param"]}={quote(query + " " + suffix)}">{escaped} {suffix}</a><br>'
+        for suffix in RELATED_SUFFIXES
+    )
+    body = (
+        _render_form(engine, layout, query, suggest_latency_ms)
+        + layout['results_open'] + results + layout['related'].format(links=links) + layout['results_close']
+    )
+    return _PAGE.format(title=f'{escaped} - {engine} stand-in', body=body)
+
+
+def _render_form(engine, layout, query, suggest_latency_ms):
+    return _SEARCH_FORM.format(
+        search_box=layout['search_box'],
+        suggest_container=layout['suggest_container'],
+        query_param=layout['query_param'],
+        suffixes=json.dumps(SUGGEST_SUFFIXES, ensure_ascii=False),
+        initial=json.dumps(query, ensure_ascii=False),
+        item_template=json.dumps(layout['suggest_item'], ensure_ascii=False),
+        suggest_latency=int(suggest_latency_ms),
+        engine=engine,
+    )
+
+
+class StandInEngine:
+    """代替検索エンジンのHTTPサーバー（別スレッドで起動）"""
+
+    def __init__(self, host='127.0.0.1', port=0, page_latency_ms=0, suggest_latency_ms=150):
+        self.page_latency_ms = page_latency_ms
+        self.suggest_latency_ms = suggest_latency_ms
+        self.requests = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def engine_urls(self):
+        """ENGINE_URLS と同じ形の辞書"""
+        return {engine: f'{self.base_url}/{engine}/' for engine in ENGINE_LAYOUTS}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stand-in-engine', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        engine_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                engine_server.requests += 1
+                parsed = urlparse(self.path)
+                parts = parsed.path.strip('/').split('/')
+                engine = parts[0] if parts else ''
+                if engine not in ENGINE_LAYOUTS:
+                    self.send_error(404)
+                    return
+
+                if engine_server.page_latency_ms:
+                    time.sleep(engine_server.page_latency_ms / 1000)
+
+                if len(parts) > 1 and parts[1] == 'search':
+                    param = ENGINE_LAYOUTS[engine]['query_param']
+                    query = parse_qs(parsed.query).get(param, [''])[0]
+                    page = render_results(engine, query, engine_server.suggest_latency_ms)
+                else:
+                    page = render_home(engine, engine_server.suggest_latency_ms)
+
+                body = page.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ベンチマーク用のローカル検索エンジン')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--page-latency', type=int, default=0, help='ページ応答の遅延（ミリ秒）')
+    parser.add_argument('--suggest-latency', type=int, default=150, help='サジェスト表示までの遅延（ミリ秒）')
+    args = parser.parse_args()
+
+    engine = StandInEngine(args.host, args.port, args.page_latency, args.suggest_latency)
+    print(f"🧪 代替検索エンジン起動: {engine.base_url}")
+    for name, url in engine.engine_urls().items():
+        print(f"  {name}: {url}")
+    try:
+        engine._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
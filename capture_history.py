@@ -0,0 +1,145 @@
+"""実行をまたいだ撮影履歴と変化検出
+
+撮影ごとに（会社, エンジン, パターン種別, 撮影種別）と知覚ハッシュ（dHash）を記録し、
+前回の実行で同じキーを撮影した画像とのハミング距離で変化の有無を判定する。
+見た目がほぼ同じ画像は「変化なし」となり、確認が必要な撮影だけを絞り込める。
+"""
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    from PIL import Image
+except ImportError:  # Pillowがなければ履歴は記録しない
+    Image = None
+
+# ハッシュの一辺（8 -> 64ビット）
+HASH_SIZE = 8
+
+# 変化ありとみなすハミング距離（これより大きいと変化あり）
+DEFAULT_CHANGE_THRESHOLD = 6
+
+# 判定結果
+STATUS_NEW = 'new'
+STATUS_CHANGED = 'changed'
+STATUS_UNCHANGED = 'unchanged'
+
+
+def dhash_image(image, hash_size=HASH_SIZE):
+    """Pillow画像の差分ハッシュ（16進文字列）"""
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return f'{value:0{hash_size * hash_size // 4}x}'
+
+
+def hamming_distance(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+
+class CaptureHistory:
+    """撮影履歴のインデックス（SQLite）"""
+
+    def __init__(self, path, change_threshold=DEFAULT_CHANGE_THRESHOLD):
+        self.path = path
+        self.change_threshold = change_threshold
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS captures (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    company TEXT NOT NULL,
+                    engine TEXT NOT NULL,
+                    variation_type TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    batch_id TEXT NOT NULL,
+                    captured_at REAL NOT NULL,
+                    path TEXT,
+                    phash TEXT NOT NULL,
+                    previous_id INTEGER,
+                    distance INTEGER,
+                    status TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_captures_key
+                    ON captures (company, engine, variation_type, kind, captured_at);
+                CREATE INDEX IF NOT EXISTS idx_captures_batch ON captures (batch_id, status);
+            ''')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def record(self, company, engine, variation_type, kind, batch_id, path, phash):
+        """撮影を記録し、前回の実行の同じキーと比較した結果を返す"""
+        now = time.time()
+        with self._connect() as conn:
+            previous = conn.execute(
+                'SELECT id, batch_id, phash, captured_at FROM captures '
+                'WHERE company = ? AND engine = ? AND variation_type = ? AND kind = ? AND batch_id != ? '
+                'ORDER BY captured_at DESC LIMIT 1',
+                (company, engine, variation_type, kind, batch_id)
+            ).fetchone()
+            if previous is None:
+                distance, status = None, STATUS_NEW
+            else:
+                distance = hamming_distance(phash, previous[2])
+                status = STATUS_CHANGED if distance > self.change_threshold else STATUS_UNCHANGED
+            conn.execute(
+                'INSERT INTO captures (company, engine, variation_type, kind, batch_id, captured_at, path, '
+                'phash, previous_id, distance, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (company, engine, variation_type, kind, batch_id, now, path, phash,
+                 previous[0] if previous else None, distance, status)
+            )
+        return {
+            'status': status,
+            'distance': distance,
+            'phash': phash,
+            'previous_batch_id': previous[1] if previous else None,
+            'previous_captured_at': datetime.fromtimestamp(previous[3]).isoformat() if previous else None,
+        }
+
+    def query(self, batch_id=None, company=None, engine=None, changed_only=False, limit=100, offset=0):
+        """撮影履歴を新しい順に返す（changed_only なら新規・変化ありのみ）"""
+        conditions = []
+        params = []
+        for column, value in (('batch_id', batch_id), ('company', company), ('engine', engine)):
+            if value:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        if changed_only:
+            conditions.append('status != ?')
+            params.append(STATUS_UNCHANGED)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        with self._connect() as conn:
+            total = conn.execute(f'SELECT COUNT(*) FROM captures {where}', params).fetchone()[0]
+            rows = conn.execute(
+                'SELECT company, engine, variation_type, kind, batch_id, captured_at, path, phash, distance, status '
+                f'FROM captures {where} ORDER BY captured_at DESC, id DESC LIMIT ? OFFSET ?',
+                params + [limit, offset]
+            ).fetchall()
+        return {
+            'total': total,
+            'captures': [{
+                'company': row[0],
+                'engine': row[1],
+                'variation_type': row[2],
+                'kind': row[3],
+                'batch_id': row[4],
+                'captured_at': datetime.fromtimestamp(row[5]).isoformat(),
+                'path': row[6],
+                'phash': row[7],
+                'distance': row[8],
+                'status': row[9],
+            } for row in rows],
+        }
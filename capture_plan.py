@@ -0,0 +1,67 @@
+"""撮影オプションから (エンジン, パターン) ごとの撮影計画を作る
+
+基本・評判・口コミの各検索を「検索語の入力 → サジェスト撮影 → 検索実行 → 結果ページの撮影」の
+ステップとして並べる。2つ目以降のステップは直前の検索結果ページの検索ボックスを入力し直して
+実行するため、トップページを開くのは最初のステップだけになる。
+撮影する内容と保存ファイル名は計画にしても変わらない。
+"""
+import random
+
+# (ステップ名, 検索語に付けるキーワード, 有効化オプション, 既定値)
+SEARCH_STEPS = (
+    ('basic', None, 'basic_suggest', True),
+    ('reputation', '評判', 'reputation_search', False),
+    ('review', '口コミ', 'review_search', False),
+)
+
+# 撮影の種類
+CAPTURE_SUGGESTIONS = 'suggestions'  # 検索実行前（サジェスト領域）
+CAPTURE_MAPS = 'maps'                # 検索実行後（Googleマップを検出した場合のみ全画面）
+CAPTURE_RELATED = 'related'          # 検索実行後（関連ワード領域）
+
+
+def _capture(result_key, file_kind, engine_name, variation, capture):
+    return {
+        'key': result_key,
+        'filename': f'{engine_name}_{file_kind}_{variation["type"]}.png',
+        'capture': capture,
+    }
+
+
+def build_capture_plan(engine_name, variation, options):
+    """撮影計画（ステップのリスト）
+
+    各ステップ: {'name', 'query', 'navigate', 'suggest_delay', 'results_delay', 'captures'}
+    navigate が False のステップは表示中の検索結果ページから再検索する。
+    """
+    steps = []
+    for name, keyword, option_key, default in SEARCH_STEPS:
+        if not options.get(option_key, default):
+            continue
+
+        if name == 'basic':
+            query = variation['name']
+            captures = [_capture('suggest', 'suggest', engine_name, variation, CAPTURE_SUGGESTIONS)]
+            if engine_name == 'google' and options.get('google_maps', False):
+                captures.append(_capture('google_maps', 'maps', engine_name, variation, CAPTURE_MAPS))
+            if options.get('related_words', True):
+                captures.append(_capture('related_words', 'related', engine_name, variation, CAPTURE_RELATED))
+            # 最初の検索は描画を長めに待つ（フォールバック時）
+            suggest_delay, results_delay = random.uniform(2, 4), random.uniform(4, 6)
+        else:
+            query = f'{variation["name"]} {keyword}'
+            captures = [
+                _capture(f'{name}_suggest', f'{name}_suggest', engine_name, variation, CAPTURE_SUGGESTIONS),
+                _capture(f'{name}_related', f'{name}_related', engine_name, variation, CAPTURE_RELATED),
+            ]
+            suggest_delay, results_delay = 2, 3
+
+        steps.append({
+            'name': name,
+            'query': query,
+            'navigate': not steps,
+            'suggest_delay': suggest_delay,
+            'results_delay': results_delay,
+            'captures': captures,
+        })
+    return steps
@@ -0,0 +1,121 @@
+"""検索エンジン別の切り出し領域
+
+サジェストのドロップダウンと関連ワードのブロックを特定し、その範囲だけを
+CDP Page.captureScreenshot（clip指定）で撮影する。要素が見つからない場合は None を返し、
+呼び出し側で全画面撮影にフォールバックする。
+"""
+import base64
+
+# 領域ごとのセレクタ
+#   target: 撮影対象（最初に見つかった表示中の要素）
+#   anchor: 一緒に含める要素（サジェストでは入力中の検索ボックス）
+REGION_SELECTORS = {
+    'google': {
+        'suggestions': {
+            'target': ['ul[role="listbox"]', '.aajZCb', '.erkvQe'],
+            'anchor': ['textarea[name="q"]', 'input[name="q"]'],
+        },
+        'related': {
+            'target': ['#bres', '.oIk2Cb', '#botstuff div[data-abe]'],
+        },
+    },
+    'yahoo': {
+        'suggestions': {
+            'target': ['[role="listbox"]', '.SearchBoxSuggest', '#ATB'],
+            'anchor': ['input[name="p"]'],
+        },
+        'related': {
+            'target': ['.sw-Relation', '#Sc2', '.Rkw'],
+        },
+    },
+    'bing': {
+        'suggestions': {
+            'target': ['#sa_ul', '.sa_as', '[role="listbox"]'],
+            'anchor': ['#sb_form_q', 'input[name="q"]'],
+        },
+        'related': {
+            'target': ['#b_results .b_rs', '#brsv3', '.b_rrsr'],
+        },
+    },
+}
+
+# 切り出し範囲の余白（px）
+REGION_PADDING = 16
+
+_LOCATE_JS = """
+const targetSelectors = arguments[0];
+const anchorSelectors = arguments[1];
+const padding = arguments[2];
+
+function firstVisible(selectors) {
+    for (const selector of selectors) {
+        for (const el of document.querySelectorAll(selector)) {
+            const rect = el.getBoundingClientRect();
+            const style = window.getComputedStyle(el);
+            if (rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden' && style.display !== 'none') {
+                return rect;
+            }
+        }
+    }
+    return null;
+}
+
+const target = firstVisible(targetSelectors);
+if (!target) {
+    return null;
+}
+const rects = [target];
+const anchor = anchorSelectors.length ? firstVisible(anchorSelectors) : null;
+if (anchor) {
+    rects.push(anchor);
+}
+
+const left = Math.min(...rects.map(r => r.left)) - padding;
+const top = Math.min(...rects.map(r => r.top)) - padding;
+const right = Math.max(...rects.map(r => r.right)) + padding;
+const bottom = Math.max(...rects.map(r => r.bottom)) + padding;
+const pageWidth = Math.max(document.documentElement.scrollWidth, window.innerWidth);
+
+const x = Math.max(0, left + window.scrollX);
+const y = Math.max(0, top + window.scrollY);
+return {
+    x: x,
+    y: y,
+    width: Math.min(right + window.scrollX, pageWidth) - x,
+    height: bottom + window.scrollY - y,
+};
+"""
+
+
+def locate_region(driver, engine_name, region):
+    """領域のページ座標（x, y, width, height）を返す。見つからなければ None"""
+    selectors = REGION_SELECTORS.get(engine_name, {}).get(region)
+    if not selectors:
+        return None
+    try:
+        rect = driver.execute_script(
+            _LOCATE_JS, selectors['target'], selectors.get('anchor', []), REGION_PADDING
+        )
+    except Exception as e:
+        print(f"⚠️ {engine_name} {region} 領域の特定に失敗: {e}")
+        return None
+    if not rect or rect['width'] <= 0 or rect['height'] <= 0:
+        return None
+    return rect
+
+
+def capture_region_png(driver, engine_name, region):
+    """領域だけを撮影したPNGバイト列を返す。見つからなければ None"""
+    rect = locate_region(driver, engine_name, region)
+    if rect is None:
+        return None
+    try:
+        shot = driver.execute_cdp_cmd('Page.captureScreenshot', {
+            'format': 'png',
+            'captureBeyondViewport': True,
+            'clip': dict(rect, scale=1),
+        })
+        return base64.b64decode(shot['data'])
+    except Exception as e:
+        print(f"⚠️ {engine_name} {region} 領域の撮影に失敗: {e}")
+        return None
@@ -0,0 +1,184 @@
+"""企業リストの取り込み（Excel / CSV / TSV）
+
+アップロードされたストリームを直接読み、1行ずつ正規化・重複削除する。
+Excelは openpyxl の read-only モードで読み込むため、行数が増えてもメモリ使用量がほぼ一定。
+旧形式の .xls は xlrd で読み込む（最大65536行のためファイル全体を読み込む）。
+"""
+import csv
+import io
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+
+from company_names import normalize_company_name
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+LEGACY_EXCEL_EXTENSIONS = ('.xls',)
+DELIMITED_EXTENSIONS = {'.csv': ',', '.tsv': '\t', '.txt': '\t'}
+
+# 文字コード判定に使う先頭バイト数
+_SNIFF_BYTES = 64 * 1024
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+class IngestError(ValueError):
+    """取り込みできないファイル・指定"""
+
+
+def cell_text(value):
+    """セル値を文字列に整形（空なら None）"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    name = _WHITESPACE.sub(' ', str(value)).strip()
+    return name or None
+
+
+def _detect_encoding(stream):
+    head = stream.read(_SNIFF_BYTES)
+    stream.seek(0)
+    for encoding in ('utf-8-sig', 'cp932'):
+        try:
+            head.decode(encoding)
+            return encoding
+        except UnicodeDecodeError as e:
+            # 先頭バイト列の末尾で文字が途切れただけならその文字コードとみなす
+            if e.start >= len(head) - 3:
+                return encoding
+    return 'utf-8-sig'
+
+
+def _resolve_column(header, column):
+    """列指定（見出し名または0始まりの番号）を列番号に変換"""
+    if column is None or column == '':
+        return 0
+    if isinstance(column, int) or str(column).isdigit():
+        return int(column)
+    for index, value in enumerate(header):
+        if cell_text(value) == str(column).strip():
+            return index
+    raise IngestError(f'列が見つかりません: {column}')
+
+
+def ingest_companies(stream, filename, sheet=None, column=None, has_header=True):
+    """アップロードを読み込み、重複を除いた会社名リストと集計を返す"""
+    ext = os.path.splitext(filename or '')[1].lower()
+    sheets = []
+
+    if ext in EXCEL_EXTENSIONS:
+        # openpyxl は読み込みが重いため、Excelを受け取ったときだけ読み込む
+        from openpyxl import load_workbook
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+        sheets = workbook.sheetnames
+        if sheet:
+            if sheet not in sheets:
+                workbook.close()
+                raise IngestError(f'シートが見つかりません: {sheet}')
+            worksheet = workbook[sheet]
+        else:
+            worksheet = workbook.worksheets[0]
+        sheet = worksheet.title
+        rows = worksheet.iter_rows(values_only=True)
+        close = workbook.close
+    elif ext in LEGACY_EXCEL_EXTENSIONS:
+        try:
+            import xlrd
+        except ImportError:
+            raise IngestError('.xls の読み込みに必要な xlrd がインストールされていません。'
+                              '.xlsx または .csv に変換してアップロードしてください')
+        book = xlrd.open_workbook(file_contents=stream.read(), on_demand=True)
+        sheets = book.sheet_names()
+        if sheet:
+            if sheet not in sheets:
+                book.release_resources()
+                raise IngestError(f'シートが見つかりません: {sheet}')
+            worksheet = book.sheet_by_name(sheet)
+        else:
+            worksheet = book.sheet_by_index(0)
+        sheet = worksheet.name
+        rows = (worksheet.row_values(index) for index in range(worksheet.nrows))
+        close = book.release_resources
+    elif ext in DELIMITED_EXTENSIONS:
+        text = io.TextIOWrapper(stream, encoding=_detect_encoding(stream), newline='')
+        rows = csv.reader(text, delimiter=DELIMITED_EXTENSIONS[ext])
+        close = text.detach
+    else:
+        raise IngestError(f'未対応のファイル形式です: {ext or filename}')
+
+    companies = OrderedDict()
+    total_rows = 0
+    empty_rows = 0
+    columns = []
+    column_index = None
+
+    try:
+        for row in rows:
+            if column_index is None:
+                if has_header:
+                    columns = [cell_text(value) or '' for value in row]
+                    column_index = _resolve_column(columns, column)
+                    continue
+                column_index = _resolve_column([], column)
+
+            total_rows += 1
+            # 会社名は検索時と同じ正規化（NFKC・法人格の略記の統一）をしてから重複を除く
+            name = cell_text(row[column_index]) if column_index < len(row) else None
+            if name is not None:
+                name = normalize_company_name(name) or None
+            if name is None:
+                empty_rows += 1
+                continue
+            companies[name] = None
+    finally:
+        close()
+
+    column_name = column_index
+    if has_header and column_index is not None and column_index < len(columns):
+        column_name = columns[column_index]
+
+    return {
+        'companies': list(companies),
+        'total_rows': total_rows,
+        'empty_rows': empty_rows,
+        'duplicates': total_rows - empty_rows - len(companies),
+        'column_name': column_name,
+        'columns': columns,
+        'sheet': sheet,
+        'sheets': sheets,
+    }
+
+
+class UploadStore:
+    """取り込み済みリストを一定件数だけメモリに保持し、ページ単位で返す"""
+
+    def __init__(self, max_uploads=10):
+        self.max_uploads = max_uploads
+        self._uploads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, companies):
+        upload_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._uploads[upload_id] = companies
+            while len(self._uploads) > self.max_uploads:
+                self._uploads.popitem(last=False)
+        return upload_id
+
+    def page(self, upload_id, offset=0, limit=None):
+        with self._lock:
+            companies = self._uploads.get(upload_id)
+            if companies is None:
+                return None
+            self._uploads.move_to_end(upload_id)
+        end = len(companies) if limit is None else offset + limit
+        return {
+            'companies': companies[offset:end],
+            'count': len(companies),
+            'offset': offset,
+            'limit': limit,
+            'has_more': end < len(companies),
+        }
@@ -0,0 +1,87 @@
+"""会社名の正規化
+
+全角半角の混在（NFKC）、空白の揺れ、法人格の略記（(株)・㈱・（有）など）を統一し、
+入力の書き方が違っても同じ会社なら同じ検索語になるようにする。
+"""
+import re
+import unicodedata
+
+# 法人格 -> 略記（NFKC 正規化後の表記。㈱・（株）などは NFKC で (株) になる）
+LEGAL_ENTITY_FORMS = {
+    '株式会社': ['(株)', '株式會社'],
+    '有限会社': ['(有)'],
+    '合同会社': ['(同)'],
+    '合資会社': ['(資)'],
+    '合名会社': ['(名)'],
+    '一般社団法人': ['(一社)', '(社)'],
+    '一般財団法人': ['(一財)', '(財)'],
+    '公益社団法人': ['(公社)'],
+    '公益財団法人': ['(公財)'],
+    '特定非営利活動法人': ['NPO法人', '(特非)'],
+    '社会福祉法人': ['(福)'],
+    '医療法人': ['(医)'],
+    '学校法人': ['(学)'],
+    '宗教法人': ['(宗)'],
+    '独立行政法人': ['(独)'],
+}
+
+# 法人格を付けないで入力された場合に補う法人格
+DEFAULT_LEGAL_ENTITY = '株式会社'
+
+_WHITESPACE = re.compile(r'\s+')
+
+# 表記（正式名・略記）-> 正式名（長いものから照合する）
+_FORM_ALIASES = sorted(
+    [(form, form) for form in LEGAL_ENTITY_FORMS]
+    + [(alias, form) for form, aliases in LEGAL_ENTITY_FORMS.items() for alias in aliases],
+    key=lambda entry: -len(entry[0]),
+)
+
+
+def _clean(text):
+    text = unicodedata.normalize('NFKC', str(text or ''))
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def parse_company_name(raw_name):
+    """会社名を正規化して法人格と本体に分ける
+
+    戻り値: {'name': 正規化した会社名, 'base': 法人格を除いた名前,
+             'legal_entity': 法人格（なければ None）, 'position': 'prefix' / 'suffix' / 'embedded' / None}
+    法人格が名前の途中にある場合（例: ABC株式会社東京）も法人格ありとし、本体は法人格を除いた前後をつなげる。
+    """
+    text = _clean(raw_name)
+    for alias, form in _FORM_ALIASES:
+        if text.startswith(alias) and len(text) > len(alias):
+            base = text[len(alias):].strip()
+            return {'name': f'{form}{base}', 'base': base, 'legal_entity': form, 'position': 'prefix'}
+        if text.endswith(alias) and len(text) > len(alias):
+            base = text[:-len(alias)].strip()
+            return {'name': f'{base}{form}', 'base': base, 'legal_entity': form, 'position': 'suffix'}
+    for alias, form in _FORM_ALIASES:
+        index = text.find(alias)
+        if index > 0:
+            before, after = text[:index], text[index + len(alias):]
+            return {'name': f'{before}{form}{after}', 'base': _clean(f'{before}{after}'),
+                    'legal_entity': form, 'position': 'embedded'}
+    return {'name': text, 'base': text, 'legal_entity': None, 'position': None}
+
+
+def normalize_company_name(raw_name):
+    """正規化した会社名（法人格は正式名、前後の空白なし）"""
+    return parse_company_name(raw_name)['name']
+
+
+def company_variations(raw_name):
+    """検索パターン（法人格ありなら「そのまま / 法人格なし」、なしなら「そのまま / 前株 / 後株」）"""
+    parsed = parse_company_name(raw_name)
+    if parsed['legal_entity']:
+        return [
+            {'name': parsed['name'], 'type': 'with_corp'},
+            {'name': parsed['base'], 'type': 'without_corp'},
+        ]
+    return [
+        {'name': parsed['name'], 'type': 'original'},
+        {'name': f'{DEFAULT_LEGAL_ENTITY}{parsed["name"]}', 'type': 'prefix_corp'},
+        {'name': f'{parsed["name"]}{DEFAULT_LEGAL_ENTITY}', 'type': 'suffix_corp'},
+    ]
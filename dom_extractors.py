@@ -0,0 +1,75 @@
+"""サジェスト・関連ワードのテキスト抽出
+
+撮影と同じタイミングでDOMから候補文字列を取り出す。OCRに比べて桁違いに軽く、
+検索・差分比較に使える構造化データになる。コンテナのセレクタは capture_regions と共通。
+"""
+from capture_regions import REGION_SELECTORS
+
+# コンテナ内で1候補を表す要素
+ITEM_SELECTORS = {
+    'google': {
+        'suggestions': '[role="option"], li',
+        'related': 'a',
+    },
+    'yahoo': {
+        'suggestions': '[role="option"], li',
+        'related': 'a',
+    },
+    'bing': {
+        'suggestions': '.sa_tm_text, [role="option"], li',
+        'related': 'a',
+    },
+}
+
+# 1領域あたりの最大件数
+MAX_TERMS = 50
+
+_EXTRACT_JS = """
+const containerSelectors = arguments[0];
+const itemSelector = arguments[1];
+const maxTerms = arguments[2];
+
+function visible(el) {
+    const rect = el.getBoundingClientRect();
+    return rect.width > 0 && rect.height > 0;
+}
+
+for (const selector of containerSelectors) {
+    for (const container of document.querySelectorAll(selector)) {
+        if (!visible(container)) {
+            continue;
+        }
+        let texts = Array.from(container.querySelectorAll(itemSelector)).map(el => el.innerText);
+        if (texts.length === 0) {
+            texts = container.innerText.split('\\n');
+        }
+        const seen = new Set();
+        const terms = [];
+        for (const text of texts) {
+            const term = (text || '').split('\\n')[0].replace(/\\s+/g, ' ').trim();
+            if (term && !seen.has(term)) {
+                seen.add(term);
+                terms.push(term);
+            }
+            if (terms.length >= maxTerms) {
+                break;
+            }
+        }
+        return terms;
+    }
+}
+return [];
+"""
+
+
+def extract_terms(driver, engine_name, region):
+    """領域内の候補文字列リストを返す（見つからなければ空リスト）"""
+    containers = REGION_SELECTORS.get(engine_name, {}).get(region)
+    item_selector = ITEM_SELECTORS.get(engine_name, {}).get(region)
+    if not containers or not item_selector:
+        return []
+    try:
+        return driver.execute_script(_EXTRACT_JS, containers['target'], item_selector, MAX_TERMS) or []
+    except Exception as e:
+        print(f"⚠️ {engine_name} {region} テキスト抽出エラー: {e}")
+        return []
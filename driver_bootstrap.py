@@ -0,0 +1,171 @@
+"""ドライバー起動に使う準備物のディスクキャッシュ
+
+  - User-Agent のサンプル（fake_useragent のデータセットから抽出）
+  - パッチ済みの chromedriver（インストール済みChromeのメジャーバージョンごと）
+
+どちらもプロセス内で一度だけ読み込み、ディスクに保存してワーカーの再起動後も使い回す。
+fake_useragent・undetected_chromedriver は実際に必要になるまで読み込まない。
+"""
+import fcntl
+import json
+import os
+import random
+import shutil
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+# キャッシュの保存先（コンテナではイメージ内またはボリュームを指定）
+CACHE_DIR = os.environ.get(
+    'DRIVER_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'ultimate_search')
+)
+
+# 保存するUser-Agentの数（fake_useragent の出現比率どおりに抽出）
+USER_AGENT_SAMPLES = 500
+
+# User-Agentのサンプルを作り直すまでの秒数
+USER_AGENT_CACHE_TTL = int(os.environ.get('USER_AGENT_CACHE_TTL', str(7 * 86400)))
+
+_lock = threading.Lock()
+_user_agents = None
+
+
+@contextmanager
+def _file_lock(name):
+    """プロセス間の排他（同時に起動したワーカーが同じファイルを作らないように）"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(os.path.join(CACHE_DIR, f'{name}.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def load_user_agents():
+    """User-Agentのサンプル（ディスクになければ fake_useragent から作成）"""
+    global _user_agents
+    with _lock:
+        if _user_agents:
+            return _user_agents
+
+        path = os.path.join(CACHE_DIR, 'user_agents.json')
+        agents = None
+        try:
+            if time.time() - os.path.getmtime(path) < USER_AGENT_CACHE_TTL:
+                agents = _read_json(path)
+        except OSError:
+            pass
+
+        if not agents:
+            with _file_lock('user_agents'):
+                agents = _read_json(path) if os.path.exists(path) else None
+                if not agents or time.time() - os.path.getmtime(path) >= USER_AGENT_CACHE_TTL:
+                    from fake_useragent import UserAgent
+                    user_agent = UserAgent()
+                    agents = [user_agent.random for _ in range(USER_AGENT_SAMPLES)]
+                    _write_json(path, agents)
+                    print(f"💾 User-Agentのサンプルを保存しました（{len(agents)}件）")
+
+        _user_agents = agents
+        return agents
+
+
+def random_user_agent():
+    return random.choice(load_user_agents())
+
+
+def find_chrome_executable():
+    """Chrome本体のパス（CHROME_BIN があれば優先）"""
+    if os.environ.get('CHROME_BIN'):
+        return os.environ['CHROME_BIN']
+    for name in ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome'):
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+def chrome_version():
+    """インストール済みChromeのバージョン文字列（実行ファイルの更新時刻が同じならキャッシュを返す）"""
+    executable = find_chrome_executable()
+    if not executable:
+        return None
+    executable = os.path.realpath(executable)
+    mtime = os.path.getmtime(executable)
+
+    path = os.path.join(CACHE_DIR, 'chrome_versions.json')
+    versions = _read_json(path) or {}
+    cached = versions.get(executable)
+    if cached and cached.get('mtime') == mtime:
+        return cached['version']
+
+    output = subprocess.check_output([executable, '--version'], stderr=subprocess.DEVNULL, timeout=30)
+    version = next((part for part in output.decode().split() if part[:1].isdigit()), None)
+    if version:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        versions[executable] = {'mtime': mtime, 'version': version}
+        _write_json(path, versions)
+    return version
+
+
+def patched_driver_path():
+    """Chromeのメジャーバージョンに合うパッチ済み chromedriver（なければ取得・パッチしてキャッシュ）
+
+    戻り値: (chromedriverのパス, メジャーバージョン)。Chromeが見つからなければ (None, None)
+    """
+    version = chrome_version()
+    if not version:
+        return None, None
+    major = int(version.split('.')[0])
+    path = os.path.join(CACHE_DIR, f'chromedriver_{major}')
+    if os.path.exists(path):
+        return path, major
+
+    with _file_lock('chromedriver'):
+        if not os.path.exists(path):
+            from undetected_chromedriver import Patcher
+            started = time.monotonic()
+            patcher = Patcher(version_main=major)
+            patcher.auto()
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            shutil.copy2(patcher.executable_path, temp_path)
+            os.replace(temp_path, path)
+            # 古いバージョン用のバイナリは削除
+            for name in os.listdir(CACHE_DIR):
+                if name.startswith('chromedriver_') and name != os.path.basename(path) and '.' not in name:
+                    try:
+                        os.unlink(os.path.join(CACHE_DIR, name))
+                    except OSError:
+                        pass
+            print(f"💾 パッチ済みchromedriverを保存しました（Chrome {major}, {time.monotonic() - started:.1f}秒）")
+    return path, major
+
+
+def prewarm():
+    """起動直後に準備物と重いモジュールを読み込んでおく（最初の撮影を待たせない）"""
+    started = time.monotonic()
+    try:
+        load_user_agents()
+        patched_driver_path()
+        import undetected_chromedriver  # noqa: F401
+        import selenium.webdriver  # noqa: F401
+        print(f"🔥 ドライバーの準備完了（{time.monotonic() - started:.1f}秒）")
+    except Exception as e:
+        print(f"⚠️ ドライバーの事前準備に失敗: {e}")
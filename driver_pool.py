@@ -0,0 +1,252 @@
+"""Chromeドライバープール
+
+起動済みのブラウザセッションをバッチ間で使い回す。
+貸し出し時にヘルスチェックを行い、返却時にCookie・ストレージをリセットする。
+一定回数のページ遷移または一定時間を超えたセッションは破棄して作り直す。
+メモリ監視（memory_watchdog）がリサイクルを予約したセッションも、次の返却・貸し出し時に作り直す。
+"""
+import threading
+import time
+
+
+class _Session:
+    """プール内の1ブラウザセッション"""
+
+    def __init__(self, driver, headless):
+        self.driver = driver
+        self.headless = headless
+        self.created_at = time.monotonic()
+        self.navigations = 0
+        # メモリ監視の最新の計測値とリサイクル予約の理由
+        self.memory = None
+        self.peak_rss_bytes = 0
+        self.recycle_reason = None
+
+    @property
+    def age(self):
+        return time.monotonic() - self.created_at
+
+
+class DriverPool:
+    """ウォームなChromeセッションの貸し出し・返却を管理する
+
+    factory(headless=...) で新しいドライバーを生成する。
+    ヘッドレスモードのセッションのみプールし、画面表示モードは都度起動・終了する。
+    """
+
+    def __init__(self, factory, size=1, max_navigations=200, max_age=1800, reset_origins=()):
+        self.factory = factory
+        self.size = size
+        self.max_navigations = max_navigations
+        self.max_age = max_age
+        self.reset_origins = list(reset_origins)
+        self._idle = []
+        self._sessions = {}  # id(driver) -> _Session（貸し出し中を含む全セッション）
+        self._creating = 0
+        self._cond = threading.Condition()
+        self._stats = {'created': 0, 'reused': 0, 'recycled': 0, 'unhealthy': 0, 'memory_recycled': 0}
+
+    def prewarm(self, count=None):
+        """プールをあらかじめ埋めておく"""
+        count = self.size if count is None else min(count, self.size)
+        while True:
+            with self._cond:
+                if self._pooled_count() + self._creating >= count:
+                    return
+                self._creating += 1
+            driver = self._create(headless=True, reserved=True)
+            self.release(driver, reset=False)
+
+    def acquire(self, headless=True, timeout=None):
+        """ドライバーを借りる（空きがなければ返却を待つ）"""
+        if not headless:
+            return self._create(headless=False)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            session = None
+            with self._cond:
+                if self._idle:
+                    session = self._idle.pop()
+                elif self._pooled_count() + self._creating < self.size:
+                    self._creating += 1  # 枠を確保してから新規作成
+                else:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError('ドライバープールの空き待ちがタイムアウトしました')
+                    self._cond.wait(timeout=remaining)
+                    continue
+
+            if session is None:
+                return self._create(headless=True, reserved=True)
+
+            if self._needs_recycle(session) or not self.is_healthy(session.driver):
+                self._discard(session)
+                continue
+
+            self._stats['reused'] += 1
+            print(f"♻️ ウォームなドライバーを再利用（遷移{session.navigations}回, {session.age:.0f}秒経過）")
+            return session.driver
+
+    def release(self, driver, reset=True, discard=False):
+        """ドライバーを返却する（必要に応じてリセット・破棄）"""
+        session = self._sessions.get(id(driver))
+        if session is None:
+            self._quit(driver)
+            return
+
+        if not session.headless:
+            with self._cond:
+                self._sessions.pop(id(driver), None)
+            self._quit(driver)
+            return
+
+        if discard or self._needs_recycle(session):
+            self._discard(session)
+            return
+
+        if reset and not self.reset_session(driver):
+            self._discard(session)
+            return
+
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    def record_navigation(self, driver, count=1):
+        """ページ遷移回数を記録（リサイクル判定に使用）"""
+        session = self._sessions.get(id(driver))
+        if session is not None:
+            session.navigations += count
+
+    def live_drivers(self):
+        """貸し出し中を含む全セッションのドライバー"""
+        with self._cond:
+            return [session.driver for session in self._sessions.values()]
+
+    def record_memory(self, driver, memory, recycle_reason=None):
+        """メモリの計測値を記録（recycle_reason があれば次の区切りでのリサイクルを予約）"""
+        session = self._sessions.get(id(driver))
+        if session is None:
+            return
+        session.memory = memory
+        session.peak_rss_bytes = max(session.peak_rss_bytes, memory['rss_bytes'])
+        if recycle_reason and not session.recycle_reason:
+            session.recycle_reason = recycle_reason
+            print(f"🧠 メモリ上限を超えたためリサイクルを予約"
+                  f"（RSS {memory['rss_bytes'] / 1024 / 1024:.0f}MB, レンダラー{memory['renderers']}件）")
+
+    def memory_sample(self, driver):
+        """最新の計測値（未計測なら None）"""
+        session = self._sessions.get(id(driver))
+        if session is None or session.memory is None:
+            return None
+        return dict(session.memory, peak_rss_bytes=session.peak_rss_bytes, recycle_reason=session.recycle_reason)
+
+    def pending_recycle(self, driver):
+        """メモリ監視によるリサイクル予約の理由（なければ None）"""
+        session = self._sessions.get(id(driver))
+        return session.recycle_reason if session is not None else None
+
+    def total_rss(self):
+        with self._cond:
+            return sum(session.memory['rss_bytes'] for session in self._sessions.values() if session.memory)
+
+    def is_healthy(self, driver):
+        """レンダラーが応答し、タブが生きているかを確認"""
+        try:
+            handles = driver.window_handles
+            if not handles:
+                return False
+            # クラッシュしたタブなどが残っていれば最初のタブ以外を閉じる
+            if len(handles) > 1:
+                for handle in handles[1:]:
+                    driver.switch_to.window(handle)
+                    driver.close()
+                driver.switch_to.window(handles[0])
+            return driver.execute_script('return 1') == 1
+        except Exception as e:
+            print(f"⚠️ ドライバーのヘルスチェック失敗: {e}")
+            self._stats['unhealthy'] += 1
+            return False
+
+    def reset_session(self, driver):
+        """Cookie・ストレージを消去して次の会社に状態を持ち越さない"""
+        try:
+            driver.get('about:blank')
+            try:
+                driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+                driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+                for origin in self.reset_origins:
+                    driver.execute_cdp_cmd('Storage.clearDataForOrigin', {
+                        'origin': origin,
+                        'storageTypes': 'local_storage,session_storage,indexeddb,cache_storage,service_workers',
+                    })
+            except Exception:
+                driver.delete_all_cookies()
+            return True
+        except Exception as e:
+            print(f"⚠️ ドライバーのリセット失敗: {e}")
+            return False
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, live=len(self._sessions), idle=len(self._idle), size=self.size)
+
+    def shutdown(self):
+        """全セッションを終了"""
+        with self._cond:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+            self._idle.clear()
+            self._cond.notify_all()
+        for session in sessions:
+            self._quit(session.driver)
+
+    def _pooled_count(self):
+        return sum(1 for session in self._sessions.values() if session.headless)
+
+    def _needs_recycle(self, session):
+        if session.recycle_reason:
+            return True
+        if self.max_navigations and session.navigations >= self.max_navigations:
+            return True
+        if self.max_age and session.age >= self.max_age:
+            return True
+        return False
+
+    def _create(self, headless, reserved=False):
+        try:
+            driver = self.factory(headless=headless)
+        except Exception:
+            if reserved:
+                with self._cond:
+                    self._creating -= 1
+                    self._cond.notify()
+            raise
+        with self._cond:
+            if reserved:
+                self._creating -= 1
+            self._sessions[id(driver)] = _Session(driver, headless)
+            self._stats['created'] += 1
+        return driver
+
+    def _discard(self, session):
+        with self._cond:
+            self._sessions.pop(id(session.driver), None)
+            if session in self._idle:
+                self._idle.remove(session)
+            self._stats['recycled'] += 1
+            if session.recycle_reason:
+                self._stats['memory_recycled'] += 1
+            self._cond.notify()
+        reason = f", メモリ上限: {session.recycle_reason}" if session.recycle_reason else ''
+        print(f"🔁 ドライバーを破棄（遷移{session.navigations}回, {session.age:.0f}秒経過{reason}）")
+        self._quit(session.driver)
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
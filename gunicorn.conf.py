@@ -0,0 +1,30 @@
+"""gunicorn設定（起動オプションは Dockerfile / Procfile のコマンドライン側）
+
+ワーカーのフォーク直後に、ドライバーの準備物（User-Agent・パッチ済みchromedriver）と
+重いモジュールをバックグラウンドで読み込む。--max-requests で入れ替わったワーカーも
+最初の撮影を待たずに済む。PREWARM_ON_FORK=0 で無効。
+PREWARM_DRIVERS=1 ならアプリの読み込み後にChromeも起動してドライバープールを埋めておく。
+"""
+import os
+import threading
+
+
+def post_fork(server, worker):
+    if os.environ.get('PREWARM_ON_FORK', '1') == '0':
+        return
+    import driver_bootstrap
+    threading.Thread(target=driver_bootstrap.prewarm, name='prewarm', daemon=True).start()
+
+
+def post_worker_init(worker):
+    if os.environ.get('PREWARM_DRIVERS', '0') != '1':
+        return
+    import ultimate_search_server
+
+    def prewarm_drivers():
+        try:
+            ultimate_search_server.driver_pool.prewarm()
+        except Exception as e:
+            print(f"⚠️ ドライバープールの事前起動に失敗: {e}")
+
+    threading.Thread(target=prewarm_drivers, name='prewarm-drivers', daemon=True).start()
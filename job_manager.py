@@ -0,0 +1,183 @@
+"""バックグラウンドジョブ管理
+
+/ultimate_search のバッチ処理をHTTPリクエストから切り離し、ワーカースレッドで実行する。
+進捗はジョブごとのイベント列として保持し、ポーリング（/jobs/<id>）と
+Server-Sent Events（/jobs/<id>/events）の両方から参照できる。
+イベントには識別子だけを載せ、撮影結果そのものはバッチのマニフェスト
+（/batches/<id>/results）から取得する。イベント列は直近 MAX_EVENTS 件だけ保持する。
+"""
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# ジョブごとに保持するイベント数の上限（古いものから捨てる）
+MAX_EVENTS = int(os.environ.get('JOB_MAX_EVENTS', '1000'))
+
+
+class Job:
+    """1回のバッチ実行の状態と進捗イベント"""
+
+    def __init__(self, job_id, payload):
+        self.id = job_id
+        self.payload = payload
+        self.batch_id = None
+        self.status = 'queued'  # queued / running / completed / failed
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {
+            'total_companies': len(payload.get('companies', [])),
+            'processed_companies': 0,
+            'current_company': None,
+            'current_engine': None,
+            'total_steps': 0,
+            'completed_steps': 0,
+        }
+        self.partial_ocr_results = {}
+        self.result = None
+        self.error = None
+        self.events = deque(maxlen=MAX_EVENTS)
+        self._next_seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ('completed', 'failed')
+
+    def emit(self, event_type, **data):
+        """進捗イベントを追加して待機中のストリームを起こす"""
+        with self._cond:
+            event = {
+                'seq': self._next_seq,
+                'type': event_type,
+                'time': datetime.now().isoformat(),
+            }
+            event.update(data)
+            self.events.append(event)
+            self._next_seq += 1
+            self._cond.notify_all()
+        return event
+
+    def update_progress(self, **fields):
+        with self._cond:
+            self.progress.update(fields)
+        self.emit('progress', progress=dict(self.progress))
+
+    def set_ocr_result(self, company_name, ocr_result):
+        """会社単位のOCR・ネガティブワード集計を保存"""
+        with self._cond:
+            self.partial_ocr_results[company_name] = ocr_result
+
+    def finish(self, status, result=None, error=None):
+        """終了状態を設定し、終了イベントを同じロック内で追加する"""
+        with self._cond:
+            self.result = result
+            self.error = error
+            self.status = status
+            self.finished_at = datetime.now().isoformat()
+            if status == 'completed':
+                self.emit('completed', message=(result or {}).get('message'))
+            else:
+                self.emit('failed', error=error)
+
+    def to_dict(self, include_results=True):
+        with self._cond:
+            data = {
+                'job_id': self.id,
+                'status': self.status,
+                'batch_id': self.batch_id,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'progress': dict(self.progress),
+                'error': self.error,
+                'event_count': self._next_seq,
+            }
+            if include_results:
+                data['partial_ocr_results'] = self.partial_ocr_results
+                data['result'] = self.result
+        return data
+
+    def iter_events(self, since=0, keepalive=15, max_duration=None):
+        """イベントを順に返すジェネレータ
+
+        新しいイベントがない間は keepalive 秒ごとに None を返す。
+        ジョブ終了後に全イベントを返し終えるか、max_duration 秒を過ぎると終了する。
+        since が保持範囲より古い場合は、残っている最古のイベントから返す。
+        """
+        started = time.monotonic()
+        cursor = since
+        while True:
+            with self._cond:
+                if cursor >= self._next_seq and not self.finished:
+                    self._cond.wait(timeout=keepalive)
+                first_seq = self._next_seq - len(self.events)
+                pending = list(self.events)[max(cursor - first_seq, 0):]
+                done = self.finished
+            if pending:
+                for event in pending:
+                    yield event
+                cursor = pending[-1]['seq'] + 1
+            elif done:
+                return
+            else:
+                yield None
+            if max_duration is not None and time.monotonic() - started > max_duration:
+                return
+
+
+class JobManager:
+    """ジョブの投入・実行・保持を行う"""
+
+    def __init__(self, max_workers=1, max_jobs=100):
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job-worker')
+
+    def submit(self, target, payload):
+        """ジョブを登録してバックグラウンドで target(job) を実行"""
+        job = Job(uuid.uuid4().hex[:12], payload)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict_finished()
+        job.emit('queued')
+        self._executor.submit(self._run, job, target)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict(include_results=False) for job in jobs]
+
+    def _run(self, job, target):
+        job.status = 'running'
+        job.started_at = datetime.now().isoformat()
+        job.emit('started')
+        try:
+            result = target(job)
+            job.finish('completed', result=result)
+        except Exception as e:
+            traceback.print_exc()
+            job.finish('failed', error=str(e))
+
+    def _evict_finished(self):
+        """保持上限を超えた古い完了済みジョブを削除"""
+        overflow = len(self._jobs) - self.max_jobs
+        if overflow <= 0:
+            return
+        for job_id in list(self._jobs):
+            if overflow <= 0:
+                break
+            if self._jobs[job_id].finished:
+                del self._jobs[job_id]
+                overflow -= 1
@@ -0,0 +1,114 @@
+"""Chromeのメモリ監視
+
+ドライバープールの各セッションについて、Chromeのプロセスツリー（/proc）のRSS合計と
+レンダラープロセス数を一定間隔で測る。しきい値を超えたセッションにはリサイクルの印を付け、
+キューワーカーが作業項目の合間（安全な区切り）でセッションを作り直す。
+WebDriverの通信は使わないため、撮影中のセッションも測れる。
+"""
+import os
+import threading
+
+# バッチのサマリーに残すリサイクル記録の上限
+MAX_RECYCLE_EVENTS = 100
+
+
+def driver_process_ids(driver):
+    """プロセスツリーの起点（uc.Chrome は Chrome 本体、通常の Chrome は chromedriver 経由）"""
+    pids = []
+    browser_pid = getattr(driver, 'browser_pid', None)
+    if browser_pid:
+        pids.append(browser_pid)
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    if process is not None and getattr(process, 'pid', None):
+        pids.append(process.pid)
+    return pids
+
+
+def process_tree_memory(root_pids):
+    """プロセスと子孫のRSS合計（バイト）・レンダラー数・プロセス数（/proc を読む）"""
+    memory = {'rss_bytes': 0, 'renderers': 0, 'processes': 0}
+    seen = set()
+    stack = list(root_pids)
+    while stack:
+        pid = stack.pop()
+        if pid in seen:
+            continue
+        seen.add(pid)
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        memory['rss_bytes'] += int(line.split()[1]) * 1024
+                        break
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                if b'--type=renderer' in f.read():
+                    memory['renderers'] += 1
+            for task in os.listdir(f'/proc/{pid}/task'):
+                with open(f'/proc/{pid}/task/{task}/children') as f:
+                    stack.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+        memory['processes'] += 1
+    return memory
+
+
+def empty_memory_stats():
+    return {'samples': 0, 'peak_rss_bytes': 0, 'mean_rss_bytes': 0, 'max_renderers': 0,
+            'recycles': 0, 'recycle_events': []}
+
+
+def merge_memory_stats(totals, stats):
+    """作業項目ごとの計測（meta['memory']）を合算"""
+    if stats.get('rss_bytes'):
+        samples = totals['samples'] + 1
+        totals['mean_rss_bytes'] = int(totals['mean_rss_bytes'] + (stats['rss_bytes'] - totals['mean_rss_bytes']) / samples)
+        totals['samples'] = samples
+    totals['peak_rss_bytes'] = max(totals['peak_rss_bytes'], stats.get('peak_rss_bytes', 0))
+    totals['max_renderers'] = max(totals['max_renderers'], stats.get('renderers', 0))
+    for event in stats.get('recycles', []):
+        totals['recycles'] += 1
+        if len(totals['recycle_events']) < MAX_RECYCLE_EVENTS:
+            totals['recycle_events'].append(event)
+    return totals
+
+
+class MemoryWatchdog(threading.Thread):
+    """プール内の全セッションのメモリを定期的に測り、上限を超えたらリサイクルを予約する
+
+    max_rss_bytes: プロセスツリーのRSS合計の上限（0 なら判定しない）
+    max_renderers: レンダラープロセス数の上限（0 なら判定しない）
+    """
+
+    def __init__(self, pool, max_rss_bytes=0, max_renderers=0, interval=5.0):
+        super().__init__(name='memory-watchdog', daemon=True)
+        self.pool = pool
+        self.max_rss_bytes = max_rss_bytes
+        self.max_renderers = max_renderers
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    @property
+    def enabled(self):
+        return bool(self.max_rss_bytes or self.max_renderers) and os.path.isdir('/proc')
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"⚠️ メモリ計測エラー: {e}")
+
+    def sample(self):
+        for driver in self.pool.live_drivers():
+            memory = process_tree_memory(driver_process_ids(driver))
+            if not memory['processes']:
+                continue
+            reason = None
+            if self.max_rss_bytes and memory['rss_bytes'] >= self.max_rss_bytes:
+                reason = 'rss'
+            elif self.max_renderers and memory['renderers'] > self.max_renderers:
+                reason = 'renderers'
+            self.pool.record_memory(driver, memory, recycle_reason=reason)
+
+    def stop(self):
+        self._stop_event.set()
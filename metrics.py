@@ -0,0 +1,181 @@
+"""フェーズ別の計測（タイミングスパン）とPrometheus形式の出力
+
+span() で囲んだ区間の所要時間を、フェーズ・エンジン・撮影種別ごとのヒストグラムに記録する。
+エンジンや撮影種別は labels() でスレッド単位に設定でき、内側のスパンに引き継がれる。
+collect() を使うと、そのスレッドで計測したスパンの「自分自身の時間」（内側のスパンを除いた時間）を
+フェーズ別に集計でき、バッチ単位の内訳に使える。
+"""
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# ヒストグラムのバケット境界（秒）
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 待ち時間として扱うフェーズ（それ以外はブラウザの作業）
+WAITING_PHASES = ('readiness_wait', 'pacing', 'budget_wait')
+
+# 他の処理と並行して動くフェーズ（内訳の合計には含めない）
+BACKGROUND_PHASES = ('screenshot_write',)
+
+METRIC_PREFIX = 'ultimate_search'
+
+_local = threading.local()
+
+
+class PhaseHistograms:
+    """(フェーズ, エンジン, 撮影種別) ごとのヒストグラム"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, phase, engine, kind, seconds):
+        key = (phase, engine or '', kind or '')
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series['buckets'][index] += 1
+            series['sum'] += seconds
+            series['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: {'buckets': list(series['buckets']), 'sum': series['sum'], 'count': series['count']}
+                    for key, series in self._series.items()}
+
+
+histograms = PhaseHistograms()
+
+
+def _context():
+    if not hasattr(_local, 'labels'):
+        _local.labels = {}
+        _local.stack = []
+        _local.collector = None
+    return _local
+
+
+@contextmanager
+def labels(**values):
+    """内側のスパンに付けるラベル（engine / kind）を設定"""
+    context = _context()
+    previous = context.labels
+    context.labels = dict(previous, **{key: value for key, value in values.items() if value is not None})
+    try:
+        yield
+    finally:
+        context.labels = previous
+
+
+@contextmanager
+def collect():
+    """このスレッドのスパンをフェーズ別に集計（{フェーズ: {'seconds', 'count'}}）"""
+    context = _context()
+    previous = context.collector
+    collected = {}
+    context.collector = collected
+    try:
+        yield collected
+    finally:
+        context.collector = previous
+
+
+@contextmanager
+def span(phase, **span_labels):
+    """区間の所要時間を記録"""
+    context = _context()
+    frame = {'child_seconds': 0.0}
+    context.stack.append(frame)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        context.stack.pop()
+        if context.stack:
+            context.stack[-1]['child_seconds'] += elapsed
+
+        merged = dict(context.labels, **span_labels)
+        histograms.observe(phase, merged.get('engine'), merged.get('kind'), elapsed)
+        if context.collector is not None:
+            entry = context.collector.setdefault(phase, {'seconds': 0.0, 'count': 0})
+            entry['seconds'] += elapsed - frame['child_seconds']
+            entry['count'] += 1
+
+
+def timed(phase, **span_labels):
+    """関数全体をスパンで囲むデコレーター"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(phase, **span_labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def merge_timings(totals, timings):
+    """collect() の結果を合算"""
+    for phase, entry in timings.items():
+        total = totals.setdefault(phase, {'seconds': 0.0, 'count': 0})
+        total['seconds'] += entry.get('seconds', 0.0)
+        total['count'] += entry.get('count', 0)
+    return totals
+
+
+def timing_breakdown(totals):
+    """フェーズ別の合計と、作業・待ちの割合"""
+    foreground = {phase: entry for phase, entry in totals.items() if phase not in BACKGROUND_PHASES}
+    total = sum(entry['seconds'] for entry in foreground.values())
+    waiting = sum(entry['seconds'] for phase, entry in foreground.items() if phase in WAITING_PHASES)
+    return {
+        'total_seconds': round(total, 2),
+        'browser_work_seconds': round(total - waiting, 2),
+        'waiting_seconds': round(waiting, 2),
+        'waiting_ratio': round(waiting / total, 3) if total else None,
+        'phases': {
+            phase: {
+                'seconds': round(entry['seconds'], 2),
+                'count': entry['count'],
+                'share': round(entry['seconds'] / total, 3) if total and phase in foreground else None,
+            }
+            for phase, entry in sorted(totals.items(), key=lambda item: -item[1]['seconds'])
+        },
+    }
+
+
+def _format_labels(values):
+    return ','.join(f'{key}="{str(value)}"' for key, value in values.items())
+
+
+def render_prometheus(gauges=None):
+    """Prometheusのテキスト形式
+
+    gauges: {メトリクス名: [(ラベル辞書, 値), ...]}
+    """
+    name = f'{METRIC_PREFIX}_phase_seconds'
+    lines = [
+        f'# HELP {name} Time spent per phase.',
+        f'# TYPE {name} histogram',
+    ]
+    for (phase, engine, kind), series in sorted(histograms.snapshot().items()):
+        base = {'phase': phase, 'engine': engine, 'kind': kind}
+        for bound, count in zip(histograms.buckets, series['buckets']):
+            lines.append(f'{name}_bucket{{{_format_labels(dict(base, le=bound))}}} {count}')
+        lines.append(f'{name}_bucket{{{_format_labels(dict(base, le="+Inf"))}}} {series["count"]}')
+        lines.append(f'{name}_sum{{{_format_labels(base)}}} {series["sum"]:.6f}')
+        lines.append(f'{name}_count{{{_format_labels(base)}}} {series["count"]}')
+
+    for gauge, samples in (gauges or {}).items():
+        full_name = f'{METRIC_PREFIX}_{gauge}'
+        lines.append(f'# TYPE {full_name} gauge')
+        for sample_labels, value in samples:
+            label_text = f'{{{_format_labels(sample_labels)}}}' if sample_labels else ''
+            lines.append(f'{full_name}{label_text} {value}')
+    return '\n'.join(lines) + '\n'
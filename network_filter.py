@@ -0,0 +1,138 @@
+"""撮影に不要なリソースのブロック（CDP Network.setBlockedURLs）
+
+検索UIと結果テキストの撮影に関係しないフォント・動画・広告・計測スクリプトを
+エンジン別のブロックリストでドロップする。画像とサジェストの通信はブロックしない。
+ブロック件数と転送量はパフォーマンスログ（Network.loadingFailed / loadingFinished）から集計する。
+ブロックしたリクエストにはサイズがないため、削減量はリソース種別ごとの推定値（estimated_bytes_saved）で、実測値ではない。
+"""
+import json
+import os
+import weakref
+
+# 全エンジン共通のブロック対象（'*' はワイルドカード）
+COMMON_BLOCKLIST = [
+    # フォント
+    '*.woff2', '*.woff', '*.ttf', '*.otf', '*.eot',
+    # 動画・音声
+    '*.mp4', '*.webm', '*.m3u8', '*.mp3', '*.m4a',
+    # 広告・計測
+    '*googletagmanager.com/*', '*google-analytics.com/*', '*doubleclick.net/*',
+    '*googlesyndication.com/*', '*googleadservices.com/*', '*adservice.google.*',
+    '*clarity.ms/*', '*facebook.net/*', '*criteo.*',
+    # 埋め込み動画のiframe
+    '*youtube.com/embed/*',
+]
+
+# エンジン別のブロック対象（サジェストの通信は含めないこと）
+DEFAULT_BLOCKLISTS = {
+    'google': [
+        '*/gen_204*', '*/client_204*', '*google.com/log?*', '*play.google.com/log*',
+    ],
+    'yahoo': [
+        '*yjtag.jp/*', '*b92.yahoo.co.jp/*', '*yads.c.yimg.jp/*', '*yads.yahoo.co.jp/*',
+        '*im.ov.yahoo.co.jp/*', '*ybx.yahoo.co.jp/*',
+    ],
+    'bing': [
+        '*bat.bing.com/*', '*/fd/ls/*', '*c.bing.com/c.gif*',
+    ],
+}
+
+# ブロックしたリクエストの推定サイズ（リソース種別ごとの平均的な転送量、バイト）
+ESTIMATED_RESOURCE_BYTES = {
+    'Font': 40 * 1024,
+    'Media': 512 * 1024,
+    'Script': 60 * 1024,
+    'Stylesheet': 20 * 1024,
+    'Document': 30 * 1024,
+    'Image': 15 * 1024,
+    'XHR': 2 * 1024,
+    'Fetch': 2 * 1024,
+    'Ping': 512,
+}
+DEFAULT_ESTIMATED_BYTES = 4 * 1024
+
+# パフォーマンスログの有効化に使うケイパビリティ
+LOGGING_PREFS = {'performance': 'ALL'}
+
+
+def load_blocklists():
+    """既定のブロックリストに NETWORK_BLOCKLIST_PATH（JSON: {エンジン or '*': [パターン]}）を追加したもの"""
+    blocklists = {'*': list(COMMON_BLOCKLIST)}
+    for engine, patterns in DEFAULT_BLOCKLISTS.items():
+        blocklists[engine] = list(patterns)
+    path = os.environ.get('NETWORK_BLOCKLIST_PATH')
+    if path:
+        with open(path, encoding='utf-8') as f:
+            for engine, patterns in json.load(f).items():
+                blocklists.setdefault(engine, []).extend(patterns)
+    return blocklists
+
+
+def empty_stats():
+    return {'requests': 0, 'blocked_requests': 0, 'blocked_by_type': {},
+            'estimated_bytes_saved': 0, 'transferred_bytes': 0}
+
+
+def merge_network_stats(totals, stats):
+    """collect() の結果を合算"""
+    for key in ('requests', 'blocked_requests', 'estimated_bytes_saved', 'transferred_bytes'):
+        totals[key] = totals.get(key, 0) + stats.get(key, 0)
+    by_type = totals.setdefault('blocked_by_type', {})
+    for resource_type, count in stats.get('blocked_by_type', {}).items():
+        by_type[resource_type] = by_type.get(resource_type, 0) + count
+    return totals
+
+
+class NetworkFilter:
+    """ドライバーごとにエンジンのブロックリストを適用し、ブロック件数を集計する"""
+
+    def __init__(self, blocklists=None, enabled=True):
+        self.blocklists = load_blocklists() if blocklists is None else blocklists
+        self.enabled = enabled
+        # ドライバー -> 適用中のエンジン（同じエンジンなら再送しない）
+        self._applied = weakref.WeakKeyDictionary()
+
+    def patterns(self, engine):
+        return self.blocklists.get('*', []) + self.blocklists.get(engine, [])
+
+    def apply(self, driver, engine):
+        """このドライバーのブロックリストを engine 用に切り替える"""
+        if not self.enabled or self._applied.get(driver) == engine:
+            return
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.patterns(engine)})
+        except Exception as e:
+            print(f"⚠️ リソースブロックの設定に失敗: {e}")
+        # 失敗した場合もエンジンが変わるまでは再試行しない
+        self._applied[driver] = engine
+
+    def collect(self, driver):
+        """前回の集計以降のリクエスト数・ブロック件数・転送量（パフォーマンスログを読み切る）"""
+        stats = empty_stats()
+        if not self.enabled:
+            return stats
+        try:
+            entries = driver.get_log('performance')
+        except Exception:
+            return stats
+        for entry in entries:
+            message = entry.get('message', '')
+            # 対象外のイベントはJSONを解析しない
+            if '"Network.requestWillBeSent"' in message:
+                stats['requests'] += 1
+                continue
+            if '"Network.loadingFinished"' in message:
+                params = json.loads(message)['message']['params']
+                stats['transferred_bytes'] += int(params.get('encodedDataLength', 0))
+                continue
+            if '"Network.loadingFailed"' not in message or '"blockedReason"' not in message:
+                continue
+            params = json.loads(message)['message']['params']
+            if params.get('blockedReason') != 'inspector':
+                continue
+            resource_type = params.get('type', 'Other')
+            stats['blocked_requests'] += 1
+            stats['blocked_by_type'][resource_type] = stats['blocked_by_type'].get(resource_type, 0) + 1
+            stats['estimated_bytes_saved'] += ESTIMATED_RESOURCE_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+        return stats
@@ -0,0 +1,307 @@
+"""OCR・ネガティブワード分析ステージ
+
+撮影済みのスクリーンショットを結果が届いた順にプロセスプールでOCRし、
+ネガティブワード辞書を Aho-Corasick 法の多パターン照合で一度に検索する。
+会社ごとのリスク集計は解析が終わるたびに更新されるため、バッチ完了後に
+全フォルダを走査し直す必要がない。
+"""
+import json
+import os
+import threading
+import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pytesseract
+    from PIL import Image
+except ImportError:  # OCRエンジンがなければDOM抽出テキストのみ分析
+    pytesseract = None
+
+# 既定のネガティブワード辞書（カテゴリ -> 重み・単語）
+DEFAULT_NEGATIVE_WORDS = {
+    '詐欺・違法': {
+        'weight': 5,
+        'words': ['詐欺', '違法', '逮捕', '摘発', '行政処分', '業務停止', '脱税', '不正', '偽装', '悪徳'],
+    },
+    '経営不安': {
+        'weight': 4,
+        'words': ['倒産', '破産', '民事再生', '経営危機', '資金繰り', '夜逃げ', '撤退'],
+    },
+    '労働問題': {
+        'weight': 3,
+        'words': ['ブラック', 'パワハラ', 'セクハラ', 'サービス残業', '未払い', '離職率', '過労'],
+    },
+    'トラブル': {
+        'weight': 2,
+        'words': ['訴訟', '裁判', 'トラブル', '被害', '炎上', '苦情', 'クレーム', '返金', '解約できない'],
+    },
+    '評判': {
+        'weight': 1,
+        'words': ['最悪', '怪しい', 'やばい', 'ひどい', '評判悪い', '危険', '注意', '騙された'],
+    },
+}
+
+# リスクレベルの閾値（スコア以上）
+RISK_LEVELS = (
+    ('high', 10),
+    ('medium', 4),
+    ('low', 1),
+)
+
+# Tesseractの言語
+OCR_LANG = os.environ.get('OCR_LANG', 'jpn+eng')
+
+
+def load_negative_words(extra_words=None):
+    """既定辞書に NEGATIVE_WORDS_PATH（JSON）と追加単語を反映した辞書"""
+    dictionary = {category: {'weight': entry['weight'], 'words': list(entry['words'])}
+                  for category, entry in DEFAULT_NEGATIVE_WORDS.items()}
+    path = os.environ.get('NEGATIVE_WORDS_PATH')
+    if path:
+        with open(path, encoding='utf-8') as f:
+            for category, entry in json.load(f).items():
+                target = dictionary.setdefault(category, {'weight': 1, 'words': []})
+                target['weight'] = entry.get('weight', target['weight'])
+                target['words'].extend(entry.get('words', []))
+    if extra_words:
+        dictionary.setdefault('カスタム', {'weight': 3, 'words': []})['words'].extend(extra_words)
+    return dictionary
+
+
+def normalize_text(text):
+    """照合用に正規化（全角半角の統一・空白除去。OCRは文字間に空白を入れるため）"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return ''.join(text.split())
+
+
+class AhoCorasick:
+    """複数単語を1回の走査で検索するオートマトン"""
+
+    def __init__(self, words):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for word in words:
+            self._add(word)
+        self._build()
+
+    def _add(self, word):
+        state = 0
+        for char in word:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        if word not in self._output[state]:
+            self._output[state].append(word)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0) if state else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find_all(self, text):
+        """一致した単語 -> 出現回数"""
+        counts = {}
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for word in self._output[state]:
+                counts[word] = counts.get(word, 0) + 1
+        return counts
+
+
+class NegativeWordMatcher:
+    """辞書全体のオートマトンと単語 -> カテゴリの対応"""
+
+    def __init__(self, dictionary):
+        self.dictionary = dictionary
+        self._categories = {}
+        for category, entry in dictionary.items():
+            for word in entry['words']:
+                self._categories.setdefault(normalize_text(word), category)
+        self._automaton = AhoCorasick(self._categories)
+
+    def match(self, text):
+        """[(単語, カテゴリ, 回数), ...]"""
+        return [
+            (word, self._categories[word], count)
+            for word, count in self._automaton.find_all(normalize_text(text)).items()
+        ]
+
+    def weight(self, category):
+        return self.dictionary[category]['weight']
+
+
+def ocr_image(path, lang=OCR_LANG):
+    """画像1枚をOCR（プロセスプール上で実行）"""
+    with Image.open(path) as image:
+        return pytesseract.image_to_string(image, lang=lang)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_ocr_executor():
+    """プロセス内で共有するOCR用プロセスプール（OCR_WORKERS、既定はCPUコア数）
+
+    OCRエンジンがなければ None。
+    """
+    global _executor
+    if pytesseract is None:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            workers = int(os.environ.get('OCR_WORKERS', '0')) or os.cpu_count() or 1
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        return _executor
+
+
+def shutdown_ocr_executor():
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+
+
+class OcrStage:
+    """1バッチ分のOCR・ネガティブワード集計
+
+    submit_image() で画像をプロセスプールに投入し、add_text() でDOM抽出テキストを
+    その場で照合する。会社ごとの集計が変わるたびに on_update(会社名, 集計) を呼ぶ。
+    OCRが終わるたびに on_text(画像のパス, OCRテキスト) を呼ぶ（全文検索インデックス用）。
+    同じ撮影のDOMテキストとOCRテキストは同じ語を含むため、(エンジン, 撮影種別, 単語) ごとに
+    多い方の出現回数だけをスコアに数える。
+    """
+
+    def __init__(self, matcher, executor=None, on_update=None, on_text=None):
+        self.matcher = matcher
+        self.executor = executor
+        self.on_update = on_update
+        self.on_text = on_text
+        self._companies = {}
+        self._pending = {}
+        self._running = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    @property
+    def ocr_available(self):
+        return pytesseract is not None and self.executor is not None
+
+    def _company(self, company_name):
+        return self._companies.setdefault(company_name, {
+            'score': 0,
+            'categories': {},
+            'matched_words': {},
+            'hits': [],
+            'counted': {},
+            'images_analyzed': 0,
+            'texts_analyzed': 0,
+            'errors': 0,
+        })
+
+    def submit_image(self, companies, engine, kind, path):
+        """スクリーンショットをOCRに投入（同じ画像は1回だけ解析し、全対象の会社に反映）"""
+        if not self.ocr_available or not path or not os.path.exists(path):
+            return
+        with self._lock:
+            if path in self._pending:
+                self._pending[path]['companies'].update(companies)
+                return
+            self._pending[path] = {'companies': set(companies), 'engine': engine, 'kind': kind}
+            self._running += 1
+        try:
+            future = self.executor.submit(ocr_image, path)
+        except Exception:
+            self._done()
+            raise
+        future.add_done_callback(lambda f: self._image_done(path, f))
+
+    def _done(self):
+        with self._idle:
+            self._running -= 1
+            self._idle.notify_all()
+
+    def _image_done(self, path, future):
+        # 解析結果を反映する時点で待ち一覧から外す（以降の同じパスの投入は新しい解析になる）
+        with self._lock:
+            source = self._pending.pop(path)
+        try:
+            text = future.result()
+            self._record(source['companies'], source['engine'], source['kind'], 'ocr', text)
+            if self.on_text is not None:
+                self.on_text(path, text)
+        except Exception as e:
+            print(f"⚠️ OCRエラー ({path}): {e}")
+            with self._lock:
+                for company_name in source['companies']:
+                    self._company(company_name)['errors'] += 1
+        finally:
+            self._done()
+
+    def add_text(self, companies, engine, kind, terms):
+        """DOMから抽出したサジェスト・関連ワードを照合"""
+        self._record(companies, engine, kind, 'text', '\n'.join(terms))
+
+    def _record(self, companies, engine, kind, source, text):
+        matches = self.matcher.match(text)
+        updated = []
+        with self._lock:
+            for company_name in companies:
+                entry = self._company(company_name)
+                entry['images_analyzed' if source == 'ocr' else 'texts_analyzed'] += 1
+                for word, category, count in matches:
+                    key = (engine, kind, word)
+                    counted = entry['counted'].get(key)
+                    if counted is None:
+                        entry['hits'].append({'engine': engine, 'kind': kind, 'source': source, 'word': word})
+                        counted = 0
+                    added = count - counted
+                    if added <= 0:
+                        continue
+                    entry['counted'][key] = count
+                    entry['matched_words'][word] = entry['matched_words'].get(word, 0) + added
+                    entry['categories'][category] = entry['categories'].get(category, 0) + added
+                    entry['score'] += self.matcher.weight(category) * added
+                updated.append((company_name, self._summarize(entry)))
+        if self.on_update is not None:
+            for company_name, summary in updated:
+                self.on_update(company_name, summary)
+
+    def _summarize(self, entry):
+        level = 'none'
+        for name, threshold in RISK_LEVELS:
+            if entry['score'] >= threshold:
+                level = name
+                break
+        return {
+            'summary': {
+                'matched_words': dict(entry['matched_words']),
+                'categories': dict(entry['categories']),
+                'images_analyzed': entry['images_analyzed'],
+                'texts_analyzed': entry['texts_analyzed'],
+                'errors': entry['errors'],
+            },
+            'risk_assessment': {'level': level, 'score': entry['score']},
+            'hits': list(entry['hits']),
+        }
+
+    def results(self, wait=True):
+        """会社名 -> 集計（wait=True なら投入済みのOCRが終わるまで待つ）"""
+        with self._idle:
+            while wait and self._running:
+                self._idle.wait()
+            return {company_name: self._summarize(entry) for company_name, entry in self._companies.items()}
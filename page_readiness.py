@@ -0,0 +1,143 @@
+"""検索エンジン別のページ準備完了待ち
+
+固定のsleepの代わりに「検索ボックス操作可能」「サジェスト表示」「検索結果描画」
+「関連ワード表示」を条件として待機する。条件を満たせない場合は従来の固定待機にフォールバックする。
+selenium.webdriver はパッケージ全体の読み込みが重いため、待機する関数の中で読み込む。
+"""
+import time
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+import metrics
+
+# 条件ごとのCSSセレクタ（いずれか1つが表示されれば準備完了）
+READINESS_SELECTORS = {
+    'google': {
+        'search_box': ['textarea[name="q"]', 'input[name="q"]'],
+        'suggestions': ['ul[role="listbox"] li', '.aajZCb li', '.erkvQe li'],
+        'results': ['#rso', '#search', '#botstuff'],
+        'related': ['#bres', '#botstuff a[href*="/search"]', '.oIk2Cb'],
+    },
+    'yahoo': {
+        'search_box': ['input[name="p"]'],
+        'suggestions': ['[role="listbox"] li', '.SearchBoxSuggest li', '#ATB li'],
+        'results': ['#contents', '#web', '.sw-CardBase'],
+        'related': ['.sw-Relation', '#Sc2', '.Rkw'],
+    },
+    'bing': {
+        'search_box': ['#sb_form_q', 'input[name="q"]'],
+        'suggestions': ['#sa_ul li', '.sa_sg', '[role="listbox"] li'],
+        'results': ['#b_results'],
+        'related': ['#b_results .b_rs', '#brsv3', '.b_rrsr'],
+    },
+}
+
+# 検索結果ページ判定用のURL断片（ホームとの取り違え防止）
+RESULTS_URL_MARKERS = {
+    'google': '/search',
+    'yahoo': 'search.yahoo.co.jp',
+    'bing': '/search',
+}
+
+# 条件ごとの最大待機秒数
+READINESS_TIMEOUTS = {
+    'search_box': 10,
+    'suggestions': 5,
+    'results': 10,
+    'related': 5,
+}
+
+# 検索結果の描画後に関連ワードブロックの有無を確かめる待機秒数
+# （結果ページは描画済みのため、ここで見つからなければブロック自体がない）
+RELATED_PROBE_TIMEOUT = 1
+
+# 要素表示後のアニメーション・描画待ち
+SETTLE_DELAY = 0.3
+
+
+def _condition(engine_name, condition):
+    from selenium.webdriver.common.by import By
+
+    selectors = READINESS_SELECTORS[engine_name][condition]
+    css = ', '.join(selectors)
+    url_marker = RESULTS_URL_MARKERS.get(engine_name) if condition == 'results' else None
+
+    def is_ready(driver):
+        if url_marker and url_marker not in driver.current_url:
+            return False
+        if driver.execute_script('return document.readyState') == 'loading':
+            return False
+        for element in driver.find_elements(By.CSS_SELECTOR, css):
+            try:
+                if element.is_displayed() and (condition != 'search_box' or element.is_enabled()):
+                    return element
+            except Exception:
+                continue
+        return False
+
+    return is_ready
+
+
+def wait_until_ready(driver, engine_name, condition, fallback_delay, timeout=None):
+    """条件を満たすまで待機し、満たせなければ固定待機にフォールバック
+
+    戻り値: 条件を満たした場合は True、フォールバックした場合は False
+    """
+    with metrics.span('readiness_wait', engine=engine_name, kind=condition):
+        return _wait_until_ready(driver, engine_name, condition, fallback_delay, timeout)
+
+
+def _wait_until_ready(driver, engine_name, condition, fallback_delay, timeout):
+    if condition not in READINESS_SELECTORS.get(engine_name, {}):
+        time.sleep(fallback_delay)
+        return False
+
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    timeout = READINESS_TIMEOUTS[condition] if timeout is None else timeout
+    started = time.monotonic()
+    try:
+        WebDriverWait(
+            driver, timeout, poll_frequency=0.2, ignored_exceptions=(WebDriverException,)
+        ).until(_condition(engine_name, condition))
+        if condition != 'search_box':
+            time.sleep(SETTLE_DELAY)
+        return True
+    except TimeoutException:
+        print(f"⚠️ {engine_name} {condition} の準備完了を検出できず（{timeout}秒）")
+    except Exception as e:
+        print(f"⚠️ {engine_name} {condition} 待機エラー: {e}")
+
+    # 従来の固定待機に満たない分だけ追加で待つ
+    remaining = fallback_delay - (time.monotonic() - started)
+    if remaining > 0:
+        time.sleep(remaining)
+    return False
+
+
+def current_page(driver):
+    """表示中のページのルート要素（wait_for_new_page に渡す）"""
+    from selenium.webdriver.common.by import By
+
+    return driver.find_element(By.TAG_NAME, 'html')
+
+
+def wait_for_new_page(driver, engine_name, previous_page, timeout=None):
+    """previous_page が破棄される（次のページに遷移する）まで待つ
+
+    検索結果ページから再検索すると、古い結果ページのままでも 'results' の条件を満たしてしまうため、
+    先に遷移を確認してから wait_until_ready を呼ぶ。
+    """
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    timeout = READINESS_TIMEOUTS['results'] if timeout is None else timeout
+    with metrics.span('readiness_wait', engine=engine_name, kind='navigation'):
+        try:
+            WebDriverWait(driver, timeout, poll_frequency=0.2).until(EC.staleness_of(previous_page))
+            return True
+        except TimeoutException:
+            print(f"⚠️ {engine_name} 検索実行後のページ遷移を検出できず（{timeout}秒）")
+        except Exception as e:
+            print(f"⚠️ {engine_name} ページ遷移の待機エラー: {e}")
+        return False
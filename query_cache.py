@@ -0,0 +1,118 @@
+"""検索結果キャッシュ（SQLite）
+
+(エンジン, 検索語, 取得オプション) をキーに、スクリーンショットのパスと取得時刻を保存する。
+有効期限内で画像ファイルが残っているエントリは、ブラウザを動かさずに再利用できる。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class QueryCache:
+    """TTL・件数上限付きの検索結果キャッシュ"""
+
+    def __init__(self, path, artifact_fields, ttl=86400, max_entries=20000, artifact_exists=os.path.exists):
+        self.path = path
+        self.artifact_fields = tuple(artifact_fields)
+        self.artifact_exists = artifact_exists
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS query_cache (
+                    key TEXT PRIMARY KEY,
+                    engine TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    captured_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_query_cache_last_used ON query_cache (last_used)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(engine, query, options):
+        raw = json.dumps([engine, query, options], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, engine, query, options):
+        """有効なエントリを返す（期限切れ・画像欠損は None）"""
+        key = self.make_key(engine, query, options)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                'SELECT result, captured_at FROM query_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            result, captured_at = json.loads(row[0]), row[1]
+            if now - captured_at > self.ttl or not self._artifacts_exist(result):
+                conn.execute('DELETE FROM query_cache WHERE key = ?', (key,))
+                return None
+
+            conn.execute('UPDATE query_cache SET last_used = ? WHERE key = ?', (now, key))
+        return {'result': result, 'captured_at': captured_at}
+
+    def put(self, engine, query, options, result):
+        key = self.make_key(engine, query, options)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO query_cache VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, engine, query, json.dumps(options, sort_keys=True),
+                 json.dumps(result, ensure_ascii=False), now, now)
+            )
+            self._evict(conn, now)
+
+    def fresh_queries(self, engine_queries, options, chunk_size=500):
+        """有効期限内のエントリがある (エンジン, 検索語) の集合（見積もり用。画像の有無は確認しない）"""
+        keys = {self.make_key(engine, query, options): (engine, query) for engine, query in engine_queries}
+        cutoff = time.time() - self.ttl
+        fresh = set()
+        key_list = list(keys)
+        with self._lock, self._connect() as conn:
+            for start in range(0, len(key_list), chunk_size):
+                chunk = key_list[start:start + chunk_size]
+                rows = conn.execute(
+                    f"SELECT key FROM query_cache WHERE captured_at >= ? AND key IN ({','.join('?' * len(chunk))})",
+                    [cutoff] + chunk
+                ).fetchall()
+                fresh.update(keys[row[0]] for row in rows)
+        return fresh
+
+    def stats(self):
+        with self._lock, self._connect() as conn:
+            count = conn.execute('SELECT COUNT(*) FROM query_cache').fetchone()[0]
+        return {'entries': count, 'ttl': self.ttl, 'max_entries': self.max_entries}
+
+    def _evict(self, conn, now):
+        """期限切れを削除し、上限超過分は最終利用が古い順に削除"""
+        conn.execute('DELETE FROM query_cache WHERE captured_at < ?', (now - self.ttl,))
+        conn.execute('''
+            DELETE FROM query_cache WHERE key IN (
+                SELECT key FROM query_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+
+    def _artifacts_exist(self, result):
+        for field in self.artifact_fields:
+            value = result.get(field)
+            if value and not self.artifact_exists(value):
+                return False
+        return True
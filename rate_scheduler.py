@@ -0,0 +1,227 @@
+"""検索エンジン別のリクエスト予算スケジューラ
+
+エンジンごとにトークンバケットを持ち、予算が回復するまでの間は
+別エンジンの作業を実行する。1エンジンあたりのリクエスト頻度を上げずに
+バッチ全体の所要時間を短縮する。
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+# エンジン別の既定予算（控えめな値）
+#   rate_per_minute: 1分あたりに補充されるトークン数
+#   burst: バケット容量（連続実行できる最大数）
+#   jitter: 予算回復後に追加するランダム待機の上限秒数（人間らしさのため）
+DEFAULT_ENGINE_BUDGETS = {
+    'google': {'rate_per_minute': 2.0, 'burst': 1, 'jitter': 4.0},
+    'yahoo': {'rate_per_minute': 2.0, 'burst': 1, 'jitter': 4.0},
+    'bing': {'rate_per_minute': 2.0, 'burst': 1, 'jitter': 4.0},
+}
+
+# 設定のないエンジン用
+FALLBACK_BUDGET = {'rate_per_minute': 2.0, 'burst': 1, 'jitter': 4.0}
+
+
+def load_engine_budgets():
+    """既定予算に環境変数 ENGINE_RATE_BUDGETS（JSON）の設定を上書きする"""
+    budgets = {engine: dict(budget) for engine, budget in DEFAULT_ENGINE_BUDGETS.items()}
+    override = os.environ.get('ENGINE_RATE_BUDGETS')
+    if override:
+        for engine, budget in json.loads(override).items():
+            budgets.setdefault(engine, {}).update(budget)
+    return budgets
+
+
+class TokenBucket:
+    """1エンジン分のトークンバケット"""
+
+    def __init__(self, rate_per_minute, burst=1, jitter=0.0):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.jitter = jitter
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.not_before = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _wait_time(self, now):
+        self._refill(now)
+        if self.tokens >= 1:
+            return max(0.0, self.not_before - now)
+        return max((1 - self.tokens) / self.rate, self.not_before - now)
+
+    def wait_time(self, now=None):
+        """トークンが使えるまでの秒数（0なら即時実行可）"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return self._wait_time(now)
+
+    def try_acquire(self, now=None):
+        """トークンを1つ消費する。使えなければ消費せずに待ち秒数を返す"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            wait = self._wait_time(now)
+            if wait > 0:
+                return wait
+            self.tokens -= 1
+            # 次回実行に小さな揺らぎを加える
+            self.not_before = now + random.uniform(0, self.jitter) if self.jitter else 0.0
+            return 0.0
+
+
+class SQLiteTokenBucket:
+    """状態をSQLiteに保存し、複数プロセス・コンテナで共有するトークンバケット"""
+
+    def __init__(self, path, engine, rate_per_minute, burst=1, jitter=0.0):
+        self.path = path
+        self.engine = engine
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.jitter = jitter
+        conn = self._connect()
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_budgets '
+                '(engine TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, not_before REAL NOT NULL)'
+            )
+            conn.execute(
+                'INSERT OR IGNORE INTO rate_budgets VALUES (?, ?, ?, 0)', (engine, float(self.capacity), time.time())
+            )
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA busy_timeout=30000')
+        return conn
+
+    def _state(self, conn, now):
+        tokens, updated, not_before = conn.execute(
+            'SELECT tokens, updated, not_before FROM rate_budgets WHERE engine = ?', (self.engine,)
+        ).fetchone()
+        tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+        if tokens >= 1:
+            wait = max(0.0, not_before - now)
+        else:
+            wait = max((1 - tokens) / self.rate, not_before - now)
+        return tokens, wait
+
+    def wait_time(self, now=None):
+        now = time.time() if now is None else now
+        conn = self._connect()
+        try:
+            return self._state(conn, now)[1]
+        finally:
+            conn.close()
+
+    def try_acquire(self, now=None):
+        now = time.time() if now is None else now
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            tokens, wait = self._state(conn, now)
+            if wait > 0:
+                conn.execute('ROLLBACK')
+                return wait
+            not_before = now + random.uniform(0, self.jitter) if self.jitter else 0.0
+            conn.execute(
+                'UPDATE rate_budgets SET tokens = ?, updated = ?, not_before = ? WHERE engine = ?',
+                (tokens - 1, now, not_before, self.engine)
+            )
+            conn.execute('COMMIT')
+            return 0.0
+        finally:
+            conn.close()
+
+
+def create_engine_buckets(budgets=None, path=None):
+    """エンジン名 -> バケット
+
+    path を指定するとSQLiteに状態を保存し、同じファイルを使う全プロセスで予算を共有する。
+    省略時はプロセス内の全ジョブで共有する。
+    """
+    budgets = load_engine_budgets() if budgets is None else budgets
+    if path:
+        return {engine: SQLiteTokenBucket(path, engine, **budget) for engine, budget in budgets.items()}
+    return {engine: TokenBucket(**budget) for engine, budget in budgets.items()}
+
+
+class RateBudgetScheduler:
+    """エンジン別の予算の確認・消費と、作業時間・予算待ち時間の集計"""
+
+    def __init__(self, buckets=None):
+        self.buckets = create_engine_buckets() if buckets is None else buckets
+        self.stats = {
+            'work_seconds': 0.0,
+            'budget_wait_seconds': 0.0,
+            'engines': {},
+        }
+
+    def _engine_stats(self, engine):
+        return self.stats['engines'].setdefault(engine, {
+            'requests': 0,
+            'work_seconds': 0.0,
+        })
+
+    def ready_engines(self, engines):
+        """予算に余裕のあるエンジンと、余裕がない場合に最初に回復するまでの秒数"""
+        ready = []
+        soonest = None
+        for engine in engines:
+            wait = self._bucket(engine).wait_time()
+            if wait <= 0:
+                ready.append(engine)
+            elif soonest is None or wait < soonest:
+                soonest = wait
+        return ready, soonest
+
+    def acquire(self, engine):
+        """エンジンの予算を1つ消費（余裕がなければ False）"""
+        return self._bucket(engine).try_acquire() <= 0
+
+    def wait_acquire(self, engine, max_wait=None):
+        """予算が回復するまで待って1つ消費し、待った秒数を返す（max_wait は1回の待機の上限）"""
+        waited = 0.0
+        while True:
+            wait = self._bucket(engine).try_acquire()
+            if wait <= 0:
+                return waited
+            if max_wait is not None:
+                wait = min(wait, max_wait)
+            time.sleep(wait)
+            waited += wait
+
+    def record(self, engine, work_seconds, wait_seconds=0.0):
+        """他の実行経路（ワークキュー等）での作業・待機時間を集計に加える"""
+        self.stats['work_seconds'] += work_seconds
+        self.stats['budget_wait_seconds'] += wait_seconds
+        engine_stats = self._engine_stats(engine)
+        engine_stats['requests'] += 1
+        engine_stats['work_seconds'] += work_seconds
+
+    def report(self):
+        work = self.stats['work_seconds']
+        wait = self.stats['budget_wait_seconds']
+        total = work + wait
+        return {
+            'work_seconds': round(work, 1),
+            'budget_wait_seconds': round(wait, 1),
+            'work_ratio': round(work / total, 3) if total else None,
+            'engines': {
+                engine: {key: round(value, 1) if isinstance(value, float) else value
+                         for key, value in engine_stats.items()}
+                for engine, engine_stats in self.stats['engines'].items()
+            },
+        }
+
+    def _bucket(self, engine):
+        if engine not in self.buckets:
+            self.buckets[engine] = TokenBucket(**FALLBACK_BUDGET)
+        return self.buckets[engine]
@@ -0,0 +1,206 @@
+"""スクリーンショットの変換・保存パイプライン
+
+ブラウザスレッドはPNGのバイト列を渡すだけにし、再エンコード（最適化PNG/WebP/JPEG）、
+縮小、ディスク書き込みはスレッドプールで行う。保留中の件数には上限があり、
+上限に達した場合のみブラウザ側が待たされる。
+uploader を渡すと、書き込んだ画像を内容のハッシュをキーにして成果物の保存先へ送る。
+"""
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from artifact_store import content_key
+
+try:
+    from PIL import Image
+except ImportError:  # Pillowがなければ受け取ったPNGをそのまま保存
+    Image = None
+
+# 出力形式 -> 拡張子
+SCREENSHOT_FORMATS = {
+    'png': '.png',
+    'webp': '.webp',
+    'jpeg': '.jpg',
+}
+
+
+class ScreenshotWriter:
+    """バッチ単位のスクリーンショット書き込みステージ"""
+
+    def __init__(self, image_format='png', quality=80, max_width=None, workers=2, max_pending=8, hasher=None, uploader=None):
+        if image_format not in SCREENSHOT_FORMATS:
+            raise ValueError(f'未対応の画像形式です: {image_format}')
+        if Image is None and image_format != 'png':
+            print("⚠️ Pillowが見つからないためPNGのまま保存します")
+            image_format = 'png'
+
+        self.image_format = image_format
+        self.quality = quality
+        self.max_width = max_width
+        # hasher(image): 変換時に読み込んだ画像から指紋（知覚ハッシュ等）を計算する
+        self.hasher = hasher if Image is not None else None
+        self._fingerprints = {}
+        # uploader: 成果物の保存先へのアップロード（ArtifactUploader）
+        self.uploader = uploader
+        self._artifact_keys = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='screenshot-writer')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._futures = []
+        # take_futures() で取り出すまでに投入した書き込み（作業項目ごとの完了待ちに使う）
+        self._recent = []
+        self._lock = threading.Lock()
+        self._stats = {
+            'screenshots': 0,
+            'raw_bytes': 0,
+            'written_bytes': 0,
+            'encode_seconds': 0.0,
+            'blocked_seconds': 0.0,
+            'errors': 0,
+        }
+
+    def output_path(self, path):
+        """出力形式に合わせて拡張子を差し替えたパス"""
+        root, _ = os.path.splitext(path)
+        return root + SCREENSHOT_FORMATS[self.image_format]
+
+    def submit(self, png_bytes, path):
+        """PNGバイト列を書き込みキューに入れ、保存先パスを返す"""
+        final_path = self.output_path(path)
+
+        started = time.monotonic()
+        self._slots.acquire()
+        blocked = time.monotonic() - started
+
+        future = self._executor.submit(self._encode_and_write, png_bytes, final_path)
+        with self._lock:
+            self._stats['blocked_seconds'] += blocked
+            if len(self._futures) >= 256:
+                self._futures = [f for f in self._futures if not f.done()]
+            self._futures.append(future)
+            self._recent.append(future)
+        return final_path
+
+    def _encode_and_write(self, png_bytes, path):
+        started = time.monotonic()
+        try:
+            with metrics.span('screenshot_write'):
+                data, fingerprint = self._encode(png_bytes)
+                with open(path, 'wb') as f:
+                    f.write(data)
+            upload = None
+            if self.uploader is not None:
+                upload = self.uploader.submit(content_key(data, SCREENSHOT_FORMATS[self.image_format]), path)
+            with self._lock:
+                if fingerprint is not None:
+                    self._fingerprints[path] = fingerprint
+                if upload is not None:
+                    self._artifact_keys[path] = upload
+                self._stats['screenshots'] += 1
+                self._stats['raw_bytes'] += len(png_bytes)
+                self._stats['written_bytes'] += len(data)
+                self._stats['encode_seconds'] += time.monotonic() - started
+            return path
+        except Exception as e:
+            print(f"⚠️ スクリーンショット保存エラー ({path}): {e}")
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            self._slots.release()
+
+    def _encode(self, png_bytes):
+        """(書き込むバイト列, 指紋) を返す"""
+        if Image is None:
+            return png_bytes, None
+
+        image = Image.open(io.BytesIO(png_bytes))
+        fingerprint = self.hasher(image) if self.hasher is not None else None
+        if self.max_width and image.width > self.max_width:
+            height = round(image.height * self.max_width / image.width)
+            image = image.resize((self.max_width, height), Image.LANCZOS)
+
+        out = io.BytesIO()
+        if self.image_format == 'png':
+            image.save(out, format='PNG', optimize=True)
+        elif self.image_format == 'webp':
+            image.save(out, format='WEBP', quality=self.quality, method=4)
+        else:
+            image.convert('RGB').save(out, format='JPEG', quality=self.quality, optimize=True)
+        return out.getvalue(), fingerprint
+
+    def flush(self):
+        """保留中の書き込みがすべて終わるまで待つ"""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+    def take_futures(self):
+        """前回の呼び出し以降に投入した書き込みの Future（完了を待つかどうかは呼び出し側が決める）"""
+        with self._lock:
+            futures, self._recent = self._recent, []
+        return futures
+
+    def pop_fingerprints(self, paths=None):
+        """書き込み済み画像のパス -> 指紋（取得した分は消去。paths を指定すればそのパスだけ）"""
+        return self._pop(self._fingerprints, paths)
+
+    def pop_artifact_keys(self, paths=None):
+        """書き込み済み画像のパス -> 成果物のキー（取得した分は消去。paths を指定すればそのパスだけ）
+
+        アップロードの完了を待ち、保存できた画像のキーだけを返す。
+        """
+        uploads = self._pop(self._artifact_keys, paths)
+        return {path: key for path, key in ((path, upload.result()) for path, upload in uploads.items()) if key}
+
+    def _pop(self, entries, paths):
+        with self._lock:
+            if paths is None:
+                popped = dict(entries)
+                entries.clear()
+                return popped
+            return {path: entries.pop(path) for path in paths if path in entries}
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+    def stats(self, reset=False):
+        """集計値（reset=True なら取得後に0に戻す。作業項目ごとの集計に使う）"""
+        with self._lock:
+            stats = dict(self._stats)
+            if reset:
+                for key, value in self._stats.items():
+                    self._stats[key] = type(value)()
+        return _finalize_stats(stats, self.image_format)
+
+
+def _finalize_stats(stats, image_format):
+    stats['format'] = image_format
+    stats['encode_seconds'] = round(stats['encode_seconds'], 2)
+    stats['blocked_seconds'] = round(stats['blocked_seconds'], 2)
+    if stats['raw_bytes']:
+        stats['compression_ratio'] = round(stats['written_bytes'] / stats['raw_bytes'], 3)
+    return stats
+
+
+def combine_stats(stats_list, image_format):
+    """複数ワーカーの stats() を合算"""
+    totals = {
+        'screenshots': 0,
+        'raw_bytes': 0,
+        'written_bytes': 0,
+        'encode_seconds': 0.0,
+        'blocked_seconds': 0.0,
+        'errors': 0,
+    }
+    for stats in stats_list:
+        for key in totals:
+            totals[key] += stats.get(key, 0)
+    return _finalize_stats(totals, image_format)
@@ -0,0 +1,81 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from artifact_store import ArtifactUploader, LocalArtifactStore, S3ArtifactStore, file_content_key, is_valid_key
+
+BUCKET = 'captures'
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture
+def capture_file(tmp_path):
+    path = tmp_path / 'google_suggest_with_corp.png'
+    path.write_bytes(b'\x89PNG\r\n\x1a\n' + b'capture' * 100)
+    return str(path)
+
+
+def test_s3_put_exists_get(s3_client, capture_file):
+    store = S3ArtifactStore(BUCKET, prefix='/batches/', client=s3_client)
+    key = file_content_key(capture_file)
+    assert is_valid_key(key)
+    assert not store.exists(key)
+
+    assert store.put_file(key, capture_file) is True
+    assert store.exists(key)
+    stored = s3_client.get_object(Bucket=BUCKET, Key=f'batches/{key}')
+    assert stored['ContentType'] == 'image/png'
+    with open(capture_file, 'rb') as f:
+        assert stored['Body'].read() == f.read()
+
+    # 同じ内容は二度送らない
+    assert store.put_file(key, capture_file) is False
+    assert f'batches/{key}' in store.download_url(key)
+
+
+def test_uploader_resolves_key_after_upload(s3_client, capture_file):
+    uploader = ArtifactUploader(S3ArtifactStore(BUCKET, client=s3_client), workers=2)
+    key = file_content_key(capture_file)
+    try:
+        first = uploader.submit(key, capture_file)
+        second = uploader.submit(key, capture_file)
+        assert first.result(timeout=10) == key
+        assert second.result(timeout=10) == key
+    finally:
+        uploader.close()
+    assert uploader.stats()['errors'] == 0
+    assert uploader.pending_path(key) is None
+
+
+class FailingStore(LocalArtifactStore):
+    def put_file(self, key, source_path):
+        raise OSError('disk full')
+
+
+def test_uploader_failure_returns_no_key(tmp_path, capture_file):
+    uploader = ArtifactUploader(FailingStore(str(tmp_path / 'artifacts')))
+    try:
+        assert uploader.submit_file(capture_file).result(timeout=10) is None
+    finally:
+        uploader.close()
+    assert uploader.stats()['errors'] == 1
+
+
+def test_local_store_deduplicates(tmp_path, capture_file):
+    store = LocalArtifactStore(str(tmp_path / 'artifacts'))
+    key = file_content_key(capture_file)
+    assert store.put_file(key, capture_file) is True
+    assert store.exists(key)
+    assert store.put_file(key, capture_file) is False
+    with open(store.path(key), 'rb') as stored, open(capture_file, 'rb') as original:
+        assert stored.read() == original.read()
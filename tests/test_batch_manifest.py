@@ -0,0 +1,65 @@
+import os
+
+from batch_manifest import BatchManifest
+
+FIELDS = ('suggest', 'related_words', 'texts_path')
+
+
+def test_load_state_restores_items_and_captures(tmp_path):
+    folder = tmp_path / 'batch'
+    folder.mkdir()
+    manifest = BatchManifest(str(folder))
+    manifest.write_header(['株式会社A'], {}, {'enable_yahoo': False})
+    suggest = os.path.join(str(folder), '株式会社A', 'google', 'google_suggest_with_corp.png')
+    related = os.path.join(str(folder), '株式会社A', 'google', 'google_related_words_with_corp.png')
+    manifest.record_capture('株式会社A', 'google', 'with_corp', 'suggest', suggest)
+    manifest.record_item('株式会社A', 'google', 'with_corp',
+                         {'suggest': suggest, 'related_words': related, 'texts_path': None}, artifact_fields=FIELDS)
+    manifest.record_capture('株式会社A', 'bing', 'with_corp', 'suggest', suggest.replace('google', 'bing'))
+
+    state = manifest.load_state(artifact_fields=FIELDS)
+    assert state['header']['companies'] == ['株式会社A']
+    assert state['completed'] is False
+    assert state['items'][('株式会社A', 'google', 'with_corp')]['suggest'] == suggest
+    assert state['items'][('株式会社A', 'google', 'with_corp')]['related_words'] == related
+    # 完了していない作業は撮影済みの分だけ分かる
+    assert ('株式会社A', 'bing', 'with_corp') not in state['items']
+    assert state['captures'][('株式会社A', 'bing', 'with_corp')] == {'suggest': suggest.replace('google', 'bing')}
+
+
+def test_paths_are_stored_relative_to_the_batch(tmp_path):
+    folder = tmp_path / 'batch'
+    folder.mkdir()
+    manifest = BatchManifest(str(folder))
+    path = os.path.join(str(folder), 'A', 'google', 'suggest.png')
+    manifest.record_item('A', 'google', 'original', {'suggest': path}, artifact_fields=FIELDS)
+
+    [record] = manifest.iter_items()
+    assert record['result']['suggest'] == os.path.join('A', 'google', 'suggest.png')
+    # フォルダを移動しても復元できる
+    moved = tmp_path / 'moved'
+    folder.rename(moved)
+    state = BatchManifest(str(moved)).load_state(artifact_fields=FIELDS)
+    assert state['items'][('A', 'google', 'original')]['suggest'] == os.path.join(str(moved), 'A', 'google', 'suggest.png')
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    manifest = BatchManifest(str(tmp_path))
+    manifest.record_item('A', 'google', 'original', {'suggest': None}, artifact_fields=FIELDS)
+    with open(manifest.path, 'a', encoding='utf-8') as f:
+        f.write('{"record": "item", "company": "B"')
+
+    state = manifest.load_state(artifact_fields=FIELDS)
+    assert list(state['items']) == [('A', 'google', 'original')]
+
+
+def test_completed_and_resumed_batches(tmp_path):
+    manifest = BatchManifest(str(tmp_path))
+    manifest.record_item('A', 'google', 'original', {'suggest': None}, artifact_fields=FIELDS)
+    manifest.record_item('A', 'google', 'original', {'suggest': None, 'retried': True}, artifact_fields=FIELDS)
+    manifest.record_resume('job-2')
+    assert manifest.load_state()['completed'] is False
+    manifest.record_completed({'processed_companies': 1})
+    assert manifest.load_state()['completed'] is True
+    # 同じ対象が重複した場合は最初の1件
+    assert [record['result'].get('retried') for record in manifest.iter_items()] == [None]
@@ -0,0 +1,25 @@
+import io
+import sys
+
+import pytest
+
+from company_ingest import IngestError, ingest_companies
+
+
+def test_csv_is_normalized_and_deduplicated():
+    stream = io.BytesIO('会社名\n株式会社A\n(株)A\n\nB\n'.encode('utf-8'))
+    ingested = ingest_companies(stream, 'list.csv')
+    assert ingested['companies'] == ['株式会社A', 'B']
+    assert ingested['duplicates'] == 1
+    assert ingested['empty_rows'] == 1
+
+
+def test_xls_without_xlrd_asks_for_conversion(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'xlrd', None)
+    with pytest.raises(IngestError, match='.xlsx または .csv'):
+        ingest_companies(io.BytesIO(b''), 'list.xls')
+
+
+def test_unknown_extension_is_rejected():
+    with pytest.raises(IngestError):
+        ingest_companies(io.BytesIO(b''), 'list.pdf')
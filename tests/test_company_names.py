@@ -0,0 +1,53 @@
+import io
+
+import pytest
+
+from company_ingest import ingest_companies
+from company_names import company_variations, normalize_company_name, parse_company_name
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('株式会社テスト', '株式会社テスト'),
+    ('㈱テスト', '株式会社テスト'),
+    ('（株）テスト', '株式会社テスト'),
+    ('テスト(株)', 'テスト株式会社'),
+    ('ﾃｽﾄ　株式会社', 'テスト株式会社'),
+    ('  テスト   商事 ', 'テスト 商事'),
+    ('ＡＢＣ有限会社', 'ABC有限会社'),
+    ('NPO法人テスト', '特定非営利活動法人テスト'),
+])
+def test_normalize_company_name(raw, expected):
+    assert normalize_company_name(raw) == expected
+
+
+def test_parse_prefix_and_suffix_forms():
+    assert parse_company_name('㈱テスト') == {
+        'name': '株式会社テスト', 'base': 'テスト', 'legal_entity': '株式会社', 'position': 'prefix'}
+    assert parse_company_name('テスト(有)') == {
+        'name': 'テスト有限会社', 'base': 'テスト', 'legal_entity': '有限会社', 'position': 'suffix'}
+    assert parse_company_name('テスト')['legal_entity'] is None
+
+
+def test_parse_embedded_form():
+    parsed = parse_company_name('ABC株式会社東京')
+    assert parsed == {'name': 'ABC株式会社東京', 'base': 'ABC東京', 'legal_entity': '株式会社', 'position': 'embedded'}
+    assert company_variations('ABC株式会社東京') == [
+        {'name': 'ABC株式会社東京', 'type': 'with_corp'},
+        {'name': 'ABC東京', 'type': 'without_corp'},
+    ]
+
+
+def test_variations_without_legal_form():
+    assert company_variations('テスト') == [
+        {'name': 'テスト', 'type': 'original'},
+        {'name': '株式会社テスト', 'type': 'prefix_corp'},
+        {'name': 'テスト株式会社', 'type': 'suffix_corp'},
+    ]
+
+
+def test_ingest_deduplicates_normalized_names():
+    data = '会社名\n㈱テスト\n株式会社テスト\n\nＡＢＣ\nABC\n'.encode('utf-8')
+    ingested = ingest_companies(io.BytesIO(data), 'companies.csv', column='会社名')
+    assert ingested['companies'] == ['株式会社テスト', 'ABC']
+    assert ingested['duplicates'] == 2
+    assert ingested['empty_rows'] == 1
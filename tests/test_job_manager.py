@@ -0,0 +1,33 @@
+import job_manager
+from job_manager import Job
+
+
+def make_job(monkeypatch, max_events):
+    monkeypatch.setattr(job_manager, 'MAX_EVENTS', max_events)
+    return Job('test', {'companies': ['A']})
+
+
+def test_event_buffer_is_capped_and_seq_keeps_counting(monkeypatch):
+    job = make_job(monkeypatch, 3)
+    for index in range(5):
+        job.emit('progress', index=index)
+    assert [event['seq'] for event in job.events] == [2, 3, 4]
+    assert job.to_dict(include_results=False)['event_count'] == 5
+
+
+def test_iter_events_resumes_from_oldest_retained_event(monkeypatch):
+    job = make_job(monkeypatch, 3)
+    for index in range(5):
+        job.emit('progress', index=index)
+    job.finish('completed', result={'message': 'done'})
+
+    # 捨てられた範囲から再開した場合は残っている最古のイベントから返す
+    assert [event['seq'] for event in job.iter_events(since=1)] == [3, 4, 5]
+    assert [event['seq'] for event in job.iter_events(since=4)] == [4, 5]
+
+
+def test_to_dict_omits_results_unless_requested(monkeypatch):
+    job = make_job(monkeypatch, 10)
+    job.finish('completed', result={'message': 'done', 'summary': {}})
+    assert 'result' not in job.to_dict(include_results=False)
+    assert job.to_dict()['result']['message'] == 'done'
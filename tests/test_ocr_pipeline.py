@@ -0,0 +1,60 @@
+from concurrent.futures import Future
+
+import ocr_pipeline
+from ocr_pipeline import NegativeWordMatcher, OcrStage
+
+
+class ManualExecutor:
+    """submit したOCRを run() を呼ぶまで保留する実行器"""
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.submitted = []
+
+    def submit(self, fn, path):
+        future = Future()
+        self.submitted.append((path, future))
+        return future
+
+    def run(self):
+        submitted, self.submitted = self.submitted, []
+        for path, future in submitted:
+            future.set_result(self.texts[path])
+
+
+def make_stage(monkeypatch, texts):
+    monkeypatch.setattr(ocr_pipeline, 'pytesseract', object())
+    matcher = NegativeWordMatcher({'詐欺・違法': {'weight': 5, 'words': ['詐欺']}})
+    return OcrStage(matcher, executor=ManualExecutor(texts))
+
+
+def test_same_word_from_text_and_ocr_is_scored_once(monkeypatch, tmp_path):
+    path = tmp_path / 'google_suggest_original.png'
+    path.write_bytes(b'')
+    stage = make_stage(monkeypatch, {str(path): 'A 詐 欺'})
+
+    stage.add_text(['A'], 'google', 'suggest', ['A 詐欺'])
+    stage.submit_image(['A'], 'google', 'suggest', str(path))
+    stage.executor.run()
+    stage.add_text(['A'], 'bing', 'suggest', ['A 詐欺'])
+
+    result = stage.results()['A']
+    assert result['summary']['matched_words'] == {'詐欺': 2}
+    assert result['risk_assessment']['score'] == 10
+    assert [(hit['engine'], hit['source']) for hit in result['hits']] == [('google', 'text'), ('bing', 'text')]
+
+
+def test_resubmitted_path_after_dispatch_is_analyzed_again(monkeypatch, tmp_path):
+    path = tmp_path / 'google_suggest_original.png'
+    path.write_bytes(b'')
+    stage = make_stage(monkeypatch, {str(path): 'A 詐欺'})
+
+    stage.submit_image(['A'], 'google', 'suggest', str(path))
+    stage.executor.run()
+    stage.submit_image(['B'], 'google', 'suggest', str(path))
+    assert len(stage.executor.submitted) == 1
+    stage.executor.run()
+
+    results = stage.results()
+    assert results['A']['summary']['images_analyzed'] == 1
+    assert results['B']['summary']['matched_words'] == {'詐欺': 1}
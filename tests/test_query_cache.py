@@ -0,0 +1,68 @@
+import pytest
+
+import query_cache
+from query_cache import QueryCache
+
+OPTIONS = {'basic_suggest': True, 'related_words': True}
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, 'time', clock)
+    return clock
+
+
+def make_cache(tmp_path, **kwargs):
+    return QueryCache(str(tmp_path / 'query_cache.db'), artifact_fields=('suggest',),
+                      artifact_exists=lambda path: True, **kwargs)
+
+
+def test_entry_expires_after_ttl(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl=60)
+    cache.put('google', 'テスト', OPTIONS, {'suggest': 'a.png'})
+    clock.now += 59
+    assert cache.get('google', 'テスト', OPTIONS)['result'] == {'suggest': 'a.png'}
+    assert cache.fresh_queries([('google', 'テスト')], OPTIONS) == {('google', 'テスト')}
+    clock.now += 2
+    assert cache.get('google', 'テスト', OPTIONS) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_key_includes_engine_and_options(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.put('google', 'テスト', OPTIONS, {'suggest': 'a.png'})
+    assert cache.get('bing', 'テスト', OPTIONS) is None
+    assert cache.get('google', 'テスト', dict(OPTIONS, related_words=False)) is None
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.put('google', 'a', OPTIONS, {'suggest': 'a.png'})
+    clock.now += 1
+    cache.put('google', 'b', OPTIONS, {'suggest': 'b.png'})
+    clock.now += 1
+    # a を使うと、最終利用が古いのは b になる
+    assert cache.get('google', 'a', OPTIONS) is not None
+    clock.now += 1
+    cache.put('google', 'c', OPTIONS, {'suggest': 'c.png'})
+
+    assert cache.stats()['entries'] == 2
+    assert cache.get('google', 'b', OPTIONS) is None
+    assert cache.get('google', 'a', OPTIONS) is not None
+    assert cache.get('google', 'c', OPTIONS) is not None
+
+
+def test_entry_with_missing_artifact_is_dropped(tmp_path, clock):
+    cache = QueryCache(str(tmp_path / 'query_cache.db'), artifact_fields=('suggest',))
+    cache.put('google', 'テスト', OPTIONS, {'suggest': str(tmp_path / 'missing.png')})
+    assert cache.get('google', 'テスト', OPTIONS) is None
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+import time
+
+from rate_scheduler import SQLiteTokenBucket, TokenBucket
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def acquire_in_subprocess(path, engine, rate_per_minute):
+    """別プロセスで同じバケットから1つ消費し、待ち秒数を返す"""
+    code = (
+        'from rate_scheduler import SQLiteTokenBucket\n'
+        f'bucket = SQLiteTokenBucket({path!r}, {engine!r}, {rate_per_minute!r})\n'
+        'print(bucket.try_acquire())\n'
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', code], check=True, capture_output=True, text=True,
+        env=dict(os.environ, PYTHONPATH=REPO_ROOT),
+    ).stdout
+    return float(output)
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate_per_minute=6, burst=2)
+    now = time.monotonic()
+    assert bucket.try_acquire(now) == 0
+    assert bucket.try_acquire(now) == 0
+    assert bucket.try_acquire(now) == 10
+    assert bucket.try_acquire(now + 5) == 5
+    assert bucket.try_acquire(now + 10) == 0
+
+
+def test_sqlite_bucket_is_shared_across_processes(tmp_path):
+    path = str(tmp_path / 'budgets.db')
+    bucket = SQLiteTokenBucket(path, 'google', rate_per_minute=6)
+
+    assert acquire_in_subprocess(path, 'google', 6) == 0
+    now = time.time()
+    # 別プロセスが消費したため、このプロセスでは回復待ちになる
+    assert 0 < bucket.try_acquire(now) <= 10
+    assert acquire_in_subprocess(path, 'google', 6) > 0
+    # 補充間隔が過ぎれば回復する
+    assert bucket.try_acquire(now + 10) == 0
+    # 他のエンジンの予算には影響しない
+    assert SQLiteTokenBucket(path, 'bing', rate_per_minute=6).try_acquire() == 0
+
+
+def test_sqlite_bucket_keeps_state_when_reopened(tmp_path):
+    path = str(tmp_path / 'budgets.db')
+    now = time.time()
+    assert SQLiteTokenBucket(path, 'yahoo', rate_per_minute=60, burst=1).try_acquire(now) == 0
+    reopened = SQLiteTokenBucket(path, 'yahoo', rate_per_minute=60, burst=1)
+    assert reopened.wait_time(now) > 0
+    assert reopened.wait_time(now + 1) == 0
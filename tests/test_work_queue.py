@@ -0,0 +1,126 @@
+import pytest
+
+import work_queue
+from work_queue import WorkQueue
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(work_queue.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return WorkQueue(str(tmp_path / 'work_queue.db'), lease_seconds=60, max_attempts=2)
+
+
+def items(prefix, count, engine='google'):
+    return [(f'{prefix}{index}', engine, {'n': index}) for index in range(count)]
+
+
+def claim_batches(queue, count):
+    claimed = []
+    for _ in range(count):
+        item = queue.claim('worker')
+        assert item is not None
+        claimed.append(item['batch_id'])
+        queue.complete(item['id'], 'worker', {})
+    return claimed
+
+
+def test_equal_weight_flows_alternate(queue):
+    queue.enqueue_batch('a', 'job-a', items('a', 4), owner='alice')
+    queue.enqueue_batch('b', 'job-b', items('b', 4), owner='bob')
+    assert claim_batches(queue, 6) == ['a', 'b', 'a', 'b', 'a', 'b']
+
+
+def test_weighted_flows_share_by_priority(queue):
+    queue.enqueue_batch('bulk', 'job-1', items('x', 10), owner='alice', priority='bulk')
+    queue.enqueue_batch('urgent', 'job-2', items('y', 10), owner='bob', priority='urgent')
+    claimed = claim_batches(queue, 11)
+    # 重み 8 : 0.25 のため、先頭の1件の後は urgent が全件先に取り出される
+    assert claimed[0] == 'bulk'
+    assert claimed[1:11] == ['urgent'] * 10
+
+
+def test_same_owner_batches_share_one_flow(queue):
+    queue.enqueue_batch('a1', 'job-1', items('a', 3), owner='alice')
+    queue.enqueue_batch('a2', 'job-2', items('b', 3), owner='alice')
+    queue.enqueue_batch('c', 'job-3', items('c', 3), owner='carol')
+    claimed = claim_batches(queue, 4)
+    assert claimed.count('c') == 2
+
+
+def test_claim_filters_engines(queue):
+    queue.enqueue_batch('a', 'job-a', items('g', 1) + items('b', 1, engine='bing'))
+    assert queue.claim('worker', engines=['bing'])['engine'] == 'bing'
+    assert queue.claim('worker', engines=['bing']) is None
+    assert queue.claim('worker', engines=[]) is None
+
+
+def test_expired_lease_is_reclaimed(queue, clock):
+    queue.enqueue_batch('a', 'job-a', items('a', 1))
+    first = queue.claim('worker-1')
+    assert queue.claim('worker-2') is None
+
+    clock.now += 61
+    second = queue.claim('worker-2')
+    assert second['id'] == first['id']
+    # リースを失ったワーカーの完了通知・ハートビートは無視される
+    assert queue.heartbeat(first['id'], 'worker-1') is False
+    assert queue.complete(first['id'], 'worker-1', {'stale': True}) is False
+    assert queue.complete(second['id'], 'worker-2', {'ok': True}) is True
+    [finished] = queue.take_finished('a')
+    assert finished['status'] == 'done'
+    assert finished['result'] == {'ok': True}
+
+
+def test_heartbeat_extends_lease(queue, clock):
+    queue.enqueue_batch('a', 'job-a', items('a', 1))
+    claimed = queue.claim('worker-1')
+    clock.now += 50
+    assert queue.heartbeat(claimed['id'], 'worker-1') is True
+    clock.now += 50
+    assert queue.claim('worker-2') is None
+
+
+def test_lease_expiry_fails_after_max_attempts(queue, clock):
+    queue.enqueue_batch('a', 'job-a', items('a', 1))
+    for _ in range(2):
+        assert queue.claim('worker') is not None
+        clock.now += 61
+    assert queue.claim('worker') is None
+    [finished] = queue.take_finished('a')
+    assert finished['status'] == 'failed'
+    assert finished['error'] == 'リース期限切れ'
+
+
+def test_release_does_not_count_as_attempt(queue):
+    queue.enqueue_batch('a', 'job-a', items('a', 1))
+    for _ in range(3):
+        claimed = queue.claim('worker')
+        queue.release(claimed['id'], 'worker')
+    claimed = queue.claim('worker')
+    queue.fail(claimed['id'], 'worker', 'error')
+    # 返却は試行回数に数えないため、1回目の失敗では再投入される
+    assert queue.claim('worker')['id'] == claimed['id']
+
+
+def test_cancel_batch_fails_remaining_items(queue):
+    queue.enqueue_batch('a', 'job-a', items('a', 3))
+    leased = queue.claim('worker')
+    assert queue.cancel_batch('a', 'timeout') == 3
+    assert queue.complete(leased['id'], 'worker', {}) is False
+    finished = queue.take_finished('a')
+    assert [entry['status'] for entry in finished] == ['failed'] * 3
+    assert {entry['error'] for entry in finished} == {'timeout'}
@@ -0,0 +1,220 @@
+"""抽出テキストの全文検索インデックス（SQLite FTS5）
+
+撮影ごとのサジェスト・関連ワード（DOM抽出）とOCRテキストを、会社・エンジン・パターン種別・
+撮影種別・取得日時とともに保存し、語・会社・期間で検索できるようにする。
+日本語は分かち書きせず、正規化した本文の2文字ずつの並び（バイグラム）を FTS5 の語として登録する。
+検索語もバイグラムのフレーズに変換するため、「倒産」「ブラック」のような2文字以上の部分一致が
+インデックスだけで引ける（1文字の検索語のみ本文を照合して絞り込む）。
+同じ (バッチ, 会社, エンジン, パターン種別, 撮影種別, 取得元) は一度だけ登録する。
+"""
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from ocr_pipeline import normalize_text
+
+# 取得元
+SOURCE_TEXT = 'text'  # DOMから抽出したサジェスト・関連ワード
+SOURCE_OCR = 'ocr'    # スクリーンショットのOCR
+
+# 区切りをまたいだフレーズ一致を防ぐために部分の間に入れる語
+# （検索語は2文字以下の語にしかならないため、3文字の語はどの検索にも一致しない）
+SEGMENT_BREAK = 'sep'
+
+# 会社別の集計で返す上限
+MAX_COMPANIES = 1000
+
+
+def _segments(text):
+    """文字・数字の連続部分（記号で区切る。区切りをまたぐ語は作らない）"""
+    segment = []
+    for char in text:
+        if char.isalnum():
+            segment.append(char)
+        elif segment:
+            yield ''.join(segment)
+            segment = []
+    if segment:
+        yield ''.join(segment)
+
+
+def bigrams(text):
+    """正規化した本文のバイグラム（1文字だけの部分はそのまま）"""
+    grams = []
+    for line in (text or '').splitlines():
+        for segment in _segments(normalize_text(line)):
+            if len(segment) == 1:
+                grams.append(segment)
+            else:
+                grams.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+            grams.append(SEGMENT_BREAK)
+    return ' '.join(grams)
+
+
+def match_query(term):
+    """検索語 -> FTS5 のクエリ（2文字以上の部分をバイグラムのフレーズにして AND）と1文字の部分"""
+    phrases = []
+    singles = []
+    for segment in _segments(normalize_text(term)):
+        if len(segment) == 1:
+            singles.append(segment)
+        else:
+            phrases.append('"' + ' '.join(segment[i:i + 2] for i in range(len(segment) - 1)) + '"')
+    return ' AND '.join(phrases), singles
+
+
+def _timestamp(value, end_of_day=False):
+    """ISO形式の日付・日時 -> UNIX時刻（日付のみで end_of_day なら翌日0時の直前まで含める）"""
+    parsed = datetime.fromisoformat(value)
+    timestamp = parsed.timestamp()
+    if end_of_day and len(value) <= 10:
+        timestamp += 86400 - 0.001
+    return timestamp
+
+
+class TextIndex:
+    """撮影テキストのインデックス（SQLite）"""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    batch_id TEXT NOT NULL,
+                    company TEXT NOT NULL,
+                    engine TEXT NOT NULL,
+                    variation_type TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    captured_at REAL NOT NULL,
+                    path TEXT,
+                    artifact_key TEXT,
+                    content TEXT NOT NULL,
+                    UNIQUE (batch_id, company, engine, variation_type, kind, source)
+                );
+                CREATE INDEX IF NOT EXISTS idx_documents_company ON documents (company, captured_at);
+                CREATE INDEX IF NOT EXISTS idx_documents_captured_at ON documents (captured_at);
+                CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                    grams, tokenize = 'unicode61 remove_diacritics 0'
+                );
+            ''')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def add_documents(self, documents):
+        """文書をまとめて登録し、新たに登録した件数を返す
+
+        documents: [{'batch_id', 'company', 'engine', 'variation_type', 'kind', 'source',
+                     'captured_at', 'content', 'path'（任意）, 'artifact_key'（任意）}, ...]
+        """
+        added = 0
+        with self._connect() as conn:
+            for document in documents:
+                if not (document.get('content') or '').strip():
+                    continue
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO documents (batch_id, company, engine, variation_type, kind, source, '
+                    'captured_at, path, artifact_key, content) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (document['batch_id'], document['company'], document['engine'], document['variation_type'],
+                     document['kind'], document['source'], document.get('captured_at') or time.time(),
+                     document.get('path'), document.get('artifact_key'), document['content'])
+                )
+                if cursor.rowcount:
+                    conn.execute('INSERT INTO documents_fts (rowid, grams) VALUES (?, ?)',
+                                 (cursor.lastrowid, bigrams(document['content'])))
+                    added += 1
+        return added
+
+    def indexed_batches(self):
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute('SELECT DISTINCT batch_id FROM documents')}
+
+    def search(self, term=None, company=None, engine=None, kind=None, source=None,
+               since=None, until=None, limit=100, offset=0):
+        """条件に合う文書を新しい順に返す（term は部分一致。since / until はISO形式の日付・日時）
+
+        戻り値: {'total', 'documents': [...], 'companies': [{'company', 'hits', 'last_captured_at'}]}
+        """
+        conditions = []
+        params = []
+        singles = []
+        if term:
+            fts_query, singles = match_query(term)
+            if fts_query:
+                conditions.append('id IN (SELECT rowid FROM documents_fts WHERE documents_fts MATCH ?)')
+                params.append(fts_query)
+            elif not singles:
+                return {'total': 0, 'documents': [], 'companies': []}
+        for column, value in (('company', company), ('engine', engine), ('kind', kind), ('source', source)):
+            if value:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        if since:
+            conditions.append('captured_at >= ?')
+            params.append(_timestamp(since))
+        if until:
+            conditions.append('captured_at <= ?')
+            params.append(_timestamp(until, end_of_day=True))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        columns = 'batch_id, company, engine, variation_type, kind, source, captured_at, path, artifact_key, content'
+        with self._connect() as conn:
+            if singles:
+                # 1文字の検索語は本文を見て絞り込む（インデックスで絞った後の行だけ）
+                rows = conn.execute(
+                    f'SELECT {columns} FROM documents {where} ORDER BY captured_at DESC, id DESC', params
+                ).fetchall()
+                rows = [row for row in rows if all(char in normalize_text(row[9]) for char in singles)]
+                total = len(rows)
+                companies = {}
+                for row in rows:
+                    entry = companies.setdefault(row[1], [0, row[6]])
+                    entry[0] += 1
+                    entry[1] = max(entry[1], row[6])
+                company_rows = sorted(((name, hits, last) for name, (hits, last) in companies.items()),
+                                      key=lambda row: (-row[1], row[0]))[:MAX_COMPANIES]
+                rows = rows[offset:offset + limit]
+            else:
+                total = conn.execute(f'SELECT COUNT(*) FROM documents {where}', params).fetchone()[0]
+                rows = conn.execute(
+                    f'SELECT {columns} FROM documents {where} ORDER BY captured_at DESC, id DESC LIMIT ? OFFSET ?',
+                    params + [limit, offset]
+                ).fetchall()
+                company_rows = conn.execute(
+                    f'SELECT company, COUNT(*), MAX(captured_at) FROM documents {where} '
+                    'GROUP BY company ORDER BY COUNT(*) DESC, company LIMIT ?', params + [MAX_COMPANIES]
+                ).fetchall()
+
+        term_segments = list(_segments(normalize_text(term))) if term else []
+        return {
+            'total': total,
+            'documents': [{
+                'batch_id': row[0],
+                'company': row[1],
+                'engine': row[2],
+                'variation_type': row[3],
+                'kind': row[4],
+                'source': row[5],
+                'captured_at': datetime.fromtimestamp(row[6]).isoformat(),
+                'path': row[7],
+                'artifact_key': row[8],
+                # 一致した行（サジェスト・関連ワードなら該当する語）
+                'matches': [line for line in row[9].splitlines()
+                            if any(segment in normalize_text(line) for segment in term_segments)][:20],
+            } for row in rows],
+            'companies': [{
+                'company': row[0],
+                'hits': row[1],
+                'last_captured_at': datetime.fromtimestamp(row[2]).isoformat(),
+            } for row in company_rows],
+        }
@@ -1,30 +1,56 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_file, send_from_directory, redirect, Response, stream_with_context
 from flask_cors import CORS
-import undetected_chromedriver as uc
-from fake_useragent import UserAgent
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.keys import Keys
-import pandas as pd
 import os
 import time
 import random
 import json
+import re
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-# from ocr_analyzer import NegativeWordAnalyzer  # OCR機能は一時的に無効化
+import metrics
+from job_manager import JobManager
+from driver_pool import DriverPool
+from driver_bootstrap import patched_driver_path, random_user_agent
+from page_readiness import RELATED_PROBE_TIMEOUT, current_page, wait_for_new_page, wait_until_ready
+from rate_scheduler import RateBudgetScheduler, create_engine_buckets, load_engine_budgets
+from query_cache import QueryCache
+from screenshot_pipeline import SCREENSHOT_FORMATS, ScreenshotWriter, combine_stats
+from capture_regions import capture_region_png
+from capture_plan import CAPTURE_MAPS, CAPTURE_RELATED, CAPTURE_SUGGESTIONS, build_capture_plan
+from company_names import company_variations, parse_company_name
+from company_ingest import IngestError, UploadStore, ingest_companies
+from batch_manifest import BatchManifest
+from artifact_store import ArtifactUploader, create_artifact_store, is_valid_key, link_or_copy
+from batch_archive import iter_folder_files, iter_zip
+from batch_planner import HISTORY_ITEMS, estimate_batch, rolling_engine_stats
+from dom_extractors import extract_terms
+from memory_watchdog import MemoryWatchdog, empty_memory_stats, merge_memory_stats
+from network_filter import LOGGING_PREFS, NetworkFilter, empty_stats, merge_network_stats
+from work_queue import PRIORITY_WEIGHTS, QueueWorker, WorkQueue, make_worker_id
+from capture_history import STATUS_UNCHANGED, CaptureHistory, dhash_image
+from ocr_pipeline import NegativeWordMatcher, OcrStage, get_ocr_executor, load_negative_words, shutdown_ocr_executor
+from text_index import SOURCE_OCR, SOURCE_TEXT, TextIndex
 
 app = Flask(__name__)
 CORS(app)
 
+# バッチはバックグラウンドのジョブで実行（ジョブは作業をワークキューに登録して結果を集約するだけ）
+job_manager = JobManager(max_workers=int(os.environ.get('JOB_WORKERS', '4')))
+# SSE接続は一定時間で切り、クライアント側の自動再接続に任せる
+SSE_MAX_DURATION = int(os.environ.get('SSE_MAX_DURATION', '300'))
+
+# 撮影に不要なフォント・動画・広告等のブロック（NETWORK_BLOCKING=0 で無効、NETWORK_BLOCKLIST_PATH で追加）
+network_filter = NetworkFilter(enabled=os.environ.get('NETWORK_BLOCKING', '1') != '0')
+
+@metrics.timed('driver_startup')
 def setup_driver(headless=True):
     """最強のボット検出回避 - undetected-chromedriver使用"""
+    # 重いモジュールはドライバーが必要になるまで読み込まない（/health などの応答を遅らせない）
+    import undetected_chromedriver as uc
 
-    # ランダムなUser-Agent生成
-    ua = UserAgent()
-    user_agent = ua.random
+    # ランダムなUser-Agent（サンプルはディスクにキャッシュ済み）
+    user_agent = random_user_agent()
 
     print(f"🔐 User-Agent: {user_agent[:50]}...")
 
@@ -62,15 +88,27 @@ def setup_driver(headless=True):
     }
     options.add_experimental_option('prefs', prefs)
 
+    # ブロック件数・転送量の集計用（パフォーマンスログ）
+    if network_filter.enabled:
+        options.set_capability('goog:loggingPrefs', LOGGING_PREFS)
+
     # メモリ削減（オプション）
     options.add_argument('--disable-extensions')
     options.add_argument('--disable-plugins')
 
     try:
+        # Chromeのバージョンに合うパッチ済みchromedriverを使い回す（取得できなければ毎回自動取得）
+        try:
+            driver_path, version_main = patched_driver_path()
+        except Exception as e:
+            print(f"⚠️ chromedriverのキャッシュを使えません: {e}")
+            driver_path, version_main = None, None
+
         # undetected-chromedriverで起動（自動的にボット検出を回避）
         driver = uc.Chrome(
             options=options,
-            version_main=None,  # 自動検出
+            driver_executable_path=driver_path,
+            version_main=version_main,
             use_subprocess=True,
             headless=headless
         )
@@ -144,36 +182,190 @@ def setup_driver(headless=True):
         print("⚠️ 通常のChromeDriverで起動します...")
 
         # フォールバック: 通常のSelenium
+        from selenium import webdriver
         from selenium.webdriver.chrome.options import Options as StandardOptions
         fallback_options = StandardOptions()
         fallback_options.add_argument('--headless=new' if headless else '--start-maximized')
         fallback_options.add_argument('--no-sandbox')
         fallback_options.add_argument('--disable-dev-shm-usage')
         fallback_options.add_argument(f'--user-agent={user_agent}')
+        if network_filter.enabled:
+            fallback_options.set_capability('goog:loggingPrefs', LOGGING_PREFS)
 
         return webdriver.Chrome(options=fallback_options)
 
+# 起動済みChromeをバッチ間で使い回すプール（ヘッドレスのみ）
+driver_pool = DriverPool(
+    setup_driver,
+    size=int(os.environ.get('DRIVER_POOL_SIZE', os.environ.get('QUEUE_WORKERS', '1'))),
+    max_navigations=int(os.environ.get('DRIVER_MAX_NAVIGATIONS', '200')),
+    max_age=int(os.environ.get('DRIVER_MAX_AGE', '1800')),
+    reset_origins=[
+        'https://www.google.com',
+        'https://www.yahoo.co.jp',
+        'https://search.yahoo.co.jp',
+        'https://www.bing.com',
+    ],
+)
+atexit.register(driver_pool.shutdown)
+
+# Chromeのプロセスツリーのメモリ監視（上限を超えたセッションは作業の合間に作り直す。0 なら判定しない）
+memory_watchdog = MemoryWatchdog(
+    driver_pool,
+    max_rss_bytes=int(os.environ.get('DRIVER_MAX_RSS_MB', '1536')) * 1024 * 1024,
+    max_renderers=int(os.environ.get('DRIVER_MAX_RENDERERS', '0')),
+    interval=float(os.environ.get('MEMORY_WATCHDOG_INTERVAL', '5')),
+)
+atexit.register(memory_watchdog.stop)
+atexit.register(shutdown_ocr_executor)
+
+# スクリーンショットのパスを持つ結果キー
+SCREENSHOT_KEYS = (
+    'suggest', 'related_words', 'google_maps',
+    'reputation_suggest', 'reputation_related',
+    'review_suggest', 'review_related',
+)
+
+# バッチフォルダ内のファイルを指す結果キー（マニフェストでは相対パスで保存）
+ARTIFACT_KEYS = SCREENSHOT_KEYS + ('texts_path',)
+
+# 取得内容に影響するオプション（キャッシュキーに含める）と既定値
+CAPTURE_OPTION_DEFAULTS = {
+    'basic_suggest': True,
+    'related_words': True,
+    'google_maps': False,
+    'reputation_search': False,
+    'review_search': False,
+    'element_capture': True,
+    'extract_text': True,
+}
+
+# オプション -> そのオプションで撮影される結果キー（再開時の完了判定用）
+CAPTURE_GROUPS = {
+    'basic_suggest': ('suggest', 'related_words'),
+    'reputation_search': ('reputation_suggest', 'reputation_related'),
+    'review_search': ('review_suggest', 'review_related'),
+}
+
+# バッチフォルダの保存先
+BATCH_ROOT = os.environ.get('BATCH_ROOT', os.path.dirname(os.path.abspath(__file__)))
+BATCH_ID_PATTERN = re.compile(r'^ultimate_search_batch_[0-9_]+$')
+
+# 検索結果キャッシュ（QUERY_CACHE_TTL=0 で無効化）
+QUERY_CACHE_TTL = int(os.environ.get('QUERY_CACHE_TTL', '86400'))
+query_cache = QueryCache(
+    os.environ.get('QUERY_CACHE_PATH', os.path.join(BATCH_ROOT, 'query_cache.db')),
+    artifact_fields=ARTIFACT_KEYS,
+    ttl=QUERY_CACHE_TTL,
+    max_entries=int(os.environ.get('QUERY_CACHE_MAX_ENTRIES', '20000')),
+) if QUERY_CACHE_TTL > 0 else None
+
+# スクリーンショット保存設定（形式: png / webp / jpeg）
+SCREENSHOT_FORMAT = os.environ.get('SCREENSHOT_FORMAT', 'png')
+SCREENSHOT_QUALITY = int(os.environ.get('SCREENSHOT_QUALITY', '80'))
+SCREENSHOT_MAX_WIDTH = int(os.environ['SCREENSHOT_MAX_WIDTH']) if os.environ.get('SCREENSHOT_MAX_WIDTH') else None
+SCREENSHOT_WORKERS = int(os.environ.get('SCREENSHOT_WORKERS', '2'))
+
+# 成果物の保存先（ARTIFACT_STORE=local / s3）。内容のハッシュをキーにし、同じ画像は一度だけ保存する
+artifact_store = create_artifact_store(BATCH_ROOT)
+artifact_uploader = ArtifactUploader(
+    artifact_store,
+    workers=int(os.environ.get('ARTIFACT_UPLOAD_WORKERS', '4')),
+    max_pending=int(os.environ.get('ARTIFACT_UPLOAD_MAX_PENDING', '64')),
+)
+atexit.register(artifact_uploader.close)
+# /artifacts/ のレスポンスのキャッシュ期間（内容が変わらないため長め）
+ARTIFACT_MAX_AGE = int(os.environ.get('ARTIFACT_MAX_AGE', str(30 * 86400)))
+
+# 実行をまたいだ撮影履歴（前回の同じ撮影と知覚ハッシュで比較）
+capture_history = CaptureHistory(
+    os.environ.get('CAPTURE_HISTORY_PATH', os.path.join(BATCH_ROOT, 'capture_history.db')),
+    change_threshold=int(os.environ.get('HISTORY_CHANGE_THRESHOLD', '6')),
+)
+
+# 抽出テキスト・OCRテキストの全文検索インデックス（バッチ完了時に追加）
+text_index = TextIndex(os.environ.get('TEXT_INDEX_PATH', os.path.join(BATCH_ROOT, 'text_index.db')))
+
+# 取り込み済み企業リスト（ページ取得用に直近分のみ保持）
+upload_store = UploadStore(max_uploads=int(os.environ.get('UPLOAD_STORE_SIZE', '10')))
+UPLOAD_PAGE_SIZE = int(os.environ.get('UPLOAD_PAGE_SIZE', '5000'))
+
+# 共有ワークキュー（WALモードのSQLite。共有ボリューム上に置けば複数コンテナで1バッチを分担できる）
+WORK_QUEUE_PATH = os.environ.get('WORK_QUEUE_PATH', os.path.join(BATCH_ROOT, 'work_queue.db'))
+work_queue = WorkQueue(
+    WORK_QUEUE_PATH,
+    lease_seconds=int(os.environ.get('QUEUE_LEASE_SECONDS', '300')),
+    max_attempts=int(os.environ.get('QUEUE_MAX_ATTEMPTS', '3')),
+)
+# このプロセスで起動するキューワーカー数（1ワーカー = 1ブラウザ。0 なら登録・集約のみ）
+QUEUE_WORKERS = int(os.environ.get('QUEUE_WORKERS', '1'))
+QUEUE_POLL_INTERVAL = float(os.environ.get('QUEUE_POLL_INTERVAL', '1'))
+# キュー全体で作業が進まない（生きているワーカーがいない）まま経過したら、バッチの残りを失敗扱いにする秒数
+QUEUE_STALL_SECONDS = float(os.environ.get('QUEUE_STALL_SECONDS', '600'))
+# バッチの結果を待つ上限（秒。0 なら無制限）
+QUEUE_RESULT_TIMEOUT = float(os.environ.get('QUEUE_RESULT_TIMEOUT', '0'))
+# 完了したバッチの作業項目を保持する秒数
+QUEUE_RETENTION = int(os.environ.get('QUEUE_RETENTION', str(7 * 86400)))
+
+# 優先度の指定がないジョブのうち、この社数以下のものは urgent として扱う（大きなバッチの後ろで待たせない）
+URGENT_MAX_COMPANIES = int(os.environ.get('URGENT_MAX_COMPANIES', '1'))
+
+# 1バッチの予測所要時間の上限（秒。超える場合は投入せずに見積もりを返す。0 なら無制限）
+MAX_BATCH_SECONDS = int(os.environ.get('MAX_BATCH_SECONDS', '0'))
+
+# エンジン別リクエスト予算（キューと同じSQLiteに保存し、全プロセスで共有。ENGINE_RATE_BUDGETS で上書き可）
+engine_buckets = create_engine_buckets(path=WORK_QUEUE_PATH)
+
+# 検索エンジンのトップページ（ベンチマークではローカルの代替サーバーに差し替える）
+ENGINE_URLS = {
+    'google': 'https://www.google.com/webhp?hl=ja',
+    'yahoo': 'https://www.yahoo.co.jp/',
+    'bing': 'https://www.bing.com/?cc=jp',
+}
+
+def open_page(driver, url):
+    """ページ遷移（プールの遷移回数にも記録）"""
+    with metrics.span('navigate'):
+        driver.get(url)
+    driver_pool.record_navigation(driver)
+
 def prepare_company_variations(company_name, selected_patterns=None):
-    """株式会社パターン準備（選択されたもののみ）"""
-    all_variations = []
-    
-    if '株式会社' in company_name:
-        all_variations.append({'name': company_name, 'type': 'with_corp'})
-        all_variations.append({'name': company_name.replace('株式会社', '').strip(), 'type': 'without_corp'})
-    else:
-        all_variations.append({'name': company_name, 'type': 'original'})
-        all_variations.append({'name': f'株式会社{company_name}', 'type': 'prefix_corp'})
-        if not company_name.endswith('株式会社'):
-            all_variations.append({'name': f'{company_name}株式会社', 'type': 'suffix_corp'})
-    
+    """株式会社パターン準備（選択されたもののみ）
+
+    (株)・㈱・有限会社などの法人格や全角半角・空白の揺れは正規化してから展開するため、
+    書き方が違う同じ会社は同じ検索語になる。
+    """
+    all_variations = company_variations(company_name)
+
     # 選択されたパターンのみを返す
     if selected_patterns:
         return [v for v in all_variations if v['type'] in selected_patterns]
     
     return all_variations
 
+def company_search_variations(company_name, selected_patterns):
+    """会社ごとに選択されたパターン（選択がなければデフォルトパターン）"""
+    company_patterns = selected_patterns.get(company_name, [])
+    if not company_patterns:
+        # デフォルトパターン
+        return prepare_company_variations(company_name)
+    return prepare_company_variations(company_name, company_patterns)
+
+def batch_engines(search_options):
+    """有効な検索エンジン"""
+    engines = []
+    if search_options.get('enable_google', True):
+        engines.append('google')
+    if search_options.get('enable_yahoo', True):
+        engines.append('yahoo')
+    if search_options.get('enable_bing', True):
+        engines.append('bing')
+    return engines
+
 def get_search_box(driver, engine_name):
     """検索ボックス取得"""
+    from selenium.webdriver.common.by import By
+
     if engine_name == 'google':
         try:
             return driver.find_element(By.NAME, "q")
@@ -190,6 +382,40 @@ def get_search_box(driver, engine_name):
         except:
             return driver.find_element(By.NAME, "q")
 
+def clear_search_box(element):
+    """検索ボックスを空にする（結果ページでは clear() だけでは前の検索語が残ることがある）"""
+    from selenium.webdriver.common.keys import Keys
+
+    element.clear()
+    if element.get_attribute('value'):
+        element.send_keys(Keys.CONTROL, 'a')
+        element.send_keys(Keys.DELETE)
+
+def focus_search_box(driver, engine_name, url, reuse, fallback_delay):
+    """空の検索ボックスにフォーカスして返す（reuse なら表示中の検索結果ページのものを使う）"""
+    if reuse:
+        try:
+            search_box = get_search_box(driver, engine_name)
+            human_like_mouse_move(driver, search_box)
+            search_box.click()
+            clear_search_box(search_box)
+            return search_box
+        except Exception as e:
+            print(f"  ⚠️ {engine_name} 結果ページの検索ボックスを使えないためトップページを開き直します: {e}")
+
+    open_page(driver, url)
+    wait_until_ready(driver, engine_name, 'search_box', fallback_delay=fallback_delay)
+
+    search_box = get_search_box(driver, engine_name)
+
+    # 人間らしいマウス移動
+    human_like_mouse_move(driver, search_box)
+
+    search_box.click()
+    search_box.clear()
+    return search_box
+
+@metrics.timed('typing')
 def human_like_typing(element, text):
     """人間らしいタイピング動作"""
     for char in text:
@@ -201,6 +427,7 @@ def human_like_typing(element, text):
             delay = random.uniform(0.3, 0.7)
         time.sleep(delay)
 
+@metrics.timed('pacing')
 def human_like_mouse_move(driver, element):
     """人間らしいマウス移動（スクロールとホバー）"""
     try:
@@ -216,6 +443,7 @@ def human_like_mouse_move(driver, element):
     except:
         pass
 
+@metrics.timed('pacing')
 def random_page_interaction(driver):
     """ランダムなページ操作（人間らしさ向上）"""
     actions = [
@@ -230,6 +458,8 @@ def random_page_interaction(driver):
 
 def detect_google_maps(driver):
     """Googleマップ表示を検出"""
+    from selenium.webdriver.common.by import By
+
     try:
         # 右側のマップパネルを検索
         map_selectors = [
@@ -250,8 +480,53 @@ def detect_google_maps(driver):
         print(f"マップ検出エラー: {e}")
         return False
 
-def process_search_with_options(driver, engine_name, variation, base_path, options):
-    """オプション付き検索処理"""
+def store_png(png_bytes, path, writer=None):
+    """PNGバイト列を保存（writer があれば変換・保存は別スレッド）"""
+    if writer is None:
+        with open(path, 'wb') as f:
+            f.write(png_bytes)
+        return path
+    return writer.submit(png_bytes, path)
+
+@metrics.timed('screenshot_capture')
+def capture_screenshot(driver, path, writer=None):
+    """全画面スクリーンショット取得"""
+    return store_png(driver.get_screenshot_as_png(), path, writer)
+
+@metrics.timed('screenshot_capture', kind='suggestions')
+def capture_suggestions(driver, engine_name, path, writer=None, element_capture=True):
+    """サジェスト撮影（検索ボックス＋候補リストのみ、見つからなければ全画面）"""
+    if element_capture:
+        png_bytes = capture_region_png(driver, engine_name, 'suggestions')
+        if png_bytes is not None:
+            return store_png(png_bytes, path, writer)
+        print(f"  ⚠️ {engine_name} サジェスト領域が見つからないため全画面で撮影")
+    return capture_screenshot(driver, path, writer)
+
+@metrics.timed('screenshot_capture', kind='related')
+def capture_related(driver, engine_name, path, writer=None, element_capture=True):
+    """関連ワード撮影（関連検索ブロックのみ、見つからなければ最下部までスクロールして全画面）"""
+    if element_capture:
+        if wait_until_ready(driver, engine_name, 'related', fallback_delay=0, timeout=RELATED_PROBE_TIMEOUT):
+            png_bytes = capture_region_png(driver, engine_name, 'related')
+            if png_bytes is not None:
+                return store_png(png_bytes, path, writer)
+        print(f"  ⚠️ {engine_name} 関連ワード領域が見つからないため全画面で撮影")
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        wait_until_ready(driver, engine_name, 'related', fallback_delay=2, timeout=2)
+    else:
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        wait_until_ready(driver, engine_name, 'related', fallback_delay=2)
+    return capture_screenshot(driver, path, writer)
+
+def process_search_with_options(driver, engine_name, variation, base_path, options, writer=None, on_capture=None,
+                                before_search=None):
+    """オプション付き検索処理（on_capture(結果キー, パス) は撮影ごとに呼ばれる）
+
+    before_search() は2回目以降の検索（評判・口コミ）の前に呼ばれる。検索1回ごとに予算を消費するため。
+    """
+    from selenium.webdriver.common.keys import Keys
+
     results = {
         'variation': variation['name'],
         'type': variation['type'],
@@ -263,134 +538,317 @@ def process_search_with_options(driver, engine_name, variation, base_path, optio
         'review_suggest': None,
         'review_related': None
     }
+
+    # DOMから抽出したサジェスト・関連ワード（結果キー -> 文字列リスト）
+    texts = {}
+    extract_text = options.get('extract_text', True)
+
+    def captured(kind, path, region=None):
+        results[kind] = path
+        if on_capture is not None:
+            on_capture(kind, path)
+        if region is not None and extract_text:
+            with metrics.span('text_extraction', kind=region):
+                texts[kind] = extract_terms(driver, engine_name, region)
     
     try:
         # 基本URL設定
-        if engine_name == 'google':
-            url = 'https://www.google.com/webhp?hl=ja'
-        elif engine_name == 'yahoo':
-            url = 'https://www.yahoo.co.jp/'
-        elif engine_name == 'bing':
-            url = 'https://www.bing.com/?cc=jp'
+        url = ENGINE_URLS[engine_name]
+
+        # このエンジンのブロックリストを適用（画像・サジェストの通信は残す）
+        network_filter.apply(driver, engine_name)
             
         # Bingの場合は追加の待機時間
         extra_delay = 2 if engine_name == 'bing' else 0
-        
-        # 1. 基本サジェスト取得
-        if options.get('basic_suggest', True):
-            driver.get(url)
-            time.sleep(2 + extra_delay)
-            
-            search_box = get_search_box(driver, engine_name)
 
-            # 人間らしいマウス移動
-            human_like_mouse_move(driver, search_box)
+        # サジェスト・関連ワードは該当要素だけを撮影する
+        element_capture = options.get('element_capture', True)
 
-            search_box.click()
-            search_box.clear()
+        # 基本・評判・口コミの検索を計画に展開（2つ目以降は結果ページから再検索）
+        for index, step in enumerate(build_capture_plan(engine_name, variation, options)):
+            if index and before_search is not None:
+                before_search()
+            search_box = focus_search_box(driver, engine_name, url, not step['navigate'], 2 + extra_delay)
 
             # 人間らしいタイピング
-            human_like_typing(search_box, variation['name'])
+            human_like_typing(search_box, step['query'])
 
             # ランダムなページ操作
             random_page_interaction(driver)
 
-            time.sleep(random.uniform(2, 4))
-            
-            suggest_path = os.path.join(base_path, f'{engine_name}_suggest_{variation["type"]}.png')
-            driver.save_screenshot(suggest_path)
-            results['suggest'] = suggest_path
-            
-            # 検索実行
-            search_box.send_keys(Keys.RETURN)
-            time.sleep(random.uniform(4, 6))
-            
-            # Googleマップ検出
-            if engine_name == 'google' and options.get('google_maps', False):
-                if detect_google_maps(driver):
-                    maps_path = os.path.join(base_path, f'{engine_name}_maps_{variation["type"]}.png')
-                    driver.save_screenshot(maps_path)
-                    results['google_maps'] = maps_path
-                    print(f"Googleマップスクリーンショット保存: {maps_path}")
-            
-            # 関連ワード取得
-            if options.get('related_words', True):
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(2)
-                
-                related_path = os.path.join(base_path, f'{engine_name}_related_{variation["type"]}.png')
-                driver.save_screenshot(related_path)
-                results['related_words'] = related_path
-        
-        # 2. 評判検索
-        if options.get('reputation_search', False):
-            driver.get(url)
-            time.sleep(2 + extra_delay)
-            
-            search_box = get_search_box(driver, engine_name)
-            human_like_mouse_move(driver, search_box)
-            search_box.click()
-            search_box.clear()
+            wait_until_ready(driver, engine_name, 'suggestions', fallback_delay=step['suggest_delay'])
 
-            reputation_query = f'{variation["name"]} 評判'
-            human_like_typing(search_box, reputation_query)
-            random_page_interaction(driver)
-            
-            time.sleep(2)
-            
-            rep_suggest_path = os.path.join(base_path, f'{engine_name}_reputation_suggest_{variation["type"]}.png')
-            driver.save_screenshot(rep_suggest_path)
-            results['reputation_suggest'] = rep_suggest_path
-            
-            search_box.send_keys(Keys.RETURN)
-            time.sleep(3)
-            
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
-            
-            rep_related_path = os.path.join(base_path, f'{engine_name}_reputation_related_{variation["type"]}.png')
-            driver.save_screenshot(rep_related_path)
-            results['reputation_related'] = rep_related_path
-        
-        # 3. 口コミ検索
-        if options.get('review_search', False):
-            driver.get(url)
-            time.sleep(2 + extra_delay)
-            
-            search_box = get_search_box(driver, engine_name)
-            human_like_mouse_move(driver, search_box)
-            search_box.click()
-            search_box.clear()
+            for capture in step['captures']:
+                if capture['capture'] == CAPTURE_SUGGESTIONS:
+                    path = os.path.join(base_path, capture['filename'])
+                    captured(capture['key'], capture_suggestions(driver, engine_name, path, writer, element_capture), 'suggestions')
 
-            review_query = f'{variation["name"]} 口コミ'
-            human_like_typing(search_box, review_query)
-            random_page_interaction(driver)
-            
-            time.sleep(2)
-            
-            review_suggest_path = os.path.join(base_path, f'{engine_name}_review_suggest_{variation["type"]}.png')
-            driver.save_screenshot(review_suggest_path)
-            results['review_suggest'] = review_suggest_path
-            
+            # 検索実行（前のページが破棄されてから結果の描画を待つ）
+            previous_page = current_page(driver)
             search_box.send_keys(Keys.RETURN)
-            time.sleep(3)
-            
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
-            
-            review_related_path = os.path.join(base_path, f'{engine_name}_review_related_{variation["type"]}.png')
-            driver.save_screenshot(review_related_path)
-            results['review_related'] = review_related_path
-        
+            wait_for_new_page(driver, engine_name, previous_page)
+            wait_until_ready(driver, engine_name, 'results', fallback_delay=step['results_delay'])
+
+            for capture in step['captures']:
+                path = os.path.join(base_path, capture['filename'])
+                # Googleマップ検出
+                if capture['capture'] == CAPTURE_MAPS and detect_google_maps(driver):
+                    captured(capture['key'], capture_screenshot(driver, path, writer))
+                    print(f"Googleマップスクリーンショット保存: {path}")
+                # 関連ワード取得
+                elif capture['capture'] == CAPTURE_RELATED:
+                    captured(capture['key'], capture_related(driver, engine_name, path, writer, element_capture), 'related')
+
     except Exception as e:
         print(f"{engine_name} 処理エラー ({variation['name']}): {e}")
         results['error'] = str(e)
+
+    # 抽出テキストはスクリーンショットの横にJSONで保存
+    if texts:
+        texts_path = os.path.join(base_path, f'{engine_name}_texts_{variation["type"]}.json')
+        with open(texts_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'engine': engine_name,
+                'variation': variation['name'],
+                'type': variation['type'],
+                'captured_at': datetime.now().isoformat(),
+                'texts': texts,
+            }, f, ensure_ascii=False, indent=2)
+        results['texts'] = texts
+        results['texts_path'] = texts_path
     
     return results
 
+# キューワーカーが予算を確認・消費するためのスケジューラ（バケットは全プロセスで共有）
+queue_scheduler = RateBudgetScheduler(engine_buckets)
+
+def make_queue_executor(worker_id):
+    """キューワーカー1つ分の処理（ドライバーとスクリーンショット書き込みはワーカー専有）
+
+    撮影が終わった時点で次の作業項目へ進み、書き込み完了待ち・保存先キー・履歴比較・キャッシュ登録は
+    ワーカー専用の後処理スレッドで行う（画像の書き込みを待つ間もブラウザを止めない）。
+    """
+    state = {
+        'driver': None, 'headless': None, 'company': None,
+        'writer': None, 'writer_settings': None, 'budget_wait': 0.0, 'recycles': [],
+        # エンジン -> 作業があるのに予算切れで取り出せなくなった時刻（取り出した項目の予算待ちに使う）
+        'budget_blocked': {},
+    }
+    finisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'finish-{worker_id}')
+
+    def release_driver(discard=False):
+        if state['driver'] is not None:
+            driver_pool.release(state['driver'], discard=discard)
+            state['driver'] = None
+        state['company'] = None
+
+    def select_engines():
+        """予算に余裕のあるエンジンの作業だけを取り出す
+
+        ポーリングの待機は作業項目の予算待ちには含めない（queue_poll_wait として別に記録）。
+        予算待ちは、取り出した項目のエンジンが予算切れで止まっていた時間だけを数える。
+        """
+        pending = work_queue.pending_engines()
+        ready, soonest = queue_scheduler.ready_engines(pending)
+        now = time.monotonic()
+        for engine in pending:
+            if engine not in ready:
+                state['budget_blocked'].setdefault(engine, now)
+        if not ready and soonest is not None:
+            wait = min(soonest, QUEUE_POLL_INTERVAL * 5)
+            metrics.histograms.observe('queue_poll_wait', None, None, wait)
+            return ready, wait
+        return ready, QUEUE_POLL_INTERVAL
+
+    def get_writer(settings):
+        key = (settings['format'], settings['quality'], settings['max_width'])
+        if state['writer_settings'] != key:
+            if state['writer'] is not None:
+                state['writer'].close()
+            state['writer'] = ScreenshotWriter(
+                image_format=settings['format'],
+                quality=settings['quality'],
+                max_width=settings['max_width'],
+                workers=SCREENSHOT_WORKERS,
+                hasher=dhash_image,
+                uploader=artifact_uploader,
+            )
+            state['writer_settings'] = key
+        return state['writer']
+
+    def on_idle():
+        """キューが空いたらドライバーを返し、書き込みの残りを出し切る"""
+        release_driver()
+        if state['writer'] is not None:
+            state['writer'].flush()
+
+    def execute(claimed):
+        payload = claimed['payload']
+        engine = payload['engine']
+        variation = payload['variation']
+        company_name = payload['company']
+        headless = payload['headless']
+
+        # このエンジンの予算回復を待っていた時間（別のエンジンの作業をしていた間は数えない）
+        blocked_since = state['budget_blocked'].get(engine)
+        state['budget_blocked'] = {}
+        if blocked_since is not None:
+            wait = time.monotonic() - blocked_since
+            state['budget_wait'] += wait
+            metrics.histograms.observe('budget_wait', engine, None, wait)
+
+        # メモリ上限を超えたセッションは作業の合間で作り直す（バッチは止めない）
+        if state['driver'] is not None and driver_pool.pending_recycle(state['driver']):
+            sample = driver_pool.memory_sample(state['driver']) or {}
+            state['recycles'].append({
+                'worker': worker_id,
+                'time': datetime.now().isoformat(),
+                'reason': sample.get('recycle_reason'),
+                'rss_bytes': sample.get('rss_bytes'),
+                'renderers': sample.get('renderers'),
+            })
+            release_driver()
+
+        # 会社が変わったらCookie等をリセット（上限到達のドライバーはリサイクル）
+        if state['driver'] is not None and state['headless'] != headless:
+            release_driver()
+        if state['company'] != company_name:
+            print(f"\n=== 処理中: {company_name} ===")
+            if state['driver'] is not None:
+                if headless:
+                    release_driver()
+                else:
+                    driver_pool.reset_session(state['driver'])
+            state['company'] = company_name
+        if state['driver'] is None:
+            state['driver'] = driver_pool.acquire(headless=headless)
+            state['headless'] = headless
+
+        print(f"  {engine.upper()} 処理中... ({variation['name']}) [{worker_id}]")
+        os.makedirs(payload['folder'], exist_ok=True)
+        writer = get_writer(payload['screenshot'])
+        manifest = BatchManifest(payload['batch_folder'])
+
+        def on_capture(kind, path):
+            for target in payload['targets']:
+                manifest.record_capture(target['company'], engine, target['type'], kind, path)
+
+        # 1項目で複数回検索する場合、2回目以降も1回ごとに予算を消費する（最初の1回は取り出し時に消費済み）
+        search_wait = {'seconds': 0.0}
+
+        def before_search():
+            with metrics.span('budget_wait'):
+                wait = queue_scheduler.wait_acquire(engine, max_wait=QUEUE_POLL_INTERVAL * 5)
+            search_wait['seconds'] += wait
+            state['budget_wait'] += wait
+
+        started = time.monotonic()
+        try:
+            with metrics.collect() as timings, metrics.labels(engine=engine), metrics.span('search'):
+                result = process_search_with_options(
+                    state['driver'], engine, variation, payload['folder'],
+                    payload['options'], writer, on_capture=on_capture, before_search=before_search
+                )
+        except Exception:
+            release_driver(discard=True)
+            # 失敗した項目の書き込みは待たない（書き込み済みの分はマニフェストに残る）
+            writer.take_futures()
+            raise
+        writes = writer.take_futures()
+        network = network_filter.collect(state['driver'])
+        memory = driver_pool.memory_sample(state['driver']) or {}
+        # 前回までに撮影済みの分を結果に戻す
+        for kind, path in payload['prior'].items():
+            if not result.get(kind):
+                result[kind] = path
+
+        meta = {
+            'worker': worker_id,
+            'budget_wait_seconds': state['budget_wait'],
+            'timings': timings,
+            'network': network,
+            'memory': {
+                'rss_bytes': memory.get('rss_bytes', 0),
+                'peak_rss_bytes': memory.get('peak_rss_bytes', 0),
+                'renderers': memory.get('renderers', 0),
+                'recycles': state['recycles'],
+            },
+        }
+        state['budget_wait'] = 0.0
+        state['recycles'] = []
+        return finisher.submit(finish, payload, result, meta, writer, writes, started + search_wait['seconds'])
+
+    def finish(payload, result, meta, writer, writes, started):
+        """撮影後の処理（後処理スレッド）: 書き込み・アップロードを待ってからキー・履歴・キャッシュを記録"""
+        engine = payload['engine']
+        variation = payload['variation']
+        for future in writes:
+            try:
+                future.result()
+            except Exception:
+                pass  # 保存エラーは書き込みスレッドで記録済み
+        paths = [result[kind] for kind in SCREENSHOT_KEYS if result.get(kind)]
+
+        # 保存先のキー（抽出テキストのJSONもアップロード）
+        artifact_keys = writer.pop_artifact_keys(paths)
+        if result.get('texts_path'):
+            texts_key = artifact_uploader.submit_file(result['texts_path']).result()
+            if texts_key:
+                artifact_keys[result['texts_path']] = texts_key
+        artifacts = {kind: artifact_keys[result[kind]] for kind in ARTIFACT_KEYS if result.get(kind) in artifact_keys}
+        if artifacts:
+            result['artifacts'] = artifacts
+
+        # 前回の実行の同じ撮影と比較（対象ごとに履歴が異なるため対象別に記録）
+        fingerprints = writer.pop_fingerprints(paths)
+        batch_id = os.path.basename(payload['batch_folder'])
+        target_changes = {}
+        for kind in SCREENSHOT_KEYS:
+            path = result.get(kind)
+            if path not in fingerprints:
+                continue
+            for target in payload['targets']:
+                change = capture_history.record(
+                    target['company'], engine, target['type'], kind, batch_id,
+                    os.path.relpath(path, payload['batch_folder']), fingerprints[path]
+                )
+                target_changes.setdefault(f"{target['company']}\t{target['type']}", {})[kind] = change
+        if target_changes:
+            result['target_changes'] = target_changes
+        # 保存先のキーを付けてからキャッシュに登録（再利用時もキーで配信できるように）
+        if payload['use_cache'] and query_cache is not None and 'error' not in result:
+            query_cache.put(engine, variation['name'], payload['capture_options'], result)
+
+        meta['work_seconds'] = time.monotonic() - started
+        meta['screenshots'] = writer.stats(reset=True)
+        return result, meta
+
+    return execute, select_engines, on_idle
+
+queue_workers = []
+
+def start_queue_workers(count):
+    """このプロセスのキューワーカーを起動"""
+    for index in range(count):
+        worker_id = make_worker_id(index)
+        execute, select_engines, on_idle = make_queue_executor(worker_id)
+        worker = QueueWorker(
+            work_queue, worker_id, execute,
+            select_engines=select_engines,
+            acquire=queue_scheduler.acquire,
+            on_idle=on_idle,
+            poll_interval=QUEUE_POLL_INTERVAL,
+        )
+        worker.start()
+        queue_workers.append(worker)
+    if count:
+        print(f"👷 キューワーカー {count}件を起動しました")
+        if memory_watchdog.enabled and not memory_watchdog.is_alive():
+            memory_watchdog.start()
+
 @app.route('/upload_excel', methods=['POST'])
 def upload_excel():
-    """Excelファイルアップロード処理"""
+    """企業リストアップロード処理（Excel / CSV / TSV をストリームのまま読み込み）"""
     try:
         if 'file' not in request.files:
             return jsonify({'success': False, 'error': 'ファイルが選択されていません'})
@@ -399,35 +857,43 @@ def upload_excel():
         if file.filename == '':
             return jsonify({'success': False, 'error': 'ファイルが選択されていません'})
         
-        # ファイル保存
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"uploaded_companies_{timestamp}.xlsx"
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        file.save(filepath)
-        
-        # Excel読み込み
-        df = pd.read_excel(filepath)
-        
-        # 最初の列を会社名として使用
-        company_column = df.columns[0]
-        companies = df[company_column].dropna().astype(str).tolist()
+        # シート・列の指定（省略時は最初のシートの最初の列）
+        ingested = ingest_companies(
+            file.stream,
+            file.filename,
+            sheet=request.form.get('sheet') or None,
+            column=request.form.get('column') or None,
+            has_header=request.form.get('has_header', '1') != '0',
+        )
         
-        # 重複削除
-        companies = list(dict.fromkeys(companies))
+        # 大きなリストは先頭ページのみ返し、残りは /uploads/<id>/companies で取得
+        companies = ingested.pop('companies')
+        upload_id = upload_store.add(companies)
+        limit = request.form.get('limit', type=int) or UPLOAD_PAGE_SIZE
+        page = upload_store.page(upload_id, offset=request.form.get('offset', 0, type=int), limit=limit)
         
-        return jsonify({
-            'success': True,
-            'companies': companies,
-            'count': len(companies),
-            'column_name': company_column
-        })
+        return jsonify(dict(ingested, success=True, upload_id=upload_id, **page))
         
+    except IngestError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({
             'success': False,
-            'error': f'Excelファイル読み込みエラー: {str(e)}'
+            'error': f'ファイル読み込みエラー: {str(e)}'
         })
 
+@app.route('/uploads/<upload_id>/companies', methods=['GET'])
+def get_uploaded_companies(upload_id):
+    """取り込み済み企業リストのページ取得"""
+    page = upload_store.page(
+        upload_id,
+        offset=request.args.get('offset', 0, type=int),
+        limit=request.args.get('limit', UPLOAD_PAGE_SIZE, type=int),
+    )
+    if page is None:
+        return jsonify({'success': False, 'error': 'アップロードが見つかりません（期限切れの可能性があります）'}), 404
+    return jsonify(dict(page, success=True, upload_id=upload_id))
+
 @app.route('/get_company_patterns', methods=['POST'])
 def get_company_patterns():
     """会社名パターン生成"""
@@ -439,10 +905,13 @@ def get_company_patterns():
             return jsonify({'success': False, 'error': '会社名が入力されていません'})
         
         patterns = prepare_company_variations(company_name)
+        parsed = parse_company_name(company_name)
         
         return jsonify({
             'success': True,
             'company_name': company_name,
+            'normalized_name': parsed['name'],
+            'legal_entity': parsed['legal_entity'],
             'patterns': patterns
         })
         
@@ -452,166 +921,862 @@ def get_company_patterns():
             'error': str(e)
         })
 
+def remaining_capture_options(options, captured):
+    """撮影済みのグループを無効化したオプション（再開時に未撮影分だけ実行する）"""
+    remaining = dict(options)
+    for option_key, kinds in CAPTURE_GROUPS.items():
+        if option_key == 'basic_suggest' and not options.get('related_words', True):
+            kinds = ('suggest',)
+        if all(captured.get(kind) for kind in kinds):
+            remaining[option_key] = False
+    return remaining
+
+def import_cached_artifacts(result, item, options):
+    """キャッシュの結果が指す成果物（前回のバッチのファイル）を今回のバッチフォルダに取り込む
+
+    ハードリンク（できなければコピー）で置き、結果のパスを取り込んだファイルに置き換える。
+    マニフェスト・ZIP・結果のURLがバッチフォルダの外を指さないようにするため。
+    ファイル名は今回の撮影で付ける名前（{エンジン}_{撮影種別}_{パターン種別}）にし、既存のファイルは置き換える。
+    """
+    engine = item['engine']
+    variation_type = item['variation']['type']
+    filenames = {
+        capture['key']: os.path.splitext(capture['filename'])[0]
+        for step in build_capture_plan(engine, item['variation'], options) for capture in step['captures']
+    }
+    filenames['texts_path'] = f'{engine}_texts_{variation_type}'
+
+    imported = dict(result)
+    os.makedirs(item['folder'], exist_ok=True)
+    for field in ARTIFACT_KEYS:
+        path = result.get(field)
+        if not path:
+            continue
+        stem = filenames.get(field, f'{engine}_{field}_{variation_type}')
+        target = os.path.join(item['folder'], stem + os.path.splitext(path)[1])
+        if not (os.path.exists(target) and os.path.samefile(path, target)):
+            link_or_copy(path, target)
+        imported[field] = target
+    return imported
+
+def failed_result(item, error):
+    return {
+        'variation': item['variation']['name'],
+        'type': item['variation']['type'],
+        'error': error,
+    }
+
+def queue_stall_reason(deadline):
+    """結果待ちを打ち切る理由（待ち続けてよければ None）"""
+    if deadline is not None and time.monotonic() > deadline:
+        return f'結果待ちの上限（{QUEUE_RESULT_TIMEOUT:.0f}秒）を超えました'
+    if QUEUE_STALL_SECONDS:
+        last_activity = work_queue.last_activity()
+        if last_activity is not None and time.time() - last_activity > QUEUE_STALL_SECONDS:
+            return f'{QUEUE_STALL_SECONDS:.0f}秒間ワーカーが作業を進めていません'
+    return None
+
+def manifest_text_documents(manifest):
+    """マニフェストの結果から抽出テキストの文書（TextIndex.add_documents 用）"""
+    batch_id = os.path.basename(manifest.folder_path)
+    for record in manifest.iter_items():
+        result = record['result']
+        artifacts = result.get('artifacts') or {}
+        captured_at = datetime.fromisoformat(result.get('cached_at') or record['time']).timestamp()
+        for kind, terms in (result.get('texts') or {}).items():
+            yield {
+                'batch_id': batch_id,
+                'company': record['company'],
+                'engine': record['engine'],
+                'variation_type': record['variation_type'],
+                'kind': kind,
+                'source': SOURCE_TEXT,
+                'captured_at': captured_at,
+                'path': result.get(kind),
+                'artifact_key': artifacts.get(kind),
+                'content': '\n'.join(terms),
+            }
+
+def run_ultimate_search(job):
+    """バッチ本体（ジョブワーカー上で実行）"""
+    data = job.payload
+    companies = list(dict.fromkeys(data.get('companies', [])))
+    selected_patterns = data.get('selected_patterns', {})
+    search_options = data.get('options', {})
+
+    # 保存先フォルダ作成（再開時は既存フォルダとマニフェストを使用）
+    resume_batch_id = data.get('resume_batch_id')
+    if resume_batch_id:
+        folder_name = resume_batch_id
+        folder_path = os.path.join(BATCH_ROOT, folder_name)
+        manifest = BatchManifest(folder_path)
+        checkpoint = manifest.load_state(artifact_fields=ARTIFACT_KEYS)
+        manifest.record_resume(job.id)
+        print(f"🔄 バッチ再開: {folder_name}（完了済み {len(checkpoint['items'])}件）")
+    else:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        folder_name = f"ultimate_search_batch_{timestamp}"
+        # 同じ秒に投入された別ユーザーのジョブとフォルダを共有しないよう連番を付ける
+        suffix = 1
+        while True:
+            folder_path = os.path.join(BATCH_ROOT, folder_name)
+            try:
+                os.makedirs(folder_path)
+                break
+            except FileExistsError:
+                suffix += 1
+                folder_name = f"ultimate_search_batch_{timestamp}_{suffix}"
+        manifest = BatchManifest(folder_path)
+        manifest.write_header(companies, selected_patterns, search_options)
+        checkpoint = {'items': {}, 'captures': {}}
+    job.batch_id = folder_name
+    job.emit('batch_created', folder=folder_name, batch_id=folder_name)
+
+    # 各検索エンジンで処理
+    engines = batch_engines(search_options)
+
+    remaining_per_company = {}
+    state = {'completed_steps': 0, 'processed_companies': 0, 'cache_hits': 0, 'resumed_steps': 0,
+             'total_screenshots': 0, 'failed_steps': 0, 'changes': {}}
+
+    def deliver_target(engine, target, result):
+        """1対象（会社×エンジン×パターン）に結果を反映"""
+        company_name = target['company']
+        target_result = dict(result, variation=target['variation']['name'], type=target['variation']['type'])
+        target_changes = target_result.pop('target_changes', None)
+        if target_changes:
+            changes = target_changes.get(f"{company_name}\t{target['variation']['type']}")
+            if changes:
+                target_result['changes'] = changes
+        # 結果本体はマニフェストにだけ記録し、ジョブにはカウントと識別子だけを残す
+        # （撮影結果は /batches/<id>/results からページ単位で取得する）
+        for key, value in target_result.items():
+            if key.endswith(('suggest', 'related', 'maps')) and value:
+                state['total_screenshots'] += 1
+        for change in (target_result.get('changes') or {}).values():
+            state['changes'][change['status']] = state['changes'].get(change['status'], 0) + 1
+        if 'error' in target_result:
+            state['failed_steps'] += 1
+        job.emit('variation_done', company=company_name, engine=engine,
+                 variation_type=target['variation']['type'], failed='error' in target_result)
+
+        state['completed_steps'] += 1
+        job.update_progress(completed_steps=state['completed_steps'])
+
+        remaining_per_company[company_name] -= 1
+        if remaining_per_company[company_name] == 0:
+            state['processed_companies'] += 1
+            job.emit('company_done', company=company_name)
+            job.update_progress(processed_companies=state['processed_companies'])
+        return target_result
+
+    # OCR・ネガティブワード分析（結果が届くたびにプロセスプールへ投入）
+    # OCRテキストは画像のパス -> 対象の対応から全文検索インデックス用の文書にする
+    ocr_stage = None
+    ocr_sources = {}
+    ocr_documents = []
+
+    def on_ocr_text(path, text):
+        for source in ocr_sources.get(path, []):
+            ocr_documents.append(dict(source, captured_at=time.time(), content=text))
+
+    if search_options.get('enable_ocr', False):
+        def on_ocr_update(company_name, ocr_result):
+            job.set_ocr_result(company_name, ocr_result)
+            job.emit('ocr_update', company=company_name, risk_assessment=ocr_result['risk_assessment'])
+
+        ocr_stage = OcrStage(
+            NegativeWordMatcher(load_negative_words(search_options.get('negative_words'))),
+            executor=get_ocr_executor(),
+            on_update=on_ocr_update,
+            on_text=on_ocr_text,
+        )
+        if not ocr_stage.ocr_available:
+            print("⚠️ OCRエンジンが見つからないため、抽出テキストのみ分析します")
+
+    def analyze(engine, targets, result):
+        if ocr_stage is None:
+            return
+        companies = [target['company'] for target in targets]
+        artifacts = result.get('artifacts') or {}
+        for kind in SCREENSHOT_KEYS:
+            path = result.get(kind)
+            if path:
+                ocr_sources.setdefault(path, []).extend({
+                    'batch_id': folder_name,
+                    'company': target['company'],
+                    'engine': engine,
+                    'variation_type': target['variation']['type'],
+                    'kind': kind,
+                    'source': SOURCE_OCR,
+                    'path': manifest.relative(path),
+                    'artifact_key': artifacts.get(kind),
+                } for target in targets)
+            ocr_stage.submit_image(companies, engine, kind, path)
+        for kind, terms in (result.get('texts') or {}).items():
+            ocr_stage.add_text(companies, engine, kind, terms)
+
+    def deliver(item, result, checkpoint_item=True):
+        """1回の検索結果を同じ検索語の全対象に反映し、完了をマニフェストに記録"""
+        analyze(item['engine'], item['targets'], result)
+        for target in item['targets']:
+            target_result = deliver_target(item['engine'], target, result)
+            if checkpoint_item and 'error' not in result:
+                manifest.record_item(
+                    target['company'], item['engine'], target['variation']['type'],
+                    target_result, artifact_fields=ARTIFACT_KEYS
+                )
+
+    # 作業単位（会社×パターン×エンジン）を展開し、結果の格納先を用意
+    # 同じ検索語になる作業はバッチ内で1つにまとめ、結果を全ての対象に配る
+    work_items = []
+    unique_items = {}
+    completed_targets = []
+    for company_name in companies:
+        # 会社別フォルダ（作業実行時に作成）
+        safe_name = "".join(c for c in company_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        company_folder = os.path.join(folder_path, safe_name)
+
+        # パターン準備
+        variations = company_search_variations(company_name, selected_patterns)
+
+        remaining_per_company[company_name] = len(engines) * len(variations)
+        for index, variation in enumerate(variations):
+            for engine in engines:
+                target = {'company': company_name, 'index': index, 'variation': variation}
+                checkpoint_key = (company_name, engine, variation['type'])
+                if checkpoint_key in checkpoint['items']:
+                    completed_targets.append((engine, target, checkpoint['items'][checkpoint_key]))
+                    continue
+
+                key = (engine, variation['name'])
+                if key in unique_items:
+                    unique_items[key]['targets'].append(target)
+                    continue
+                item = {
+                    'engine': engine,
+                    'variation': variation,
+                    'folder': os.path.join(company_folder, engine),
+                    'targets': [target],
+                }
+                # 途中まで撮影済みなら残りのグループだけを実行
+                prior = checkpoint['captures'].get(checkpoint_key)
+                if prior:
+                    item['prior'] = prior
+                    item['options'] = remaining_capture_options(search_options, prior)
+                unique_items[key] = item
+                work_items.append(item)
+
+    total_targets = sum(remaining_per_company.values())
+    deduplicated = total_targets - len(completed_targets) - len(work_items)
+    if deduplicated:
+        print(f"🔁 重複クエリ {deduplicated}件をまとめました")
+    # 正規化で同じ会社・同じ検索語になった入力の集計
+    normalization = {
+        'input_companies': len(companies),
+        'unique_companies': len({parse_company_name(name)['name'] for name in companies}),
+        'requested_searches': total_targets,
+        'unique_searches': len({(engine, variation_name) for engine, variation_name in unique_items}),
+        'eliminated_searches': deduplicated,
+    }
+    job.update_progress(total_steps=total_targets)
+
+    # チェックポイントで完了済みの対象は結果を復元するだけ
+    for engine, target, result in completed_targets:
+        analyze(engine, [target], result)
+        deliver_target(engine, target, result)
+        state['resumed_steps'] += 1
+
+    # キャッシュに新しい結果があればブラウザを使わずに再利用
+    capture_options = {key: search_options.get(key, default) for key, default in CAPTURE_OPTION_DEFAULTS.items()}
+    use_cache = query_cache is not None and search_options.get('use_cache', True)
+    if use_cache:
+        pending_items = []
+        for item in work_items:
+            cached = None if 'prior' in item else query_cache.get(item['engine'], item['variation']['name'], capture_options)
+            if cached is not None:
+                try:
+                    cached_result = import_cached_artifacts(cached['result'], item, search_options)
+                except OSError as e:
+                    # 取り込めなければブラウザで撮り直す
+                    print(f"⚠️ キャッシュの成果物を取り込めません ({item['variation']['name']}): {e}")
+                    cached = None
+            if cached is None:
+                pending_items.append(item)
+                continue
+            state['cache_hits'] += 1
+            captured_at = datetime.fromtimestamp(cached['captured_at']).isoformat()
+            cached_result.pop('target_changes', None)
+            deliver(item, dict(cached_result, cached=True, cached_at=captured_at))
+        if state['cache_hits']:
+            print(f"💾 キャッシュ再利用 {state['cache_hits']}件")
+        work_items = pending_items
+
+    # ブラウザ作業は共有ワークキューに登録し、このプロセスや他のプロセス・コンテナのワーカーが分担する
+    max_width = search_options.get('screenshot_max_width', SCREENSHOT_MAX_WIDTH)
+    screenshot_settings = {
+        'format': search_options.get('screenshot_format', SCREENSHOT_FORMAT),
+        'quality': int(search_options.get('screenshot_quality', SCREENSHOT_QUALITY)),
+        'max_width': int(max_width) if max_width else None,
+    }
+    if screenshot_settings['format'] not in SCREENSHOT_FORMATS:
+        raise ValueError(f"未対応の画像形式です: {screenshot_settings['format']}")
+
+    queued = {}
+    queue_entries = []
+    for item in work_items:
+        item_key = f"{item['engine']}\t{item['variation']['name']}"
+        queued[item_key] = item
+        queue_entries.append((item_key, item['engine'], {
+            'engine': item['engine'],
+            'variation': item['variation'],
+            'folder': item['folder'],
+            'batch_folder': folder_path,
+            'company': item['targets'][0]['company'],
+            'targets': [{'company': t['company'], 'type': t['variation']['type']} for t in item['targets']],
+            'options': item.get('options', search_options),
+            'prior': item.get('prior', {}),
+            'capture_options': capture_options,
+            'use_cache': use_cache and 'prior' not in item,
+            'headless': search_options.get('headless_mode', True),
+            'screenshot': screenshot_settings,
+        }))
+    if queue_entries:
+        work_queue.enqueue_batch(
+            folder_name, job.id, queue_entries, owner=data.get('owner'), priority=data.get('priority')
+        )
+        print(f"📥 ワークキューに {len(queue_entries)}件を登録しました")
+
+    # 完了した作業から順に結果を取り込む（ワーカー側の作業・予算待ち時間も集計）
+    scheduler = RateBudgetScheduler(buckets={})
+    screenshot_stats = []
+    timing_totals = {}
+    network_totals = empty_stats()
+    memory_totals = empty_memory_stats()
+    workers = set()
+    deadline = time.monotonic() + QUEUE_RESULT_TIMEOUT if QUEUE_RESULT_TIMEOUT else None
+    abandoned = None
+    while queued:
+        entries = work_queue.take_finished(folder_name)
+        if not entries:
+            if abandoned:
+                # キューから失敗として返らなかった分もエラーにして終える
+                for item in queued.values():
+                    deliver(item, failed_result(item, abandoned))
+                queued.clear()
+                break
+            abandoned = queue_stall_reason(deadline)
+            if abandoned:
+                print(f"⚠️ {abandoned}。残り {len(queued)}件を失敗扱いにします")
+                work_queue.cancel_batch(folder_name, abandoned)
+            else:
+                time.sleep(QUEUE_POLL_INTERVAL)
+            continue
+        for entry in entries:
+            item = queued.pop(entry['item_key'], None)
+            if item is None:
+                continue
+            meta = entry['meta']
+            if meta:
+                scheduler.record(item['engine'], meta.get('work_seconds', 0.0), meta.get('budget_wait_seconds', 0.0))
+                screenshot_stats.append(meta.get('screenshots', {}))
+                merge_network_stats(network_totals, meta.get('network', {}))
+                merge_memory_stats(memory_totals, meta.get('memory', {}))
+                workers.add(meta.get('worker'))
+                # フェーズ別の時間（予算待ちと並行で動く画像保存も内訳に含める）
+                screenshots = meta.get('screenshots', {})
+                metrics.merge_timings(timing_totals, dict(meta.get('timings', {}), budget_wait={
+                    'seconds': meta.get('budget_wait_seconds', 0.0), 'count': 1 if meta.get('budget_wait_seconds') else 0,
+                }, screenshot_write={
+                    'seconds': screenshots.get('encode_seconds', 0.0), 'count': screenshots.get('screenshots', 0),
+                }))
+            if entry['status'] == 'done':
+                result = entry['result']
+            else:
+                result = failed_result(item, entry['error'] or '作業に失敗しました')
+            job.update_progress(current_company=item['targets'][0]['company'], current_engine=item['engine'])
+            deliver(item, result)
+    schedule_report = dict(scheduler.report(), workers=len(workers))
+
+    processed_companies = state['processed_companies']
+    print(f"\n⏱️ 作業 {schedule_report['work_seconds']}秒 / 予算待ち {schedule_report['budget_wait_seconds']}秒")
+
+    # OCR分析（バッチ中に投入済み。残りの解析が終わるのを待ってレポートを保存）
+    ocr_results = {}
+    if ocr_stage is not None:
+        print("\n=== OCR分析の完了待ち ===")
+        try:
+            for company_name, company_ocr in ocr_stage.results().items():
+                safe_name = "".join(c for c in company_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
+                company_folder = os.path.join(folder_path, safe_name)
+                os.makedirs(company_folder, exist_ok=True)
+
+                # JSONレポート保存
+                json_path = os.path.join(company_folder, f"ocr_report_{safe_name}.json")
+                with open(json_path, 'w', encoding='utf-8') as f:
+                    json.dump(dict(company_ocr, company=company_name), f, ensure_ascii=False, indent=2)
+
+                ocr_results[company_name] = {
+                    'json_url': batch_file_url(folder_name, manifest.relative(json_path)),
+                    'summary': company_ocr['summary'],
+                    'risk_assessment': company_ocr['risk_assessment']
+                }
+
+        except Exception as e:
+            print(f"OCR分析エラー: {e}")
+            ocr_results = {'error': str(e)}
+
+    # 全体サマリー作成
+    summary = {
+        'total_companies': len(companies),
+        'processed_companies': processed_companies,
+        'total_screenshots': state['total_screenshots'],
+        'failed_steps': state['failed_steps'],
+        'changes': state['changes'],
+        'enabled_options': search_options,
+        'scheduler': schedule_report,
+        'deduplicated_queries': deduplicated,
+        'normalization': normalization,
+        'cache_hits': state['cache_hits'],
+        'resumed_steps': state['resumed_steps'],
+        'screenshots': combine_stats(screenshot_stats, screenshot_settings['format']),
+        'timings': metrics.timing_breakdown(timing_totals),
+        'network': network_totals,
+        'memory': dict(memory_totals, max_rss_bytes=memory_watchdog.max_rss_bytes,
+                       max_renderers=memory_watchdog.max_renderers)
+    }
+
+    # 抽出テキスト・OCRテキストを全文検索インデックスに追加
+    try:
+        summary['indexed_documents'] = text_index.add_documents(
+            list(manifest_text_documents(manifest)) + ocr_documents
+        )
+    except Exception as e:
+        print(f"⚠️ 全文検索インデックスの更新に失敗: {e}")
+
+    manifest.record_completed(summary)
+    work_queue.finish_batch(folder_name, summary)
+    work_queue.purge_finished_batches(older_than=QUEUE_RETENTION)
+
+    return {
+        'success': True,
+        'batch_id': folder_name,
+        'archive_url': f'/batches/{folder_name}/archive',
+        'results_url': f'/batches/{folder_name}/results',
+        'companies': companies,
+        'ocr_results': ocr_results,
+        'summary': summary,
+        'message': f'{processed_companies}社の処理が完了しました'
+    }
+
+def filter_changed_result(result):
+    """新規・変化ありの撮影を含む結果なら変化なしの撮影パスを外して返す（なければ None）"""
+    changes = result.get('changes') or {}
+    unchanged = [kind for kind, change in changes.items() if change['status'] == STATUS_UNCHANGED]
+    if len(unchanged) == len(changes):
+        return None
+    filtered = dict(result, **{kind: None for kind in unchanged})
+    if result.get('artifacts'):
+        filtered['artifacts'] = {kind: key for kind, key in result['artifacts'].items() if kind not in unchanged}
+    return filtered
+
+def request_owner(data=None):
+    """投入者（公平キューイングの単位。指定がなければジョブごと）"""
+    return (data or {}).get('user') or request.headers.get('X-User-Id')
+
+def request_priority(data, company_count):
+    """優先度クラス（指定がなければ社数で判定）"""
+    priority = (data or {}).get('priority')
+    if priority in PRIORITY_WEIGHTS:
+        return priority
+    return 'urgent' if company_count <= URGENT_MAX_COMPANIES else 'normal'
+
+def estimate_search_plan(companies, selected_patterns, search_options, workers=None):
+    """バッチを実行せずに検索数・撮影数・容量・所要時間を見積もる（run_ultimate_search と同じ展開）"""
+    companies = list(dict.fromkeys(companies))
+    engines = batch_engines(search_options)
+    queries = {}
+    requested = 0
+    for company_name in companies:
+        for variation in company_search_variations(company_name, selected_patterns):
+            for engine in engines:
+                requested += 1
+                queries.setdefault((engine, variation['name']), variation)
+
+    cached = set()
+    if query_cache is not None and search_options.get('use_cache', True):
+        capture_options = {key: search_options.get(key, default) for key, default in CAPTURE_OPTION_DEFAULTS.items()}
+        cached = query_cache.fresh_queries(queries, capture_options)
+
+    image_format = search_options.get('screenshot_format', SCREENSHOT_FORMAT)
+    engine_stats = {
+        engine: rolling_engine_stats(work_queue.recent_done_items(engine, HISTORY_ITEMS), image_format)
+        for engine in engines
+    }
+    estimate = estimate_batch(
+        queries, search_options, cached, engine_stats, load_engine_budgets(),
+        workers=workers or len(queue_workers), backlog=work_queue.pending_by_engine(),
+        limit_seconds=MAX_BATCH_SECONDS,
+    )
+    return dict(
+        {'companies': len(companies), 'engines': engines, 'requested_searches': requested},
+        **{key: value for key, value in estimate.items() if key != 'engines'},
+        per_engine=estimate['engines'],
+    )
+
+@app.route('/plan', methods=['POST'])
+def plan_search():
+    """ドライラン（/ultimate_search と同じ入力で、実行せずに見積もりを返す）"""
+    try:
+        data = request.json or {}
+        companies = data.get('companies', [])
+
+        if not companies:
+            return jsonify({'success': False, 'error': '会社が選択されていません'})
+
+        plan = estimate_search_plan(
+            companies, data.get('selected_patterns', {}), data.get('options', {}), workers=data.get('workers')
+        )
+        return jsonify({'success': True, 'plan': plan})
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
 @app.route('/ultimate_search', methods=['POST'])
 def ultimate_search():
-    """最終版検索システム"""
+    """最終版検索システム（ジョブ登録のみ行い、即座にジョブIDを返す）"""
     try:
         data = request.json
         companies = data.get('companies', [])
-        selected_patterns = data.get('selected_patterns', {})
-        search_options = data.get('options', {})
-        
+
         if not companies:
             return jsonify({'success': False, 'error': '会社が選択されていません'})
-        
-        # 保存先フォルダ作成
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        folder_name = f"ultimate_search_batch_{timestamp}"
-        folder_path = os.path.join(os.path.dirname(__file__), folder_name)
-        os.makedirs(folder_path, exist_ok=True)
-        
-        # WebDriver初期化（ヘッドレスモード設定を取得）
-        headless_mode = search_options.get('headless_mode', True)
-        driver = setup_driver(headless=headless_mode)
-        all_results = {}
-        
-        try:
-            total_companies = len(companies)
-            processed_companies = 0
-            
-            for company_name in companies:
-                print(f"\n=== 処理中: {company_name} ({processed_companies+1}/{total_companies}) ===")
-                
-                # 会社別フォルダ作成
-                safe_name = "".join(c for c in company_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                company_folder = os.path.join(folder_path, safe_name)
-                os.makedirs(company_folder, exist_ok=True)
-                
-                # パターン準備
-                company_patterns = selected_patterns.get(company_name, [])
-                if not company_patterns:
-                    # デフォルトパターン
-                    variations = prepare_company_variations(company_name)
-                else:
-                    variations = prepare_company_variations(company_name, company_patterns)
-                
-                company_results = {}
-                
-                # 各検索エンジンで処理
-                engines = []
-                if search_options.get('enable_google', True):
-                    engines.append('google')
-                if search_options.get('enable_yahoo', True):
-                    engines.append('yahoo')
-                if search_options.get('enable_bing', True):
-                    engines.append('bing')
-                
-                for engine in engines:
-                    print(f"  {engine.upper()} 処理中...")
-                    
-                    engine_folder = os.path.join(company_folder, engine)
-                    os.makedirs(engine_folder, exist_ok=True)
-                    
-                    engine_results = []
-                    
-                    for variation in variations:
-                        result = process_search_with_options(
-                            driver, engine, variation, engine_folder, search_options
-                        )
-                        engine_results.append(result)
-
-                        # 人間らしいランダムな待機（3〜8秒）
-                        wait_time = random.uniform(3, 8)
-                        print(f"  ⏳ {wait_time:.1f}秒待機中...")
-                        time.sleep(wait_time)
-                    
-                    company_results[engine] = engine_results
-
-                    # エンジン間での長めの待機（10〜20秒）
-                    engine_wait = random.uniform(10, 20)
-                    print(f"  💤 次の検索エンジンまで{engine_wait:.1f}秒待機...")
-                    time.sleep(engine_wait)
-                
-                all_results[company_name] = company_results
-                processed_companies += 1
-                
-                # 会社間での待機
-                if processed_companies < total_companies:
-                    time.sleep(random.uniform(3, 5))
-        
-        finally:
-            driver.quit()
-        
-        # OCR分析（有効な場合）
-        ocr_results = {}
-        if search_options.get('enable_ocr', False):
-            print("\n=== OCR分析開始 ===")
-            print("⚠️ OCR機能は現在無効化されています")
-            """
-            try:
-                analyzer = NegativeWordAnalyzer()
-                
-                for company_name in companies:
-                    safe_name = "".join(c for c in company_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                    company_folder = os.path.join(folder_path, safe_name)
-                    
-                    if os.path.exists(company_folder):
-                        company_ocr = analyzer.analyze_folder(company_folder)
-                        
-                        # JSONレポート保存
-                        json_filename = f"ocr_report_{safe_name}_{timestamp}.json"
-                        json_path = os.path.join(company_folder, json_filename)
-                        analyzer.save_report(company_ocr, json_path)
-                        
-                        # HTMLレポート保存
-                        html_filename = f"ocr_report_{safe_name}_{timestamp}.html"
-                        html_path = os.path.join(company_folder, html_filename)
-                        analyzer.save_html_report(company_ocr, html_path)
-                        
-                        ocr_results[company_name] = {
-                            'json_path': json_path,
-                            'html_path': html_path,
-                            'summary': company_ocr['summary'],
-                            'risk_assessment': company_ocr['risk_assessment']
-                        }
-            
-            except Exception as e:
-                print(f"OCR分析エラー: {e}")
-                ocr_results = {'error': str(e)}
-            """
-        
-        # 全体サマリー作成
-        summary = {
-            'total_companies': len(companies),
-            'processed_companies': processed_companies,
-            'total_screenshots': 0,
-            'enabled_options': search_options
-        }
-        
-        # スクリーンショット数カウント
-        for company_results in all_results.values():
-            for engine_results in company_results.values():
-                for result in engine_results:
-                    for key, value in result.items():
-                        if key.endswith(('suggest', 'related', 'maps')) and value:
-                            summary['total_screenshots'] += 1
-        
+
+        # 上限を超えるバッチは投入せず、分割の目安とともに見積もりを返す
+        if MAX_BATCH_SECONDS:
+            plan = estimate_search_plan(companies, data.get('selected_patterns', {}), data.get('options', {}))
+            if not plan['fits']:
+                return jsonify({
+                    'success': False,
+                    'error': f"予測所要時間が上限（{MAX_BATCH_SECONDS}秒）を超えています。"
+                             f"{plan['suggested_batches']}回程度に分けて実行してください",
+                    'plan': plan,
+                })
+
+        job = job_manager.submit(run_ultimate_search, {
+            'companies': companies,
+            'selected_patterns': data.get('selected_patterns', {}),
+            'options': data.get('options', {}),
+            'owner': request_owner(data),
+            'priority': request_priority(data, len(companies)),
+        })
+
         return jsonify({
             'success': True,
-            'folder': folder_path,
-            'companies': companies,
-            'results': all_results,
-            'ocr_results': ocr_results,
-            'summary': summary,
-            'message': f'{processed_companies}社の処理が完了しました'
+            'job_id': job.id,
+            'status_url': f'/jobs/{job.id}',
+            'events_url': f'/jobs/{job.id}/events',
+            'message': f'{len(companies)}社の検索ジョブを登録しました'
         })
-        
+
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         })
 
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """ジョブ一覧"""
+    return jsonify({'success': True, 'jobs': job_manager.list_jobs()})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """ジョブ状態・進捗（results=1 で終了時のサマリーとOCR集計も返す）"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'ジョブが見つかりません'}), 404
+
+    # 撮影結果の一覧は /batches/<id>/results からページ単位で取得する
+    include_results = request.args.get('results', '0') != '0'
+    data = job.to_dict(include_results=include_results)
+    # ワークキュー上の待ち件数・待ち時間・公平配分
+    if data['batch_id']:
+        data['queue'] = work_queue.queue_stats(data['batch_id'])
+    return jsonify({'success': True, 'job': data})
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """ジョブ進捗のServer-Sent Eventsストリーム"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'ジョブが見つかりません'}), 404
+
+    # 再接続時は Last-Event-ID の次から送る
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('since'))
+    since = int(last_event_id) + 1 if last_event_id not in (None, '') else 0
+
+    def generate():
+        for event in job.iter_events(since=since, max_duration=SSE_MAX_DURATION):
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            yield f"id: {event['seq']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+def open_batch_manifest(batch_id):
+    """バッチIDからマニフェストを取得（不正なID・存在しない場合は None）"""
+    if not BATCH_ID_PATTERN.match(batch_id or ''):
+        return None
+    manifest = BatchManifest(os.path.join(BATCH_ROOT, batch_id))
+    return manifest if manifest.exists else None
+
+@app.route('/batches', methods=['GET'])
+def list_batches():
+    """マニフェストを持つバッチの一覧"""
+    batches = []
+    for name in sorted(os.listdir(BATCH_ROOT), reverse=True):
+        manifest = open_batch_manifest(name)
+        if manifest is None:
+            continue
+        state = manifest.load_state()
+        header = state['header'] or {}
+        batches.append({
+            'batch_id': name,
+            'created_at': header.get('time'),
+            'total_companies': len(header.get('companies', [])),
+            'completed_items': len(state['items']),
+            'completed': state['completed'],
+        })
+    return jsonify({'success': True, 'batches': batches})
+
+@app.route('/batches/<batch_id>/resume', methods=['POST'])
+def resume_batch(batch_id):
+    """中断したバッチをマニフェストから再開（未完了の作業のみ実行）"""
+    manifest = open_batch_manifest(batch_id)
+    if manifest is None:
+        return jsonify({'success': False, 'error': 'バッチが見つかりません'}), 404
+
+    header = manifest.load_state()['header']
+    if header is None:
+        return jsonify({'success': False, 'error': 'マニフェストにバッチ情報がありません'})
+
+    job = job_manager.submit(run_ultimate_search, {
+        'companies': header['companies'],
+        'selected_patterns': header.get('selected_patterns', {}),
+        'options': header.get('options', {}),
+        'resume_batch_id': batch_id,
+        'owner': request_owner(request.get_json(silent=True)),
+        'priority': request_priority(request.get_json(silent=True), len(header['companies'])),
+    })
+
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'batch_id': batch_id,
+        'status_url': f'/jobs/{job.id}',
+        'events_url': f'/jobs/{job.id}/events',
+        'message': f'バッチ {batch_id} の再開ジョブを登録しました'
+    })
+
+@app.route('/history', methods=['GET'])
+def get_capture_history():
+    """撮影履歴と変化判定（changed_only=1 で新規・変化ありのみ）"""
+    history = capture_history.query(
+        batch_id=request.args.get('batch_id'),
+        company=request.args.get('company'),
+        engine=request.args.get('engine'),
+        changed_only=request.args.get('changed_only') == '1',
+        limit=min(request.args.get('limit', 100, type=int), 1000),
+        offset=request.args.get('offset', 0, type=int),
+    )
+    # パスはバッチフォルダからの相対パスで記録している（絶対パスの古い記録は返さない）
+    for capture in history['captures']:
+        path = capture.pop('path')
+        capture['url'] = None if not path or os.path.isabs(path) else batch_file_url(capture['batch_id'], path)
+    return jsonify(dict(history, success=True))
+
+def batch_file_url(batch_id, relative_path):
+    return f'/batches/{batch_id}/files/{relative_path}' if relative_path else relative_path
+
+def artifact_url(key):
+    return f'/artifacts/{key}'
+
+def public_result(batch_id, result):
+    """成果物のパスを配信用URLに置き換えた結果（保存先のキーがあれば /artifacts/、なければ /batches/<id>/files/）"""
+    public = dict(result)
+    artifacts = public.get('artifacts') or {}
+    for field in ARTIFACT_KEYS:
+        if field in artifacts:
+            public[field] = artifact_url(artifacts[field])
+        else:
+            path = public.get(field)
+            public[field] = batch_file_url(batch_id, path)
+    return public
+
+@app.route('/batches/<batch_id>/results', methods=['GET'])
+def get_batch_results(batch_id):
+    """バッチ結果のページ取得（format=ndjson なら1行1件で逐次送信）
+
+    changed_only=1 なら前回から新規・変化ありの撮影を含む結果だけを返す。
+
+    成果物のパスはサーバーの絶対パスではなく、保存先のキーがあれば /artifacts/ の、
+    なければ /batches/<id>/files/ のURLで返す。
+    """
+    manifest = open_batch_manifest(batch_id)
+    if manifest is None:
+        return jsonify({'success': False, 'error': 'バッチが見つかりません'}), 404
+
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    records = manifest.iter_items(company=request.args.get('company'), engine=request.args.get('engine'))
+    if request.args.get('changed_only') == '1':
+        def changed(items):
+            for record in items:
+                result = filter_changed_result(record['result'])
+                if result is not None:
+                    yield dict(record, result=result)
+        records = changed(records)
+    state = {'has_more': False}
+
+    def page():
+        for index, record in enumerate(records):
+            if index < offset:
+                continue
+            if index >= offset + limit:
+                state['has_more'] = True
+                break
+            yield {
+                'company': record['company'],
+                'engine': record['engine'],
+                'variation_type': record['variation_type'],
+                'result': public_result(batch_id, record['result']),
+            }
+
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            for item in page():
+                yield json.dumps(item, ensure_ascii=False) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    items = list(page())
+    return jsonify({
+        'success': True,
+        'batch_id': batch_id,
+        'offset': offset,
+        'limit': limit,
+        'results': items,
+        'has_more': state['has_more'],
+    })
+
+@app.route('/batches/<batch_id>/files/<path:relative_path>', methods=['GET'])
+def get_batch_file(batch_id, relative_path):
+    """バッチフォルダ内の個別ファイル"""
+    manifest = open_batch_manifest(batch_id)
+    if manifest is None:
+        return jsonify({'success': False, 'error': 'バッチが見つかりません'}), 404
+    return send_from_directory(manifest.folder_path, relative_path)
+
+@app.route('/batches/<batch_id>/archive', methods=['GET'])
+def download_batch_archive(batch_id):
+    """バッチフォルダをZIPで逐次送信（company / engine / kind で絞り込み可）"""
+    manifest = open_batch_manifest(batch_id)
+    if manifest is None:
+        return jsonify({'success': False, 'error': 'バッチが見つかりません'}), 404
+
+    company = request.args.get('company')
+    engine = request.args.get('engine')
+    kind = request.args.get('kind')
+    if company or engine or kind:
+        files = manifest.iter_artifact_paths(ARTIFACT_KEYS, company=company, engine=engine, kind=kind)
+    else:
+        files = iter_folder_files(manifest.folder_path)
+
+    return Response(stream_with_context(iter_zip(manifest.folder_path, files, prefix=batch_id)),
+                    mimetype='application/zip', headers={
+        'Content-Disposition': f'attachment; filename="{batch_id}.zip"',
+        'X-Accel-Buffering': 'no',
+    })
+
+@app.route('/search', methods=['GET'])
+def search_texts():
+    """サジェスト・関連ワード・OCRテキストの全文検索
+
+    q: 検索語（部分一致）, company / engine / kind / source（text・ocr）: 完全一致,
+    since / until: 取得日（YYYY-MM-DD またはISO形式の日時）
+    """
+    started = time.perf_counter()
+    try:
+        found = text_index.search(
+            term=request.args.get('q'),
+            company=request.args.get('company'),
+            engine=request.args.get('engine'),
+            kind=request.args.get('kind'),
+            source=request.args.get('source'),
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            limit=min(max(request.args.get('limit', 100, type=int), 1), 1000),
+            offset=max(request.args.get('offset', 0, type=int), 0),
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'日付の形式が正しくありません: {e}'}), 400
+
+    for document in found['documents']:
+        key = document.pop('artifact_key')
+        path = document.pop('path')
+        if key:
+            document['url'] = artifact_url(key)
+        elif path and not path.startswith(os.pardir):
+            document['url'] = batch_file_url(document['batch_id'], path)
+        else:
+            document['url'] = None
+    return jsonify(dict(found, success=True, elapsed_ms=round((time.perf_counter() - started) * 1000, 1)))
+
+@app.route('/search/reindex', methods=['POST'])
+def reindex_texts():
+    """既存バッチの抽出テキストをインデックスに追加（batch_id 指定がなければ未登録の全バッチ。OCRテキストは対象外）"""
+    batch_id = (request.json or {}).get('batch_id') if request.is_json else None
+    if batch_id:
+        manifest = open_batch_manifest(batch_id)
+        if manifest is None:
+            return jsonify({'success': False, 'error': 'バッチが見つかりません'}), 404
+        manifests = [manifest]
+    else:
+        indexed = text_index.indexed_batches()
+        manifests = [open_batch_manifest(name) for name in sorted(os.listdir(BATCH_ROOT)) if name not in indexed]
+        manifests = [manifest for manifest in manifests if manifest is not None]
+
+    added = 0
+    for manifest in manifests:
+        added += text_index.add_documents(manifest_text_documents(manifest))
+    return jsonify({'success': True, 'batches': len(manifests), 'indexed_documents': added})
+
+@app.route('/artifacts/<path:key>', methods=['GET'])
+def get_artifact(key):
+    """保存先の成果物（キーは内容のハッシュなので、同じURLの内容は変わらない）"""
+    if not is_valid_key(key):
+        return jsonify({'success': False, 'error': '不正なキーです'}), 400
+
+    # アップロード中ならこのプロセスの元ファイルを返す
+    path = artifact_uploader.pending_path(key)
+    if path is None and artifact_store.kind == 'local':
+        path = artifact_store.path(key)
+    if path is not None:
+        if not os.path.isfile(path):
+            return jsonify({'success': False, 'error': '成果物が見つかりません'}), 404
+        return send_file(path, max_age=ARTIFACT_MAX_AGE)
+
+    if not artifact_store.exists(key):
+        return jsonify({'success': False, 'error': '成果物が見つかりません'}), 404
+    return redirect(artifact_store.download_url(key))
+
 @app.route('/')
 def index():
     """トップページ - HTMLを表示"""
@@ -619,7 +1784,32 @@ def index():
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy'})
+    return jsonify({
+        'status': 'healthy',
+        'driver_pool': driver_pool.stats(),
+        'queue_workers': len(queue_workers),
+        'artifact_store': dict(artifact_uploader.stats(), backend=artifact_store.kind),
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """フェーズ別の所要時間ヒストグラムとプール・キューの状態（Prometheus形式）"""
+    jobs = {}
+    for job in job_manager.list_jobs():
+        jobs[job['status']] = jobs.get(job['status'], 0) + 1
+    gauges = {
+        'driver_pool': [({'state': key}, value) for key, value in sorted(driver_pool.stats().items())],
+        'driver_rss_bytes': [({}, driver_pool.total_rss())],
+        'queue_workers': [({}, len(queue_workers))],
+        'work_queue_items': [({'status': key}, value) for key, value in sorted(work_queue.status_counts().items())],
+        'work_queue_pending': [({'priority': key}, value) for key, value in sorted(work_queue.priority_depths().items())],
+        'jobs': [({'status': key}, value) for key, value in sorted(jobs.items())],
+    }
+    return Response(metrics.render_prometheus(gauges), mimetype='text/plain; version=0.0.4')
+
+# gunicorn等から読み込まれた場合はここでワーカーを起動（直接実行時はリローダーの子プロセスで起動）
+if __name__ != '__main__':
+    start_queue_workers(QUEUE_WORKERS)
 
 if __name__ == '__main__':
     print("=" * 70)
@@ -634,4 +1824,6 @@ if __name__ == '__main__':
     print("🤖 OCRネガティブワード分析")
     print("🎛️  全機能ON/OFF切り替え")
     print("=" * 70)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_queue_workers(QUEUE_WORKERS)
     app.run(host='0.0.0.0', port=8006, debug=True)
\ No newline at end of file
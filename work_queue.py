@@ -0,0 +1,540 @@
+"""SQLite（WALモード）による共有ワークキュー
+
+(会社, エンジン, パターン) の作業を保存し、複数のgunicornワーカーやコンテナが
+リース付きで取り出して処理する。ハートビートが途絶えたリースは期限切れ後に再投入され、
+上限回数を超えたものは失敗として確定する。
+
+取り出し順は投入者（ユーザー、指定がなければバッチ）ごとのフローの重み付き公平キューイング。
+各フローは取り出すたびに 1/重み だけ仮想時間が進み、仮想時間が最も小さいフローから取り出す。
+大きなバッチの途中に投入された小さなバッチもすぐに順番が回り、大きなバッチも止まらずに進む。
+優先度クラスはフローの重みとして扱う（urgent は normal の8倍の割合で取り出される）。
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+# 優先度クラス -> フローの重み
+PRIORITY_WEIGHTS = {
+    'urgent': 8.0,
+    'normal': 1.0,
+    'bulk': 0.25,
+}
+DEFAULT_PRIORITY = 'normal'
+
+# 既存のキューに後から追加した列（テーブル, 列, 定義）
+_ADDED_COLUMNS = (
+    ('batches', 'flow_key', 'TEXT'),
+    ('batches', 'priority', 'TEXT'),
+    ('items', 'flow_key', "TEXT NOT NULL DEFAULT ''"),
+    ('items', 'enqueued_at', 'REAL'),
+    ('items', 'claimed_at', 'REAL'),
+)
+
+
+def flow_key_for(batch_id, owner=None, priority=DEFAULT_PRIORITY):
+    """公平キューイングの単位（投入者が分からなければバッチごと）"""
+    return f'{priority}:{owner or batch_id}'
+
+
+class WorkQueue:
+    """バッチの作業項目を保持する永続キュー"""
+
+    def __init__(self, path, lease_seconds=300, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS batches (
+                    batch_id TEXT PRIMARY KEY,
+                    job_id TEXT,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    finished_at REAL,
+                    summary TEXT
+                );
+                CREATE TABLE IF NOT EXISTS items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    batch_id TEXT NOT NULL,
+                    item_key TEXT NOT NULL,
+                    engine TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    meta TEXT,
+                    error TEXT,
+                    delivered INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL,
+                    UNIQUE (batch_id, item_key)
+                );
+                CREATE TABLE IF NOT EXISTS flows (
+                    flow_key TEXT PRIMARY KEY,
+                    priority TEXT NOT NULL,
+                    weight REAL NOT NULL,
+                    virtual_time REAL NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_items_status ON items (status, engine, id);
+                CREATE INDEX IF NOT EXISTS idx_items_batch ON items (batch_id, status, delivered);
+            ''')
+            for table, column, definition in _ADDED_COLUMNS:
+                columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_items_flow ON items (status, flow_key, id)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA busy_timeout=30000')
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """書き込みロックを最初に取るトランザクション（取り出しの競合防止）"""
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    # --- バッチ ---
+
+    def enqueue_batch(self, batch_id, job_id, items, owner=None, priority=DEFAULT_PRIORITY):
+        """作業項目を登録（同じ item_key の既存項目はそのまま残す）
+
+        items: [(item_key, engine, payload), ...]
+        owner: 投入者（同じ投入者のバッチは1つのフローとして公平に扱う）
+        priority: PRIORITY_WEIGHTS のキー
+        """
+        priority = priority if priority in PRIORITY_WEIGHTS else DEFAULT_PRIORITY
+        flow_key = flow_key_for(batch_id, owner, priority)
+        now = time.time()
+        with self._transaction() as conn:
+            self._activate_flow(conn, flow_key, priority, now)
+            conn.execute(
+                'INSERT INTO batches (batch_id, job_id, status, created_at, flow_key, priority) '
+                'VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (batch_id) DO UPDATE SET job_id = excluded.job_id, status = excluded.status, '
+                'flow_key = excluded.flow_key, priority = excluded.priority',
+                (batch_id, job_id, 'running', now, flow_key, priority)
+            )
+            conn.executemany(
+                'INSERT OR IGNORE INTO items (batch_id, item_key, engine, payload, flow_key, enqueued_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(batch_id, key, engine, json.dumps(payload, ensure_ascii=False), flow_key, now, now)
+                 for key, engine, payload in items]
+            )
+            # 再登録された項目は未配信扱いに戻し、コーディネーターが結果を取り直せるようにする
+            # （失敗済みの項目は再試行する）
+            conn.executemany(
+                "UPDATE items SET delivered = 0, flow_key = ?, "
+                "attempts = CASE WHEN status = 'failed' THEN 0 ELSE attempts END, "
+                "enqueued_at = CASE WHEN status = 'failed' THEN ? ELSE enqueued_at END, "
+                "status = CASE WHEN status = 'failed' THEN 'pending' ELSE status END "
+                'WHERE batch_id = ? AND item_key = ?',
+                [(flow_key, now, batch_id, key) for key, _, _ in items]
+            )
+
+    def _activate_flow(self, conn, flow_key, priority, now):
+        """フローを登録し、待ち項目がなかったフローの仮想時間を現在の仮想時刻に合わせる
+
+        しばらく休んでいたフローが過去の仮想時間のまま割り込み続けないようにする。
+        """
+        backlogged = conn.execute(
+            "SELECT 1 FROM items WHERE status = 'pending' AND flow_key = ? LIMIT 1", (flow_key,)
+        ).fetchone()
+        if backlogged:
+            return
+        virtual_now = conn.execute(
+            'SELECT MIN(virtual_time) FROM flows WHERE flow_key IN '
+            "(SELECT DISTINCT flow_key FROM items WHERE status = 'pending')"
+        ).fetchone()[0]
+        if virtual_now is None:
+            virtual_now = conn.execute('SELECT COALESCE(MAX(virtual_time), 0) FROM flows').fetchone()[0]
+        conn.execute(
+            'INSERT INTO flows (flow_key, priority, weight, virtual_time, updated_at) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (flow_key) DO UPDATE SET virtual_time = excluded.virtual_time, '
+            'weight = excluded.weight, updated_at = excluded.updated_at',
+            (flow_key, priority, PRIORITY_WEIGHTS[priority], virtual_now, now)
+        )
+
+    def finish_batch(self, batch_id, summary):
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE batches SET status = ?, finished_at = ?, summary = ? WHERE batch_id = ?',
+                ('completed', time.time(), json.dumps(summary, ensure_ascii=False), batch_id)
+            )
+
+    def batch_counts(self, batch_id):
+        """状態ごとの件数"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT status, COUNT(*) FROM items WHERE batch_id = ? GROUP BY status', (batch_id,)
+            ).fetchall()
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        counts.update(dict(rows))
+        return counts
+
+    def status_counts(self):
+        """全バッチの状態ごとの件数"""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT status, COUNT(*) FROM items GROUP BY status').fetchall()
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        counts.update(dict(rows))
+        return counts
+
+    def queue_stats(self, batch_id):
+        """バッチのキュー状況（フロー・待ち件数・取り出しまでの待ち時間・公平配分の割合）"""
+        now = time.time()
+        with self._connect() as conn:
+            batch = conn.execute(
+                'SELECT flow_key, priority FROM batches WHERE batch_id = ?', (batch_id,)
+            ).fetchone()
+            if batch is None:
+                return None
+            flow_key, priority = batch
+            depth = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+            depth.update(dict(conn.execute(
+                'SELECT status, COUNT(*) FROM items WHERE batch_id = ? GROUP BY status', (batch_id,)
+            ).fetchall()))
+            waits = conn.execute(
+                'SELECT AVG(claimed_at - enqueued_at), MAX(claimed_at - enqueued_at), COUNT(*) '
+                'FROM items WHERE batch_id = ? AND claimed_at IS NOT NULL AND enqueued_at IS NOT NULL', (batch_id,)
+            ).fetchone()
+            oldest_pending = conn.execute(
+                "SELECT MIN(enqueued_at) FROM items WHERE batch_id = ? AND status = 'pending'", (batch_id,)
+            ).fetchone()[0]
+            backlogged = conn.execute(
+                'SELECT flows.flow_key, flows.weight, COUNT(*) FROM items '
+                'JOIN flows ON flows.flow_key = items.flow_key '
+                "WHERE items.status = 'pending' GROUP BY flows.flow_key"
+            ).fetchall()
+
+        total_weight = sum(weight for _, weight, _ in backlogged)
+        own = next((entry for entry in backlogged if entry[0] == flow_key), None)
+        return {
+            'flow': flow_key,
+            'priority': priority,
+            'weight': PRIORITY_WEIGHTS.get(priority, 1.0),
+            'depth': depth,
+            'active_flows': len(backlogged),
+            'pending_in_other_flows': sum(count for key, _, count in backlogged if key != flow_key),
+            # 待ち項目がある間に取り出される割合の目安
+            'fair_share': round(own[1] / total_weight, 3) if own and total_weight else None,
+            'wait_seconds': {
+                'claimed': waits[2],
+                'avg': round(waits[0], 2) if waits[0] is not None else None,
+                'max': round(waits[1], 2) if waits[1] is not None else None,
+                'oldest_pending': round(now - oldest_pending, 2) if oldest_pending else None,
+            },
+        }
+
+    def priority_depths(self):
+        """優先度クラスごとの待ち件数"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT COALESCE(flows.priority, ?), COUNT(*) FROM items '
+                'LEFT JOIN flows ON flows.flow_key = items.flow_key '
+                "WHERE items.status = 'pending' GROUP BY 1", (DEFAULT_PRIORITY,)
+            ).fetchall()
+        depths = {priority: 0 for priority in PRIORITY_WEIGHTS}
+        depths.update(dict(rows))
+        return depths
+
+    def take_finished(self, batch_id, limit=500):
+        """未配信の完了・失敗項目を取り出して配信済みにする"""
+        with self._transaction() as conn:
+            rows = conn.execute(
+                'SELECT id, item_key, status, payload, result, meta, error FROM items '
+                "WHERE batch_id = ? AND status IN ('done', 'failed') AND delivered = 0 ORDER BY id LIMIT ?",
+                (batch_id, limit)
+            ).fetchall()
+            conn.executemany('UPDATE items SET delivered = 1 WHERE id = ?', [(row[0],) for row in rows])
+        return [{
+            'id': row[0],
+            'item_key': row[1],
+            'status': row[2],
+            'payload': json.loads(row[3]),
+            'result': json.loads(row[4]) if row[4] else None,
+            'meta': json.loads(row[5]) if row[5] else {},
+            'error': row[6],
+        } for row in rows]
+
+    def purge_finished_batches(self, older_than):
+        """完了から一定時間経ったバッチの項目を削除"""
+        cutoff = time.time() - older_than
+        with self._transaction() as conn:
+            conn.execute(
+                'DELETE FROM items WHERE batch_id IN '
+                "(SELECT batch_id FROM batches WHERE status = 'completed' AND finished_at < ?)", (cutoff,)
+            )
+            conn.execute("DELETE FROM batches WHERE status = 'completed' AND finished_at < ?", (cutoff,))
+
+    def recent_done_items(self, engine, limit=200):
+        """エンジンの直近の完了項目（見積もり用の実績。payload と meta を返す）"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT payload, meta FROM items WHERE engine = ? AND status = 'done' AND meta IS NOT NULL "
+                'ORDER BY updated_at DESC LIMIT ?', (engine, limit)
+            ).fetchall()
+        return [{'payload': json.loads(row[0]), 'meta': json.loads(row[1])} for row in rows]
+
+    def last_activity(self):
+        """キュー全体で項目が最後に更新された時刻（登録・取り出し・ハートビート・完了・返却）"""
+        with self._connect() as conn:
+            return conn.execute('SELECT MAX(updated_at) FROM items').fetchone()[0]
+
+    def cancel_batch(self, batch_id, error):
+        """バッチの未完了の項目を失敗にして件数を返す（リース中だった項目の完了通知は無視される）"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE items SET status = 'failed', error = ?, lease_owner = NULL, lease_expires = NULL, "
+                "updated_at = ? WHERE batch_id = ? AND status IN ('pending', 'leased')",
+                (error, time.time(), batch_id)
+            )
+        return cursor.rowcount
+
+    def pending_count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM items WHERE status IN ('pending', 'leased')").fetchone()[0]
+
+    def pending_by_engine(self):
+        """エンジンごとの未完了（待ち・リース中）の件数"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT engine, COUNT(*) FROM items WHERE status IN ('pending', 'leased') GROUP BY engine"
+            ).fetchall()
+        return dict(rows)
+
+    # --- ワーカー ---
+
+    def pending_engines(self):
+        """取り出し可能な項目があるエンジン"""
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT engine FROM items WHERE status = 'pending' "
+                "OR (status = 'leased' AND lease_expires < ?)", (now,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def claim(self, worker_id, engines=None):
+        """仮想時間が最も小さいフローの、最も古い取り出し可能な項目をリースする（なければ None）"""
+        now = time.time()
+        with self._transaction() as conn:
+            self._expire_leases(conn, now)
+            query = "SELECT flow_key, MIN(id) FROM items WHERE status = 'pending'"
+            params = []
+            if engines is not None:
+                if not engines:
+                    return None
+                query += f" AND engine IN ({','.join('?' * len(engines))})"
+                params.extend(engines)
+            heads = conn.execute(query + ' GROUP BY flow_key', params).fetchall()
+            if not heads:
+                return None
+
+            flows = {
+                row[0]: (row[1], row[2]) for row in conn.execute(
+                    f"SELECT flow_key, weight, virtual_time FROM flows "
+                    f"WHERE flow_key IN ({','.join('?' * len(heads))})", [flow_key for flow_key, _ in heads]
+                )
+            }
+            flow_key, item_id = min(heads, key=lambda head: (flows.get(head[0], (1.0, 0.0))[1], head[1]))
+            row = conn.execute(
+                'SELECT id, batch_id, engine, payload, attempts FROM items WHERE id = ?', (item_id,)
+            ).fetchone()
+            conn.execute(
+                "UPDATE items SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                'attempts = attempts + 1, claimed_at = ?, updated_at = ? WHERE id = ?',
+                (worker_id, now + self.lease_seconds, now, now, row[0])
+            )
+            conn.execute(
+                'UPDATE flows SET virtual_time = virtual_time + 1.0 / weight, updated_at = ? WHERE flow_key = ?',
+                (now, flow_key)
+            )
+        return {
+            'id': row[0],
+            'batch_id': row[1],
+            'engine': row[2],
+            'payload': json.loads(row[3]),
+            'attempt': row[4] + 1,
+        }
+
+    def release(self, item_id, worker_id):
+        """処理せずに返却（試行回数は戻す）"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE items SET status = 'pending', lease_owner = NULL, lease_expires = NULL, "
+                'attempts = attempts - 1, claimed_at = NULL, updated_at = ? WHERE id = ? AND lease_owner = ?',
+                (time.time(), item_id, worker_id)
+            )
+            # 取り出し時に進めたフローの仮想時間も戻す
+            if cursor.rowcount == 1:
+                conn.execute(
+                    'UPDATE flows SET virtual_time = virtual_time - 1.0 / weight '
+                    'WHERE flow_key = (SELECT flow_key FROM items WHERE id = ?)', (item_id,)
+                )
+
+    def heartbeat(self, item_id, worker_id):
+        """リースを延長（リースを失っていれば False）"""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE items SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                (now + self.lease_seconds, now, item_id, worker_id)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, item_id, worker_id, result, meta=None):
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE items SET status = 'done', result = ?, meta = ?, lease_owner = NULL, "
+                "lease_expires = NULL, updated_at = ? WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                (json.dumps(result, ensure_ascii=False), json.dumps(meta or {}), time.time(), item_id, worker_id)
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, item_id, worker_id, error):
+        """失敗を記録（上限回数までは再投入）"""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                'error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? '
+                "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                (self.max_attempts, error, time.time(), item_id, worker_id)
+            )
+
+    def _expire_leases(self, conn, now):
+        conn.execute(
+            "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "error = COALESCE(error, 'リース期限切れ'), lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE status = 'leased' AND lease_expires < ?",
+            (self.max_attempts, now, now)
+        )
+
+
+def make_worker_id(index):
+    """ホスト・プロセス・スレッドを区別できるワーカーID"""
+    return f'{socket.gethostname()}:{os.getpid()}:{index}'
+
+
+class QueueWorker(threading.Thread):
+    """キューから作業を取り出して execute(claimed) を実行するスレッド
+
+    select_engines() は (取り出してよいエンジンのリスト or None, 次に空くまでの秒数) を返す。
+    acquire(engine) が False の場合は取り出した項目をキューに戻す。
+    execute の戻り値は (result, meta)。meta は完了通知と一緒にキューへ保存される。
+    (result, meta) を返す Future を返した場合は、後処理の完了を待たずに次の項目へ進み、
+    Future が終わった時点で完了（または失敗）を通知する。それまでの間もリースは延長する。
+    """
+
+    def __init__(self, queue, worker_id, execute, select_engines=None, acquire=None,
+                 on_idle=None, poll_interval=1.0):
+        super().__init__(name=f'queue-worker-{worker_id}', daemon=True)
+        self.queue = queue
+        self.worker_id = worker_id
+        self.execute = execute
+        self.select_engines = select_engines
+        self.acquire = acquire
+        self.on_idle = on_idle
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._current = None
+        self._finishing = {}
+        self._lock = threading.Lock()
+        self._idle = True
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name=f'{self.name}-heartbeat', daemon=True)
+        heartbeat.start()
+        while not self._stop_event.is_set():
+            try:
+                if not self._run_once():
+                    if not self._idle and self.on_idle is not None:
+                        self.on_idle()
+                    self._idle = True
+            except Exception:
+                traceback.print_exc()
+                self._stop_event.wait(self.poll_interval)
+        # 停止時も後片付け（書き込みの残りを出し切る）
+        if not self._idle and self.on_idle is not None:
+            self.on_idle()
+
+    def _run_once(self):
+        engines, wait = None, self.poll_interval
+        if self.select_engines is not None:
+            engines, wait = self.select_engines()
+        claimed = self.queue.claim(self.worker_id, engines=engines)
+        if claimed is None:
+            self._stop_event.wait(min(max(wait, 0.1), self.poll_interval * 5))
+            return False
+
+        if self.acquire is not None and not self.acquire(claimed['engine']):
+            self.queue.release(claimed['id'], self.worker_id)
+            return True
+
+        self._idle = False
+        self._current = claimed
+        try:
+            outcome = self.execute(claimed)
+            if isinstance(outcome, Future):
+                with self._lock:
+                    self._finishing[claimed['id']] = claimed
+                outcome.add_done_callback(lambda future, item=claimed: self._finish(item, future))
+            else:
+                result, meta = outcome
+                self.queue.complete(claimed['id'], self.worker_id, result, meta)
+        except Exception as e:
+            traceback.print_exc()
+            self.queue.fail(claimed['id'], self.worker_id, str(e))
+        finally:
+            self._current = None
+        return True
+
+    def _finish(self, claimed, future):
+        """後処理が終わった項目の完了通知"""
+        try:
+            result, meta = future.result()
+            self.queue.complete(claimed['id'], self.worker_id, result, meta)
+        except Exception as e:
+            traceback.print_exc()
+            self.queue.fail(claimed['id'], self.worker_id, str(e))
+        finally:
+            with self._lock:
+                self._finishing.pop(claimed['id'], None)
+
+    def _heartbeat_loop(self):
+        interval = max(1.0, self.queue.lease_seconds / 3)
+        while not self._stop_event.wait(interval):
+            with self._lock:
+                items = list(self._finishing.values())
+            current = self._current
+            if current is not None:
+                items.append(current)
+            for item in items:
+                try:
+                    self.queue.heartbeat(item['id'], self.worker_id)
+                except Exception as e:
+                    print(f"⚠️ ハートビート失敗: {e}")